@@ -8,22 +8,47 @@ rate limiting, and CORS configuration.
 """
 
 import os
-from flask import Flask, jsonify
+import tempfile
+import time
+from flask import Flask, Response, jsonify
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
 # Import routes
+from routes.asset_routes import asset_blueprint
+from routes.batch_routes import batch_blueprint
 from routes.ir_routes import ir_blueprint
+from routes.job_routes import job_blueprint
+from utils.admission import RenderSlots, generation_cost, require_budget
+from utils.compression import compress_response
+from utils.job_queue import JOB_DONE, JobQueue
+from utils.job_store import JobStore
+from utils.metrics import (
+    DOCUMENTS_TOTAL,
+    JOB_PEAK_RSS_BYTES,
+    METRICS_CONTENT_TYPE,
+    REGISTRY,
+    observe_stage_timings
+)
+from utils.metrics_store import MetricsStore
+from utils.render_pipeline import check_template_parity
+from utils.result_cache import create_result_cache
+from utils.settings import env_flag, env_float, env_int, env_str
+from utils.template_renderer import preload_templates
 
 # =============================================================================
 # Application Factory
 # =============================================================================
 
-def create_app():
+def create_app(defer_warm_up=False):
     """
     Create and configure the Flask application.
     
+    Args:
+        defer_warm_up: Skip the PDF worker warm-up; the caller runs
+                       warm_up_pdf_workers later (after forking)
+    
     Returns:
         Flask: Configured Flask application instance
     """
@@ -39,6 +64,95 @@ def create_app():
     # Secret key for sessions (not used in this API, but good practice)
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     
+    # Result cache for generated documents: 'memory', 'disk' or 'none'
+    app.config['RESULT_CACHE_BACKEND'] = env_str('RESULT_CACHE_BACKEND', 'memory')
+    app.config['RESULT_CACHE_MAX_BYTES'] = env_int('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+    app.config['RESULT_CACHE_DIR'] = env_str(
+        'RESULT_CACHE_DIR',
+        os.path.join(tempfile.gettempdir(), 'responseforge-results')
+    )
+    app.config['RESULT_CACHE_MAX_AGE'] = env_float('RESULT_CACHE_MAX_AGE', 24 * 3600.0)
+    
+    # Background generation: PDF worker processes and queue bounds
+    app.config['JOB_WORKERS'] = env_int('JOB_WORKERS', min(os.cpu_count() or 1, 4))
+    app.config['JOB_MAX_PENDING'] = env_int('JOB_MAX_PENDING', 32)
+    app.config['JOB_RESULT_TTL'] = env_float('JOB_RESULT_TTL', 600.0)
+    app.config['JOB_SYNC_TIMEOUT'] = env_float('JOB_SYNC_TIMEOUT', 25.0)
+    app.config['JOB_RETRY_AFTER'] = env_int('JOB_RETRY_AFTER', 5)
+    
+    # Jobs of the asynchronous API, shared by every worker process on the node
+    app.config['JOB_STORE_PATH'] = env_str(
+        'JOB_STORE_PATH',
+        os.path.join(tempfile.gettempdir(), 'responseforge-jobs.sqlite')
+    )
+    
+    # Let identical concurrent PDF requests share one render
+    app.config['JOB_COALESCE'] = env_flag('JOB_COALESCE', True)
+    
+    # Bound the memory of PDF worker processes: replace a worker after this
+    # many jobs, and retire the pool when a worker stays above the ceiling
+    # (0 disables either limit)
+    app.config['PDF_WORKER_MAX_JOBS'] = env_int('PDF_WORKER_MAX_JOBS', 200)
+    app.config['PDF_WORKER_MAX_RSS_MB'] = env_int('PDF_WORKER_MAX_RSS_MB', 1024)
+    
+    # Time budget of one PDF render (keep it below JOB_SYNC_TIMEOUT), and
+    # how much longer a render stuck in native code may run before its
+    # worker process is killed (0 disables the budget)
+    app.config['PDF_RENDER_TIMEOUT'] = env_float('PDF_RENDER_TIMEOUT', 20.0)
+    app.config['PDF_RENDER_KILL_GRACE'] = env_float('PDF_RENDER_KILL_GRACE', 5.0)
+    
+    # Start and warm up the PDF workers at startup instead of on first use
+    app.config['PDF_PREWARM'] = env_flag('PDF_PREWARM', True)
+    app.config['PDF_PREWARM_TIMEOUT'] = env_float('PDF_PREWARM_TIMEOUT', 60.0)
+    
+    # Maximum number of questionnaires in one batch request
+    app.config['BATCH_MAX_ITEMS'] = env_int('BATCH_MAX_ITEMS', 50)
+    
+    # Rate limit counters, shared by every worker process on the node
+    # (sqlite://<path>, or redis://host:port to share them between nodes)
+    app.config['RATELIMIT_STORAGE_URI'] = env_str(
+        'RATELIMIT_STORAGE_URI',
+        'sqlite://' + os.path.join(tempfile.gettempdir(), 'responseforge-ratelimit.sqlite')
+    )
+    
+    # Generation budget per client; a PDF uses PDF_RATE_COST of it and a
+    # Markdown or text document TEXT_RATE_COST
+    app.config['GENERATION_RATE_LIMIT'] = env_str('GENERATION_RATE_LIMIT', '60 per minute')
+    app.config['PDF_RATE_COST'] = env_int('PDF_RATE_COST', 6)
+    app.config['TEXT_RATE_COST'] = env_int('TEXT_RATE_COST', 1)
+    app.config['BATCH_RATE_LIMIT'] = env_str('BATCH_RATE_LIMIT', '5 per minute')
+    
+    # Live preview requests allowed per client (sent while the user types)
+    app.config['PREVIEW_RATE_LIMIT'] = env_str('PREVIEW_RATE_LIMIT', '120 per minute')
+    
+    # PDF renders running at once on the node, across all worker processes
+    # (0 disables the cap), and how long a request waits for a free slot
+    app.config['PDF_MAX_INFLIGHT'] = env_int('PDF_MAX_INFLIGHT', os.cpu_count() or 1)
+    app.config['PDF_ADMISSION_TIMEOUT'] = env_float('PDF_ADMISSION_TIMEOUT', 2.0)
+    app.config['ADMISSION_DIR'] = env_str(
+        'ADMISSION_DIR',
+        os.path.join(tempfile.gettempdir(), 'responseforge-admission')
+    )
+    
+    # Compress text responses of at least COMPRESSION_MIN_BYTES with
+    # Brotli (if installed) or gzip
+    app.config['COMPRESSION_ENABLED'] = env_flag('COMPRESSION_ENABLED', True)
+    app.config['COMPRESSION_MIN_BYTES'] = env_int('COMPRESSION_MIN_BYTES', 1024)
+    app.config['GZIP_LEVEL'] = env_int('GZIP_LEVEL', 6)
+    app.config['BROTLI_QUALITY'] = env_int('BROTLI_QUALITY', 5)
+    
+    # How long clients may reuse /api/template-options without revalidating
+    app.config['TEMPLATE_OPTIONS_MAX_AGE'] = env_int('TEMPLATE_OPTIONS_MAX_AGE', 3600)
+    
+    # Expose Prometheus metrics at /metrics
+    app.config['METRICS_ENABLED'] = env_flag('METRICS_ENABLED', True)
+    
+    # Directory through which the web workers merge their metrics (unset:
+    # /metrics reports the answering process only), and how often each
+    # worker writes its values there
+    app.config['METRICS_DIR'] = env_str('METRICS_DIR', '')
+    app.config['METRICS_FLUSH_INTERVAL'] = env_float('METRICS_FLUSH_INTERVAL', 5.0)
+    
     # ---------------------------------------------------------------------------
     # CORS Configuration
     # ---------------------------------------------------------------------------
@@ -57,25 +171,140 @@ def create_app():
     # ---------------------------------------------------------------------------
     # Rate Limiting
     # ---------------------------------------------------------------------------
-    # Prevent abuse by limiting requests per IP
+    # Prevent abuse by limiting requests per IP. Counters live in shared
+    # storage so that a client's budget does not grow with the number of
+    # worker processes.
     
     limiter = Limiter(
         key_func=get_remote_address,
         app=app,
         default_limits=["100 per hour"],
-        storage_uri="memory://"
+        storage_uri=app.config['RATELIMIT_STORAGE_URI']
     )
     
-    # Apply stricter limits to the generation endpoint
-    @limiter.limit("10 per minute")
-    def limited_generate():
-        pass  # Limit is applied via decorator in routes
+    # ---------------------------------------------------------------------------
+    # Template Preloading
+    # ---------------------------------------------------------------------------
+    # Compile templates once per worker so requests never pay for it
+    
+    preload_templates()
+    
+    # The Markdown and PDF templates must print the same answers
+    for problem in check_template_parity():
+        print(f'Template drift: {problem}')
+    
+    # ---------------------------------------------------------------------------
+    # Result Cache
+    # ---------------------------------------------------------------------------
+    # Serve repeat submissions of the same questionnaire without re-rendering
+    
+    app.extensions['result_cache'] = create_result_cache(
+        app.config['RESULT_CACHE_BACKEND'],
+        app.config['RESULT_CACHE_MAX_BYTES'],
+        app.config['RESULT_CACHE_DIR'],
+        app.config['RESULT_CACHE_MAX_AGE']
+    )
+    
+    # ---------------------------------------------------------------------------
+    # Job Queue
+    # ---------------------------------------------------------------------------
+    # Generate documents on a bounded pool of worker processes
+    
+    result_cache = app.extensions['result_cache']
+    
+    def on_job_complete(job):
+        """Record job metrics and cache freshly generated documents."""
+        for output_format in job['formats']:
+            DOCUMENTS_TOTAL.inc(format=output_format, status=job['status'])
+        
+        # Jobs that shared another job's render add no work of their own
+        if job['coalesced']:
+            return
+        
+        observe_stage_timings(job['timings'])
+        if job['usage'] is not None and job['usage']['peak_rss'] is not None:
+            JOB_PEAK_RSS_BYTES.observe(job['usage']['peak_rss'])
+        
+        if job['status'] != JOB_DONE:
+            return
+        
+        if result_cache is not None and job['cache_key'] and not job['cache_hit']:
+            result_cache.set(job['cache_key'], job['result'])
+    
+    app.extensions['job_queue'] = JobQueue(
+        max_workers=app.config['JOB_WORKERS'],
+        max_pending=app.config['JOB_MAX_PENDING'],
+        result_ttl=app.config['JOB_RESULT_TTL'],
+        on_complete=on_job_complete,
+        render_slots=RenderSlots(
+            app.config['ADMISSION_DIR'],
+            app.config['PDF_MAX_INFLIGHT']
+        ) if app.config['PDF_MAX_INFLIGHT'] > 0 else None,
+        slot_timeout=app.config['PDF_ADMISSION_TIMEOUT'],
+        max_jobs_per_worker=app.config['PDF_WORKER_MAX_JOBS'],
+        max_worker_rss=app.config['PDF_WORKER_MAX_RSS_MB'] * 1024 * 1024,
+        render_timeout=app.config['PDF_RENDER_TIMEOUT'],
+        kill_grace=app.config['PDF_RENDER_KILL_GRACE'],
+        store=JobStore(app.config['JOB_STORE_PATH'])
+    )
+    
+    # ---------------------------------------------------------------------------
+    # PDF Worker Warm-Up
+    # ---------------------------------------------------------------------------
+    # Pay for WeasyPrint's font discovery and layout setup before serving,
+    # so the first PDF request is as fast as every later one
+    
+    if not defer_warm_up:
+        warm_up_pdf_workers(app)
     
     # ---------------------------------------------------------------------------
     # Register Blueprints
     # ---------------------------------------------------------------------------
     
     app.register_blueprint(ir_blueprint, url_prefix='/api')
+    app.register_blueprint(job_blueprint, url_prefix='/api')
+    app.register_blueprint(batch_blueprint, url_prefix='/api')
+    app.register_blueprint(asset_blueprint, url_prefix='/api')
+    
+    # Assets are immutable and cached by browsers; printing a document
+    # must not use up the client's request budget
+    limiter.exempt(asset_blueprint)
+    
+    # Generating a document costs more the more expensive its format is;
+    # direct, background and batch generation draw from the same budget,
+    # a batch paying for every document in it
+    generation_limit = limiter.shared_limit(
+        app.config['GENERATION_RATE_LIMIT'],
+        scope='generation',
+        cost=generation_cost
+    )
+    for endpoint in ('ir.generate_ir_template', 'jobs.submit_job',
+                     'batch.generate_ir_template_batch'):
+        app.view_functions[endpoint] = generation_limit(app.view_functions[endpoint])
+    
+    # Batch requests are also counted on their own, and a batch costing
+    # more than the client has left is rejected without using it up
+    app.view_functions['batch.generate_ir_template_batch'] = require_budget(
+        limiter,
+        app.config['GENERATION_RATE_LIMIT'],
+        'generation',
+        generation_cost
+    )(limiter.limit(
+        app.config['BATCH_RATE_LIMIT']
+    )(app.view_functions['batch.generate_ir_template_batch']))
+    
+    # The live preview is cheap and called often; give it its own budget
+    app.view_functions['ir.preview_document'] = limiter.limit(
+        app.config['PREVIEW_RATE_LIMIT']
+    )(app.view_functions['ir.preview_document'])
+    
+    # ---------------------------------------------------------------------------
+    # Response Compression
+    # ---------------------------------------------------------------------------
+    # Markdown, text and JSON responses are repetitive prose and shrink
+    # several times over
+    
+    app.after_request(compress_response)
     
     # ---------------------------------------------------------------------------
     # Error Handlers
@@ -92,10 +321,17 @@ def create_app():
     @app.errorhandler(429)
     def ratelimit_handler(error):
         """Handle rate limit exceeded errors."""
-        return jsonify({
+        response = jsonify({
             'success': False,
             'error': 'Rate limit exceeded. Please try again later.'
-        }), 429
+        })
+        
+        # Tell the client when its window resets
+        if limiter.current_limit is not None:
+            retry_after = limiter.current_limit.reset_at - time.time()
+            response.headers['Retry-After'] = str(max(1, int(retry_after)))
+        
+        return response, 429
     
     @app.errorhandler(500)
     def internal_error(error):
@@ -109,14 +345,59 @@ def create_app():
     # Health Check Endpoint
     # ---------------------------------------------------------------------------
     
+    # Probes must never be rate limited, whatever other clients on the
+    # same address (or earlier runs sharing the counters) have used up
     @app.route('/health', methods=['GET'])
+    @limiter.exempt
     def health_check():
         """Simple health check endpoint."""
         return jsonify({'status': 'healthy', 'service': 'ResponseForge API'})
     
+    # ---------------------------------------------------------------------------
+    # Metrics Endpoint
+    # ---------------------------------------------------------------------------
+    
+    if app.config['METRICS_ENABLED']:
+        metrics_store = MetricsStore(
+            app.config['METRICS_DIR'],
+            REGISTRY,
+            app.config['METRICS_FLUSH_INTERVAL']
+        ) if app.config['METRICS_DIR'] else None
+        app.extensions['metrics_store'] = metrics_store
+        
+        @app.route('/metrics', methods=['GET'])
+        @limiter.exempt
+        def metrics():
+            """Per-stage timings and counters in the Prometheus text format."""
+            registry = metrics_store.collect() if metrics_store is not None else REGISTRY
+            return Response(registry.render(), content_type=METRICS_CONTENT_TYPE)
+    
     return app
 
 
+# =============================================================================
+# PDF Worker Warm-Up
+# =============================================================================
+
+def warm_up_pdf_workers(app):
+    """
+    Start and warm up the app's PDF worker processes, if enabled.
+    
+    Worker processes must not be shared between forked server workers,
+    so servers that fork after creating the app call this in each
+    worker (see gunicorn.conf.py).
+    
+    Args:
+        app: Application created by create_app
+    """
+    if not app.config['PDF_PREWARM']:
+        return
+    
+    ready = app.extensions['job_queue'].warm_up(app.config['PDF_PREWARM_TIMEOUT'])
+    if ready < app.config['JOB_WORKERS']:
+        print(f'Only {ready} of {app.config["JOB_WORKERS"]} PDF workers warmed up in time')
+
+
 # =============================================================================
 # Application Entry Point
 # =============================================================================
@@ -125,7 +406,7 @@ if __name__ == '__main__':
     app = create_app()
     
     # Run in development mode
-    # In production, use gunicorn or similar WSGI server
+    # In production, use gunicorn: gunicorn -c gunicorn.conf.py wsgi:app
     app.run(
         host='127.0.0.1',
         port=5000,
@@ -0,0 +1,8 @@
+"""
+Benchmarks
+==========
+Reproducible performance benchmarks for the ResponseForge backend.
+
+Run from the backend directory:
+    python -m benchmarks.run_benchmarks --output results.json
+"""
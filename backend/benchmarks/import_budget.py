@@ -0,0 +1,161 @@
+"""
+Import Budget Check
+===================
+Checks that a web worker starts without loading the PDF stack.
+
+WeasyPrint and its dependencies (Pango bindings through cffi, fontTools,
+pydyf, the CSS and HTML parsers) and Pillow are only needed by the PDF
+worker processes and by logo uploads. A web worker that imports them at
+startup pays their import time and memory even if it only serves
+/health, /api/template-options or Markdown requests.
+
+Each run starts a fresh interpreter that imports the app and creates it
+(without warming up the PDF workers, and with an empty logo store), then
+reports:
+- The time from the first import until create_app returned
+- The resident memory of the process
+- Which PDF stack modules were loaded
+
+Usage (from the backend directory):
+    python -m benchmarks.import_budget [--max-seconds 1.0] [--max-rss-mb 100]
+
+Exits with status 1 if a PDF stack module was loaded or a budget was
+exceeded.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict, Any, List, Optional
+
+
+# =============================================================================
+# Budget Configuration
+# =============================================================================
+
+# Top-level packages that only PDF rendering and logo processing need
+PDF_STACK_MODULES = (
+    'weasyprint',
+    'pydyf',
+    'fontTools',
+    'cffi',
+    'tinycss2',
+    'cssselect2',
+    'html5lib',
+    'tinyhtml5',
+    'PIL'
+)
+
+DEFAULT_MAX_SECONDS = 1.0
+DEFAULT_MAX_RSS_MB = 100
+DEFAULT_RUNS = 3
+
+# Runs in the fresh interpreter; prints one JSON line
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+create_app()
+elapsed = time.perf_counter() - started
+from utils.process_memory import current_rss, peak_rss
+print(json.dumps({
+    'seconds': elapsed,
+    'rss_bytes': current_rss() or peak_rss(),
+    'modules': sorted(name for name in sys.modules if name.split('.')[0] in %r)
+}))
+''' % (PDF_STACK_MODULES,)
+
+
+# =============================================================================
+# Measurement
+# =============================================================================
+
+def probe_startup() -> Dict[str, Any]:
+    """
+    Import and create the app in a fresh interpreter.
+
+    Returns:
+        Dictionary with seconds, rss_bytes and the loaded PDF stack modules
+
+    Raises:
+        RuntimeError: If the app cannot be created
+    """
+    # An empty logo store, so that logos left by earlier runs cannot hide
+    # image processing at startup
+    with tempfile.TemporaryDirectory(prefix='import-budget-') as logo_dir:
+        env = dict(os.environ, PDF_PREWARM='false', LOGO_STORE_DIR=logo_dir)
+        completed = subprocess.run(
+            [sys.executable, '-c', PROBE],
+            capture_output=True, text=True, env=env,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        )
+    if completed.returncode != 0:
+        raise RuntimeError(f'App startup failed:\n{completed.stderr}')
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def check_budget(results: List[Dict[str, Any]], max_seconds: float,
+                 max_rss_mb: float) -> List[str]:
+    """
+    Compare startup measurements with the budget.
+
+    The fastest run is compared, so a busy machine does not fail the check.
+
+    Args:
+        results: Output of probe_startup for every run
+        max_seconds: Startup time budget
+        max_rss_mb: Resident memory budget in MiB
+
+    Returns:
+        Descriptions of the violations (empty when within budget)
+    """
+    problems: List[str] = []
+
+    modules = sorted(set(name for result in results for name in result['modules']))
+    if modules:
+        problems.append('PDF stack loaded at startup: ' + ', '.join(modules))
+
+    seconds = min(result['seconds'] for result in results)
+    if seconds > max_seconds:
+        problems.append(f'Startup took {seconds:.3f}s (budget {max_seconds}s)')
+
+    rss_mb = min(result['rss_bytes'] for result in results) / (1024 * 1024)
+    if rss_mb > max_rss_mb:
+        problems.append(f'Startup RSS is {rss_mb:.1f} MiB (budget {max_rss_mb} MiB)')
+
+    return problems
+
+
+# =============================================================================
+# Command Line
+# =============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Measure the app's startup and report it against the budget."""
+    parser = argparse.ArgumentParser(description='Check the web worker startup budget.')
+    parser.add_argument('--max-seconds', type=float, default=DEFAULT_MAX_SECONDS,
+                        help='maximum seconds from first import to a created app')
+    parser.add_argument('--max-rss-mb', type=float, default=DEFAULT_MAX_RSS_MB,
+                        help='maximum resident memory after startup in MiB')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS,
+                        help='fresh interpreters to start (the fastest counts)')
+    args = parser.parse_args(argv)
+
+    results = [probe_startup() for _ in range(max(1, args.runs))]
+    for result in results:
+        print(f'startup {result["seconds"]:.3f}s, '
+              f'RSS {result["rss_bytes"] / (1024 * 1024):.1f} MiB, '
+              f'PDF stack modules: {len(result["modules"])}')
+
+    problems = check_budget(results, args.max_seconds, args.max_rss_mb)
+    for problem in problems:
+        print(problem)
+
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
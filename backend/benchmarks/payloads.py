@@ -0,0 +1,166 @@
+"""
+Benchmark Payloads
+==================
+Questionnaire payloads of increasing size for the benchmark suite.
+
+Payload sizes:
+- small: short answers, one severity level and one channel
+- max: every text field at its maximum length (multiline fields with
+  many lines), all severity levels and all communication channels
+- max_logo: the max payload plus a large PNG logo
+"""
+
+import base64
+import random
+import struct
+import zlib
+from typing import Dict, Any, List
+from validators.input_validator import (
+    MAX_TEXT_LENGTH,
+    MAX_MULTILINE_LENGTH,
+    VALID_SEVERITY_LEVELS,
+    VALID_COMMUNICATION_CHANNELS,
+    VALID_OUTPUT_FORMATS
+)
+
+
+# =============================================================================
+# Payload Configuration
+# =============================================================================
+
+PAYLOAD_SIZES = ['small', 'max', 'max_logo']
+
+# Side length of the generated logo; random pixels keep it incompressible
+LOGO_SIZE_PX = 400
+
+# Fixed seed so every run benchmarks identical payloads
+PAYLOAD_SEED = 800_61
+
+
+# =============================================================================
+# Field Generators
+# =============================================================================
+
+def filler_text(length: int, rng: random.Random) -> str:
+    """Build a single line of words of exactly `length` characters."""
+    words = []
+    size = 0
+    while size < length:
+        word = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(2, 10)))
+        words.append(word)
+        size += len(word) + 1
+    return ' '.join(words)[:length]
+
+
+def filler_lines(length: int, rng: random.Random, line_length: int = 60) -> str:
+    """Build multiline text of exactly `length` characters."""
+    lines = []
+    size = 0
+    while size < length:
+        line = f'- {filler_text(line_length, rng)}'
+        lines.append(line)
+        size += len(line) + 1
+    return '\n'.join(lines)[:length].rstrip()
+
+
+def png_data_uri(size_px: int, rng: random.Random) -> str:
+    """
+    Build a PNG data URI of random RGB pixels.
+    
+    Args:
+        size_px: Width and height of the image
+        rng: Random source for the pixels
+        
+    Returns:
+        data:image/png;base64,... URI
+    """
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        body = kind + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body))
+    
+    # Filter type 0 before every scanline
+    rows = b''.join(
+        b'\x00' + bytes(rng.getrandbits(8) for _ in range(size_px * 3))
+        for _ in range(size_px)
+    )
+    png = (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', size_px, size_px, 8, 2, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(rows))
+        + chunk(b'IEND', b'')
+    )
+    return 'data:image/png;base64,' + base64.b64encode(png).decode('ascii')
+
+
+# =============================================================================
+# Payloads
+# =============================================================================
+
+def build_payload(size: str) -> Dict[str, Any]:
+    """
+    Build a raw questionnaire payload.
+    
+    Args:
+        size: One of PAYLOAD_SIZES
+        
+    Returns:
+        Questionnaire dictionary as sent by the frontend
+        
+    Raises:
+        ValueError: If the size is unknown
+    """
+    if size not in PAYLOAD_SIZES:
+        raise ValueError(f'Unknown payload size: {size}')
+    
+    rng = random.Random(PAYLOAD_SEED)
+    
+    if size == 'small':
+        return {
+            'organizationName': 'Test Corp',
+            'organizationLogo': None,
+            'industry': 'Technology',
+            'infrastructureEnvironment': 'AWS',
+            'incidentCommander': 'John Doe',
+            'socAnalysts': 'Jane Smith',
+            'cloudRemediationOwner': 'Bob Wilson',
+            'legalComplianceOwner': 'Alice Brown',
+            'severityLevels': ['Critical'],
+            'severityDetermination': 'Based on impact',
+            'escalationMatrix': 'P1 goes to CTO',
+            'communicationChannels': ['Email'],
+            'criticalIncidentNotifications': 'CEO, CTO',
+            'maintainsForensicEvidence': True,
+            'forensicEvidenceLocation': 'Secure vault',
+            'conductPostIncidentReviews': True,
+            'outputFormat': VALID_OUTPUT_FORMATS[0]
+        }
+    
+    payload = {
+        'organizationName': filler_text(MAX_TEXT_LENGTH, rng),
+        'organizationLogo': None,
+        'industry': filler_text(MAX_TEXT_LENGTH, rng),
+        'infrastructureEnvironment': 'AWS',
+        'incidentCommander': filler_text(MAX_TEXT_LENGTH, rng),
+        'socAnalysts': filler_lines(MAX_MULTILINE_LENGTH, rng),
+        'cloudRemediationOwner': filler_text(MAX_TEXT_LENGTH, rng),
+        'legalComplianceOwner': filler_text(MAX_TEXT_LENGTH, rng),
+        'severityLevels': list(VALID_SEVERITY_LEVELS),
+        'severityDetermination': filler_lines(MAX_MULTILINE_LENGTH, rng),
+        'escalationMatrix': filler_lines(MAX_MULTILINE_LENGTH, rng),
+        'communicationChannels': list(VALID_COMMUNICATION_CHANNELS),
+        'criticalIncidentNotifications': filler_lines(MAX_MULTILINE_LENGTH, rng),
+        'maintainsForensicEvidence': True,
+        'forensicEvidenceLocation': filler_text(MAX_TEXT_LENGTH, rng),
+        'conductPostIncidentReviews': True,
+        'outputFormat': VALID_OUTPUT_FORMATS[0]
+    }
+    
+    if size == 'max_logo':
+        payload['organizationLogo'] = png_data_uri(LOGO_SIZE_PX, rng)
+    
+    return payload
+
+
+def build_payloads(sizes: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Build the payloads for several sizes, keyed by size."""
+    return {size: build_payload(size) for size in sizes}
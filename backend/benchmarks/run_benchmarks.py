@@ -0,0 +1,343 @@
+"""
+Benchmark Runner
+================
+Times every stage of document generation and reports the results as JSON.
+
+Benchmarks (each run once per payload size):
+- validate: validate_questionnaire
+- render_markdown: render_ir_template
+- convert_text: convert_to_text on the rendered Markdown
+- render_html: render_html_template
+- generate_pdf: generate_pdf on the rendered HTML
+- endpoint: POST /api/generate-ir-template through the Flask test client
+
+Each result reports throughput, latency percentiles and the peak RSS of
+the benchmark process. Caches are warmed before timing starts and the
+result cache is disabled, so the numbers reflect steady-state rendering.
+
+Usage (from the backend directory):
+    python -m benchmarks.run_benchmarks --iterations 50 --output results.json
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, Callable, List, Optional
+from benchmarks.payloads import PAYLOAD_SIZES, build_payloads
+
+
+# =============================================================================
+# Benchmark Configuration
+# =============================================================================
+
+BENCHMARK_NAMES = [
+    'validate',
+    'render_markdown',
+    'convert_text',
+    'render_html',
+    'generate_pdf',
+    'endpoint'
+]
+
+# Benchmarks that are much slower and get fewer iterations by default
+SLOW_BENCHMARKS = {'generate_pdf', 'endpoint'}
+
+DEFAULT_ITERATIONS = 200
+DEFAULT_SLOW_ITERATIONS = 20
+DEFAULT_WARMUP = 3
+
+# Version of the JSON report layout
+REPORT_VERSION = 1
+
+
+# =============================================================================
+# Measurement
+# =============================================================================
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """
+    Return a percentile using the nearest-rank method.
+
+    Args:
+        sorted_values: Samples in ascending order
+        fraction: Percentile as a fraction (0.95 for p95)
+
+    Returns:
+        The sample at that rank
+    """
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def peak_rss_kb() -> int:
+    """Return the peak resident set size of this process in KiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports KiB
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def measure(func: Callable[[], Any], iterations: int, warmup: int) -> Dict[str, Any]:
+    """
+    Time repeated calls of a function.
+
+    Args:
+        func: Zero-argument callable to benchmark
+        iterations: Number of timed calls
+        warmup: Number of untimed calls before timing starts
+
+    Returns:
+        Dictionary with throughput, latency statistics and peak RSS
+    """
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - call_started)
+    total = time.perf_counter() - started
+
+    samples.sort()
+    to_ms = 1000.0
+
+    return {
+        'iterations': iterations,
+        'total_s': round(total, 6),
+        'throughput_per_s': round(iterations / total, 3) if total else None,
+        'latency_ms': {
+            'min': round(samples[0] * to_ms, 4),
+            'mean': round(sum(samples) / len(samples) * to_ms, 4),
+            'p50': round(percentile(samples, 0.50) * to_ms, 4),
+            'p95': round(percentile(samples, 0.95) * to_ms, 4),
+            'p99': round(percentile(samples, 0.99) * to_ms, 4),
+            'max': round(samples[-1] * to_ms, 4)
+        },
+        'peak_rss_kb': peak_rss_kb()
+    }
+
+
+# =============================================================================
+# Benchmark Cases
+# =============================================================================
+
+def build_cases(payload: Dict[str, Any], app) -> Dict[str, Callable[[], Any]]:
+    """
+    Build the benchmark callables for one payload.
+
+    Inputs of each stage are produced once up front, so every benchmark
+    times its own stage only.
+
+    Args:
+        payload: Raw questionnaire payload
+        app: Flask application for the endpoint benchmark (or None)
+
+    Returns:
+        Dictionary of benchmark name -> zero-argument callable
+    """
+    from validators.input_validator import validate_questionnaire
+    from utils.template_renderer import render_ir_template, convert_to_text
+
+    is_valid, validated, errors = validate_questionnaire(payload)
+    if not is_valid:
+        raise ValueError(f'Benchmark payload is invalid: {errors}')
+
+    markdown = render_ir_template(validated)
+
+    cases: Dict[str, Callable[[], Any]] = {
+        'validate': lambda: validate_questionnaire(payload),
+        'render_markdown': lambda: render_ir_template(validated),
+        'convert_text': lambda: convert_to_text(markdown)
+    }
+
+    # WeasyPrint needs native libraries; import lazily so the pure Python
+    # benchmarks still run where they are missing
+    try:
+        from utils.pdf_generator import render_html_template, generate_pdf
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+
+        def unavailable():
+            raise RuntimeError(error)
+
+        cases['render_html'] = unavailable
+        cases['generate_pdf'] = unavailable
+    else:
+        html = render_html_template(validated)
+        cases['render_html'] = lambda: render_html_template(validated)
+        cases['generate_pdf'] = lambda: generate_pdf(html)
+
+    if app is not None:
+        client = app.test_client()
+        counter = iter(range(1, 1 << 30))
+
+        def post_endpoint():
+            # A distinct client address per request keeps the per-IP rate
+            # limit out of the measurement
+            index = next(counter)
+            response = client.post(
+                '/api/generate-ir-template',
+                json=payload,
+                environ_base={'REMOTE_ADDR': f'10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}'}
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f'Endpoint returned {response.status_code}')
+            return response.get_data()
+
+        cases['endpoint'] = post_endpoint
+
+    return cases
+
+
+def create_benchmark_app():
+    """Create the Flask app with the result cache disabled."""
+    # Every iteration must render; a cache hit would hide the real cost
+    os.environ['RESULT_CACHE_BACKEND'] = 'none'
+
+    from app import create_app
+    return create_app()
+
+
+# =============================================================================
+# Report
+# =============================================================================
+
+def environment_info() -> Dict[str, Any]:
+    """Describe the machine and code version the benchmarks ran on."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+
+    try:
+        from importlib.metadata import version
+        weasyprint_version = version('weasyprint')
+    except Exception:
+        weasyprint_version = None
+
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'weasyprint': weasyprint_version,
+        'git_commit': commit
+    }
+
+
+def run_benchmarks(names: List[str], sizes: List[str], iterations: Optional[int],
+                   slow_iterations: Optional[int], warmup: int) -> Dict[str, Any]:
+    """
+    Run the selected benchmarks for every payload size.
+
+    A benchmark that raises is reported with its error instead of
+    aborting the run.
+
+    Args:
+        names: Benchmarks to run (subset of BENCHMARK_NAMES)
+        sizes: Payload sizes (subset of PAYLOAD_SIZES)
+        iterations: Timed iterations of fast benchmarks
+        slow_iterations: Timed iterations of SLOW_BENCHMARKS
+        warmup: Untimed iterations before each benchmark
+
+    Returns:
+        The JSON-serializable report
+    """
+    app = create_benchmark_app() if 'endpoint' in names else None
+    payloads = build_payloads(sizes)
+    results = []
+
+    try:
+        for size in sizes:
+            cases = build_cases(payloads[size], app)
+
+            for name in names:
+                count = slow_iterations if name in SLOW_BENCHMARKS else iterations
+                entry = {'benchmark': name, 'payload': size}
+
+                try:
+                    entry.update(measure(cases[name], count, warmup))
+                except Exception as e:
+                    entry['error'] = f'{type(e).__name__}: {e}'
+
+                results.append(entry)
+                print(f'{name:>16} [{size}]: ' + (
+                    entry['error'] if 'error' in entry else
+                    f'p50 {entry["latency_ms"]["p50"]}ms, '
+                    f'p99 {entry["latency_ms"]["p99"]}ms, '
+                    f'{entry["throughput_per_s"]}/s'
+                ), file=sys.stderr)
+    finally:
+        if app is not None:
+            app.extensions['job_queue'].shutdown()
+
+    return {
+        'report_version': REPORT_VERSION,
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': environment_info(),
+        'settings': {
+            'iterations': iterations,
+            'slow_iterations': slow_iterations,
+            'warmup': warmup
+        },
+        'payload_sizes': {
+            size: len(json.dumps(payloads[size]).encode('utf-8')) for size in sizes
+        },
+        'results': results,
+        'peak_rss_kb': peak_rss_kb()
+    }
+
+
+# =============================================================================
+# Command Line
+# =============================================================================
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description='Run the ResponseForge benchmarks.')
+    parser.add_argument('--benchmarks', nargs='+', choices=BENCHMARK_NAMES,
+                        default=BENCHMARK_NAMES, help='benchmarks to run')
+    parser.add_argument('--sizes', nargs='+', choices=PAYLOAD_SIZES,
+                        default=PAYLOAD_SIZES, help='payload sizes to run')
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS,
+                        help='timed iterations of fast benchmarks')
+    parser.add_argument('--slow-iterations', type=int, default=DEFAULT_SLOW_ITERATIONS,
+                        help='timed iterations of PDF and endpoint benchmarks')
+    parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP,
+                        help='untimed iterations before each benchmark')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmarks and write the report."""
+    args = parse_args(argv)
+
+    report = run_benchmarks(
+        args.benchmarks, args.sizes,
+        args.iterations, args.slow_iterations, args.warmup
+    )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    return 1 if any('error' in entry for entry in report['results']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
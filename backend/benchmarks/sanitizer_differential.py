@@ -0,0 +1,173 @@
+"""
+Sanitizer Differential Corpus
+=============================
+Checks that validators.sanitizer produces exactly the output of
+``bleach.clean(value, tags=[], strip=True)`` and reports the speedup.
+
+The corpus combines:
+- Hand-written edge cases (tags, comments, entities, control characters)
+- Seeded random strings mixing words with markup characters
+- Optionally (--sweep) every Unicode code point on its own, which is how
+  the fast path's character set was derived
+
+Usage (from the backend directory):
+    python -m benchmarks.sanitizer_differential [--random 20000] [--sweep]
+
+Exits with status 1 if any output differs.
+"""
+
+import argparse
+import random
+import sys
+import time
+from typing import Callable, Iterator, List, Optional
+import bleach
+from validators.input_validator import MAX_MULTILINE_LENGTH, TEXT_FIELD_LENGTHS, sanitize_text
+from validators.sanitizer import TextSanitizer, sanitize_fields
+
+
+# =============================================================================
+# Corpus
+# =============================================================================
+
+EDGE_CASES = [
+    '', ' ', 'plain text', '  padded  ', 'line one\nline two', '\ttabbed',
+    'Windows\r\nline\rendings', 'nul\x00byte', 'form\x0cfeed', 'vertical\x0btab',
+    'bell\x07', 'escape\x1b[0m', 'delete\x7f', 'c1\x85\x9f', '  ',
+    'café', '日本語', '\U0001F680 launch', '‮evil', 'lone\ud800surrogate',
+    '￾￿', '﻿bom',
+    '<b>bold</b>', '<script>alert(1)</script>', '<style>p{}</style>text',
+    '<img src=x onerror=alert(1)>', '<a href="javascript:alert(1)">x</a>',
+    '<p>unclosed', '<div', '<', '>', '<>', '</>', '</p>', '< b>', '<1>', 'a < b', 'a > b',
+    '1 <2 and 3> 2', '<<b>>', '<!-- comment -->after', '<!-- unterminated', '<!---->',
+    '<!DOCTYPE html>x', '<?php echo 1; ?>', '<![CDATA[x]]>', '<br/>', '<BR>', '<svg><g/></svg>',
+    '<textarea><b>x</b></textarea>', '<title>t</title>', '<noscript>n</noscript>',
+    '<xmp><b></xmp>', '<plaintext><b>', '<iframe src=x></iframe>', '<math><mi>x</mi></math>',
+    '&', '&&', '&amp;', '&amp', '&lt;', '&gt;', '&quot;', '&apos;', '&nbsp;', '&copy',
+    '&notit;', '&notin;', '&ampx', '&#60;', '&#x3c;', '&#0;', '&#x110000;', '&#128;',
+    '&#xD800;', '&unknown;', 'AT&T', 'R&D <team>', 'Tom & Jerry', 'a&b=c',
+    'x' * 600, 'y\n' * 1200, '<b>' * 100, '&' * 100,
+    '=cmd|\' /C calc\'!A0', '{{ 7*7 }}', '{% raw %}', '${jndi:ldap://x}',
+]
+
+# Characters the random generator draws from, weighted towards markup
+RANDOM_ALPHABET = (
+    list('abcdefghijklmnopqrstuvwxyz ABC019') * 3
+    + list('<>&;#/!-="\'?[]') * 2
+    + ['\n', '\r', '\t', '\x00', '\x0c', 'é', '\U0001F600']
+)
+RANDOM_TOKENS = [
+    '<b>', '</b>', '<script>', '</script>', '<!--', '-->', '&amp;', '&lt;', '&#39;',
+    '&#x41;', '<br/>', '<a href="x">', '<style>', '<textarea>', '<![CDATA[', ']]>',
+]
+
+
+def random_corpus(count: int, seed: int) -> Iterator[str]:
+    """Generate seeded random strings of words, tokens and markup chars."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        parts = []
+        for _ in range(rng.randint(0, 40)):
+            if rng.random() < 0.15:
+                parts.append(rng.choice(RANDOM_TOKENS))
+            else:
+                parts.append(rng.choice(RANDOM_ALPHABET))
+        yield ''.join(parts)
+
+
+def sweep_corpus() -> Iterator[str]:
+    """Every Unicode scalar value between two letters."""
+    for code_point in range(0x110000):
+        if 0xD800 <= code_point <= 0xDFFF:
+            continue
+        yield f'a{chr(code_point)}b'
+
+
+# =============================================================================
+# Comparison
+# =============================================================================
+
+def bleach_reference(value: str) -> str:
+    """The sanitizer output before the fast engine was introduced."""
+    return bleach.clean(value, tags=[], strip=True)
+
+
+def compare(corpus: List[str], candidate: Callable[[str], str],
+            reference: Callable[[str], str], label: str,
+            failures: List[str]) -> None:
+    """Compare two functions on every string of a corpus."""
+    for value in corpus:
+        expected = reference(value)
+        actual = candidate(value)
+        if actual != expected:
+            failures.append(f'{label}: {value!r} -> {actual!r}, bleach gives {expected!r}')
+
+
+def time_call(func: Callable[[str], str], corpus: List[str]) -> float:
+    """Return the seconds taken to run func over the corpus."""
+    started = time.perf_counter()
+    for value in corpus:
+        func(value)
+    return time.perf_counter() - started
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the differential corpus and report mismatches and timings."""
+    parser = argparse.ArgumentParser(description='Compare the sanitizer with bleach.clean.')
+    parser.add_argument('--random', type=int, default=20000, help='number of random strings')
+    parser.add_argument('--seed', type=int, default=1, help='random corpus seed')
+    parser.add_argument('--sweep', action='store_true', help='also test every code point (slow)')
+    args = parser.parse_args(argv)
+
+    corpus = EDGE_CASES + list(random_corpus(args.random, args.seed))
+    sanitizer = TextSanitizer()
+    failures: List[str] = []
+
+    # Engine output against bleach
+    compare(corpus, sanitizer.clean, bleach_reference, 'clean', failures)
+
+    # Full field sanitization (trim and truncate) against the old formula
+    compare(
+        corpus, lambda value: sanitize_text(value, MAX_MULTILINE_LENGTH),
+        lambda value: bleach_reference(value).strip()[:MAX_MULTILINE_LENGTH],
+        'sanitize_text', failures
+    )
+
+    # Batched questionnaire mode against field-by-field sanitization
+    fields = list(TEXT_FIELD_LENGTHS)
+    for index in range(0, len(corpus), len(fields)):
+        data = dict(zip(fields, corpus[index:index + len(fields)]))
+        batched = sanitize_fields(data, TEXT_FIELD_LENGTHS)
+        for field, value in data.items():
+            expected = bleach_reference(value).strip()[:TEXT_FIELD_LENGTHS[field]]
+            if batched.get(field) != expected:
+                failures.append(f'sanitize_fields[{field}]: {value!r} -> {batched.get(field)!r}')
+
+    if args.sweep:
+        compare(list(sweep_corpus()), sanitizer.clean, bleach_reference, 'sweep', failures)
+
+    # Typical answers are plain text; time both kinds separately
+    plain = [value for value in corpus if not any(char in value for char in '<>&')]
+    markup = [value for value in corpus if value not in plain]
+    for label, subset in (('markup-free', plain), ('with markup', markup)):
+        if not subset:
+            continue
+        before = time_call(bleach_reference, subset)
+        after = time_call(sanitizer.clean, subset)
+        print(f'{label:>12}: {len(subset)} strings, bleach.clean {before * 1e6 / len(subset):.1f}us, '
+              f'sanitizer {after * 1e6 / len(subset):.1f}us per string ({before / after:.1f}x)')
+
+    print(f'{len(corpus)} strings compared' + (' plus code point sweep' if args.sweep else ''))
+
+    if failures:
+        print(f'{len(failures)} mismatches:')
+        for failure in failures[:20]:
+            print(f'  {failure}')
+        return 1
+
+    print('sanitizer output matches bleach.clean')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
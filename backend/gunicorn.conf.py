@@ -0,0 +1,120 @@
+"""
+ResponseForge - Gunicorn Configuration
+======================================
+Production server settings, read from environment variables.
+
+    cd backend
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Worker model:
+- Web workers are threaded (gthread). Validation, Markdown/text rendering,
+  previews and job polling are light and mostly wait on I/O, so threads
+  serve them concurrently within one process
+- PDF layout is CPU bound and runs in each web worker's pool of PDF
+  processes (JOB_WORKERS). Unless JOB_WORKERS is set, the CPUs are split
+  between the web workers, so the node runs about one PDF process per CPU
+- The app is preloaded in the master: templates are compiled once before
+  forking. PDF processes are started and warmed up in every web worker
+  after the fork, before it accepts requests
+- Web workers are recycled after a random number of requests around
+  GUNICORN_MAX_REQUESTS, finishing their in-flight requests first, which
+  bounds memory growth without restarting all workers at once
+- Each web worker records its own metrics; they are merged through
+  METRICS_DIR (see utils/metrics_store.py), so /metrics reports the
+  whole server whichever worker answers the scrape
+- Jobs of /api/jobs and live previews are kept in SQLite files shared by
+  the web workers (JOB_STORE_PATH, PREVIEW_STORE_PATH), so polling a job
+  or updating a preview works whichever worker answers. A worker being
+  recycled lets its unfinished jobs finish first
+"""
+
+import os
+import tempfile
+from utils.metrics_store import mark_process_dead, reset_metrics_dir
+from utils.settings import env_flag, env_int, env_str
+
+
+# =============================================================================
+# Server Socket
+# =============================================================================
+
+bind = env_str('GUNICORN_BIND', '127.0.0.1:8000')
+backlog = env_int('GUNICORN_BACKLOG', 2048)
+
+
+# =============================================================================
+# Worker Processes
+# =============================================================================
+
+_cpus = os.cpu_count() or 1
+
+workers = env_int('GUNICORN_WORKERS', max(2, min(_cpus, 4)))
+worker_class = 'gthread'
+threads = env_int('GUNICORN_THREADS', 8)
+
+# PDF processes per web worker: share the CPUs between the web workers
+os.environ.setdefault('JOB_WORKERS', str(max(1, _cpus // workers)))
+
+# Merge the workers' metrics (set METRICS_DIR to an empty value to report
+# per worker); start from zero with every server start
+metrics_dir = os.environ.setdefault(
+    'METRICS_DIR',
+    os.path.join(tempfile.gettempdir(), 'responseforge-metrics')
+)
+if metrics_dir:
+    reset_metrics_dir(metrics_dir)
+
+# Compile templates once, before forking
+preload_app = env_flag('GUNICORN_PRELOAD', True)
+
+# Recycle workers to bound memory growth; the jitter staggers restarts
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER', 100)
+
+# Must exceed both the PDF warm-up (PDF_PREWARM_TIMEOUT) and the longest
+# synchronous generation (JOB_SYNC_TIMEOUT)
+timeout = env_int('GUNICORN_TIMEOUT', 90)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = env_int('GUNICORN_KEEPALIVE', 5)
+
+
+# =============================================================================
+# Logging
+# =============================================================================
+
+accesslog = env_str('GUNICORN_ACCESS_LOG', '-')
+errorlog = env_str('GUNICORN_ERROR_LOG', '-')
+loglevel = env_str('GUNICORN_LOG_LEVEL', 'info')
+
+
+# =============================================================================
+# Server Hooks
+# =============================================================================
+
+def post_worker_init(worker):
+    """Start the worker's own PDF processes before it accepts requests."""
+    from app import warm_up_pdf_workers
+    warm_up_pdf_workers(worker.wsgi)
+
+
+def worker_exit(server, worker):
+    """Stop the worker's PDF processes when it exits or is recycled."""
+    app = getattr(worker, 'wsgi', None)
+    if app is not None:
+        # Let queued jobs finish, so their results reach the job store
+        job_queue = app.extensions['job_queue']
+        unfinished = job_queue.drain(max(0, server.cfg.graceful_timeout - 1))
+        if unfinished:
+            server.log.warning('Worker %s exits with %d unfinished jobs', worker.pid, unfinished)
+        job_queue.shutdown()
+
+        # Write the worker's final metrics for the master to archive
+        metrics_store = app.extensions.get('metrics_store')
+        if metrics_store is not None:
+            metrics_store.flush()
+
+
+def child_exit(server, worker):
+    """Keep the metrics of an exited worker in the merged totals."""
+    if metrics_dir:
+        mark_process_dead(metrics_dir, worker.pid)
@@ -0,0 +1,109 @@
+"""
+Asset Routes
+============
+Serves the images referenced by print-ready HTML documents.
+
+Every URL served here names its content: template images carry their
+content version in the query string and logos are stored under the hash
+of their content. Responses can therefore be cached by browsers and
+proxies for a year without revalidation.
+
+New documents inline their logo; the logo route serves documents that
+link to the logo store, for as long as the store keeps the logo.
+"""
+
+import hashlib
+import os
+from flask import Blueprint, Response, jsonify, request
+from utils.logo_store import LOGO_URL_PREFIX, LogoError, get_logo_store
+from utils.print_bundle import PRINT_ASSETS, TEMPLATE_DIR
+
+
+# =============================================================================
+# Blueprint Configuration
+# =============================================================================
+
+asset_blueprint = Blueprint('assets', __name__)
+
+# Seconds browsers and proxies may keep an asset
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+# MIME types of the template images served from the templates directory
+ASSET_MIME_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg'
+}
+
+
+# =============================================================================
+# Helpers
+# =============================================================================
+
+def asset_not_found() -> tuple:
+    """Build the 404 response for unknown assets."""
+    return jsonify({
+        'success': False,
+        'errors': ['Asset not found.']
+    }), 404
+
+
+def asset_response(data: bytes, mime_type: str) -> Response:
+    """
+    Build an immutable, publicly cacheable asset response.
+
+    Args:
+        data: Asset bytes
+        mime_type: Content type of the asset
+
+    Returns:
+        Flask Response (304 Not Modified if If-None-Match matches)
+    """
+    response = Response(data, content_type=mime_type)
+    response.cache_control.public = True
+    response.cache_control.max_age = ASSET_MAX_AGE
+    response.cache_control.immutable = True
+    response.set_etag(hashlib.sha256(data).hexdigest())
+
+    return response.make_conditional(request)
+
+
+# =============================================================================
+# API Endpoints
+# =============================================================================
+
+@asset_blueprint.route('/assets/<name>', methods=['GET'])
+def get_template_asset(name: str):
+    """
+    Return an image the document template references.
+
+    HTTP Status Codes:
+        200: Image returned
+        304: Not Modified - If-None-Match matched the ETag
+        404: Not an asset of the template
+    """
+    if name not in PRINT_ASSETS:
+        return asset_not_found()
+
+    with open(os.path.join(TEMPLATE_DIR, name), 'rb') as asset_file:
+        data = asset_file.read()
+
+    extension = os.path.splitext(name)[1]
+    return asset_response(data, ASSET_MIME_TYPES.get(extension, 'application/octet-stream'))
+
+
+@asset_blueprint.route('/assets/logos/<name>', methods=['GET'])
+def get_logo(name: str):
+    """
+    Return an uploaded organization logo from the logo store.
+
+    HTTP Status Codes:
+        200: Logo returned
+        304: Not Modified - If-None-Match matched the ETag
+        404: Unknown or pruned logo
+    """
+    try:
+        data, mime_type = get_logo_store().read(LOGO_URL_PREFIX + name)
+    except (LogoError, OSError):
+        return asset_not_found()
+
+    return asset_response(data, mime_type)
@@ -0,0 +1,311 @@
+"""
+Batch Generation Routes
+=======================
+API endpoint for generating many IR documents in one request.
+
+Each questionnaire in the batch is validated on its own and rendered on
+the shared job queue, so several documents are generated concurrently.
+Markdown and text entries are rendered in the request thread and
+streamed into their archive entry piece by piece.
+
+With a "formats" list, every entry is rendered into each listed format
+in one pass (one data preparation and one render per template), and the
+archive holds one file per entry and format.
+The results are streamed back as a ZIP archive in submission order, with
+a manifest.json describing the outcome of every entry. An invalid or
+failing entry is reported in the manifest and never fails the batch.
+"""
+
+import io
+import json
+import zipfile
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from validators.input_validator import VALID_OUTPUT_FORMATS, validate_questionnaire
+from routes.ir_routes import RENDER_TIMEOUT_MESSAGE, submit_generation_job
+from utils.document_builder import STREAMABLE_FORMATS, stream_document
+from utils.job_queue import JOB_DONE, JOB_FAILED, JobTimeoutError, QueueFullError
+from utils.metrics import DOCUMENTS_TOTAL
+from utils.template_renderer import generate_filename
+
+
+# =============================================================================
+# Blueprint Configuration
+# =============================================================================
+
+batch_blueprint = Blueprint('batch', __name__)
+
+
+# =============================================================================
+# ZIP Streaming
+# =============================================================================
+
+class ZipStreamBuffer(io.RawIOBase):
+    """
+    Write-only, unseekable sink for zipfile.
+
+    zipfile detects that the stream cannot seek and writes data
+    descriptors instead of patching headers, so the archive can be sent
+    entry by entry while it is being built.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        """Return and forget everything written since the last drain."""
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def archive_entry_name(index: int, filename: str) -> str:
+    """Prefix a document filename with its position in the batch."""
+    return f'{index + 1:03d}_{filename}'
+
+
+# =============================================================================
+# Batch Processing
+# =============================================================================
+
+def generate_batch_archive(questionnaires: List[Any],
+                           formats: Optional[List[str]] = None) -> Iterator[bytes]:
+    """
+    Validate, render and zip a batch of questionnaires.
+
+    At most JOB_WORKERS documents are in flight at a time so that one
+    batch cannot fill the job queue on its own.
+
+    Args:
+        questionnaires: Raw questionnaire objects from the request
+        formats: Output formats of every entry (default: each entry's
+                 outputFormat)
+
+    Yields:
+        Chunks of the ZIP archive
+    """
+    job_queue = current_app.extensions['job_queue']
+    window = max(1, current_app.config['JOB_WORKERS'])
+    timeout = current_app.config['JOB_SYNC_TIMEOUT']
+
+    manifest: List[Dict[str, Any]] = [None] * len(questionnaires)
+    in_flight: List[Tuple[int, Dict[str, Any]]] = []
+
+    buffer = ZipStreamBuffer()
+    archive = zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED)
+
+    def finish_oldest() -> Iterator[bytes]:
+        """Wait for the oldest in-flight job and add it to the archive."""
+        index, job = in_flight.pop(0)
+        entry = manifest[index]
+
+        try:
+            job = job_queue.wait(job['id'], timeout)
+        except JobTimeoutError:
+            entry['status'] = 'failed'
+            entry['errors'] = ['Document generation took too long.']
+            return
+        except QueueFullError:
+            entry['status'] = 'failed'
+            entry['errors'] = ['The server is busy. Please retry this entry.']
+            return
+        finally:
+            job_queue.discard(job['id'])
+
+        if job['status'] != JOB_DONE:
+            entry['status'] = 'failed'
+            if job['timed_out']:
+                entry['errors'] = [RENDER_TIMEOUT_MESSAGE]
+            else:
+                entry['errors'] = ['Failed to generate document.']
+            return
+
+        if formats is not None:
+            # One file per format, named like the entry's main document
+            stem = job['filename'].rsplit('.', 1)[0]
+            entry['filenames'] = []
+            for output_format, document in job['result'].items():
+                name = archive_entry_name(index, f'{stem}.{output_format}')
+                archive.writestr(name, document)
+                entry['filenames'].append(name)
+                yield buffer.drain()
+            entry['status'] = 'ok'
+            return
+
+        archive.writestr(archive_entry_name(index, job['filename']), job['result'])
+        entry['status'] = 'ok'
+        entry['filename'] = archive_entry_name(index, job['filename'])
+        yield buffer.drain()
+
+    def stream_entry(index: int, validated_data: Dict[str, Any]) -> Iterator[bytes]:
+        """Render a Markdown/text entry straight into the archive."""
+        entry = manifest[index]
+        output_format = validated_data.get('outputFormat', 'md')
+        name = archive_entry_name(index, generate_filename(
+            validated_data.get('organizationName', 'Organization'),
+            output_format
+        ))
+
+        try:
+            with archive.open(name, mode='w') as entry_file:
+                for chunk in stream_document(validated_data, datetime.now()):
+                    entry_file.write(chunk)
+                    yield buffer.drain()
+        except Exception as e:
+            # Log the error (in production, use proper logging)
+            print(f'Batch entry {index} failed: {str(e)}')
+            DOCUMENTS_TOTAL.inc(format=output_format, status=JOB_FAILED)
+            entry['status'] = 'failed'
+            entry['errors'] = ['Failed to generate document.']
+            return
+
+        DOCUMENTS_TOTAL.inc(format=output_format, status=JOB_DONE)
+        entry['status'] = 'ok'
+        entry['filename'] = name
+        yield buffer.drain()
+
+    for index, data in enumerate(questionnaires):
+        manifest[index] = {'index': index, 'status': 'pending'}
+
+        if not isinstance(data, dict):
+            manifest[index].update(status='invalid', errors=['Entry must be a JSON object'])
+            continue
+
+        is_valid, validated_data, errors = validate_questionnaire(data)
+        if not is_valid:
+            manifest[index].update(status='invalid', errors=errors)
+            continue
+
+        output_format = validated_data.get('outputFormat', 'md')
+
+        if formats is None and output_format in STREAMABLE_FORMATS:
+            # Entries are archived in submission order
+            while in_flight:
+                yield from finish_oldest()
+            yield from stream_entry(index, validated_data)
+            continue
+
+        while len(in_flight) >= window:
+            yield from finish_oldest()
+
+        while True:
+            try:
+                job, _ = submit_generation_job(validated_data, formats)
+                break
+            except QueueFullError:
+                if not in_flight:
+                    manifest[index].update(
+                        status='failed',
+                        errors=['The server is busy. Please retry this entry.']
+                    )
+                    job = None
+                    break
+                # Free a slot by completing our own oldest job, then retry
+                yield from finish_oldest()
+            except Exception as e:
+                # Log the error (in production, use proper logging)
+                print(f'Batch entry {index} failed: {str(e)}')
+                manifest[index].update(status='failed', errors=['Failed to generate document.'])
+                job = None
+                break
+
+        if job is not None:
+            in_flight.append((index, job))
+
+    while in_flight:
+        yield from finish_oldest()
+
+    archive.writestr('manifest.json', json.dumps({
+        'generatedAt': datetime.now().isoformat(timespec='seconds'),
+        'total': len(questionnaires),
+        'succeeded': sum(1 for entry in manifest if entry['status'] == 'ok'),
+        'entries': manifest
+    }, indent=2))
+    archive.close()
+
+    yield buffer.drain()
+
+
+# =============================================================================
+# API Endpoints
+# =============================================================================
+
+@batch_blueprint.route('/generate-ir-template/batch', methods=['POST'])
+def generate_ir_template_batch():
+    """
+    Generate IR documents for several questionnaires at once.
+
+    Request Body (JSON):
+        {"questionnaires": [<questionnaire>, ...], "formats": [...]}
+        Each questionnaire uses the format of /api/generate-ir-template.
+        The optional formats list (e.g. ["md", "pdf"]) renders every
+        entry in each of those formats instead of its outputFormat.
+
+    Returns:
+        Streamed ZIP archive with one document per valid entry and a
+        manifest.json listing the status and errors of every entry
+
+    HTTP Status Codes:
+        200: Archive streamed (individual entries may have failed)
+        400: Bad Request - malformed body or too many entries
+        429: Too Many Requests - the batch costs more of the generation
+             budget than the client has left
+    """
+    if not request.is_json:
+        return jsonify({
+            'success': False,
+            'errors': ['Request must have Content-Type: application/json']
+        }), 400
+
+    try:
+        data = request.get_json()
+    except Exception:
+        return jsonify({
+            'success': False,
+            'errors': ['Invalid JSON in request body']
+        }), 400
+
+    questionnaires = data.get('questionnaires') if isinstance(data, dict) else None
+
+    if not isinstance(questionnaires, list) or not questionnaires:
+        return jsonify({
+            'success': False,
+            'errors': ['questionnaires: Must be a non-empty list of questionnaires.']
+        }), 400
+
+    max_items = current_app.config['BATCH_MAX_ITEMS']
+    if len(questionnaires) > max_items:
+        return jsonify({
+            'success': False,
+            'errors': [f'questionnaires: At most {max_items} questionnaires per batch.']
+        }), 400
+
+    formats = data.get('formats')
+    if formats is not None and (
+        not isinstance(formats, list) or not formats
+        or any(output_format not in VALID_OUTPUT_FORMATS for output_format in formats)
+        or len(set(formats)) != len(formats)
+    ):
+        return jsonify({
+            'success': False,
+            'errors': [f'formats: Must be a list of distinct formats out of: {", ".join(VALID_OUTPUT_FORMATS)}']
+        }), 400
+
+    filename = f'IR_Plans_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
+
+    response = Response(
+        stream_with_context(generate_batch_archive(questionnaires, formats)),
+        mimetype='application/zip'
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+    return response
@@ -5,14 +5,30 @@ API endpoints for generating NIST SP 800-61 compliant IR templates.
 """
 
 import base64
-from flask import Blueprint, request, jsonify
-from validators.input_validator import validate_questionnaire
-from utils.template_renderer import (
-    render_ir_template, 
-    generate_filename, 
-    convert_to_text
+import hashlib
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from flask_limiter.util import get_remote_address
+from validators.input_validator import get_questionnaire_options, validate_questionnaire
+from utils.template_renderer import generate_filename
+from utils.preview import (
+    PREVIEW_FORMATS,
+    PREVIEW_IGNORED_FIELDS,
+    PreviewTokenError,
+    get_preview_renderer
+)
+from utils.result_cache import compute_cache_key
+from utils.compression import PrecompressedResponse
+from utils.document_builder import STREAMABLE_FORMATS, stream_document
+from utils.job_queue import JOB_DONE, JOB_FAILED, JobTimeoutError, QueueFullError
+from utils.metrics import (
+    DOCUMENTS_TOTAL,
+    ERRORS_TOTAL,
+    RESULT_CACHE_TOTAL,
+    instrumented,
+    timed_stage
 )
-from utils.pdf_generator import generate_pdf_from_data
 
 
 # =============================================================================
@@ -21,46 +37,47 @@ from utils.pdf_generator import generate_pdf_from_data
 
 ir_blueprint = Blueprint('ir', __name__)
 
+# MIME types of the downloadable output formats
+OUTPUT_MIME_TYPES = {
+    'pdf': 'application/pdf',
+    'md': 'text/markdown; charset=utf-8',
+    'txt': 'text/plain; charset=utf-8',
+    'html': 'text/html; charset=utf-8'
+}
+
+# Shown when a document exceeded its render time budget; retrying the
+# same input would time out again
+RENDER_TIMEOUT_MESSAGE = (
+    'The document took too long to render. Shorten very long fields or '
+    'use a smaller logo, then try again.'
+)
+
+# Shown when no job slot or PDF render slot is free; retrying later works
+SERVER_BUSY_MESSAGE = 'The server is busy generating other documents. Please try again shortly.'
+
 
 # =============================================================================
-# API Endpoints
+# Request Helpers
 # =============================================================================
 
-@ir_blueprint.route('/generate-ir-template', methods=['POST'])
-def generate_ir_template():
+def parse_json_object() -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[Response, int]]]:
     """
-    Generate a NIST SP 800-61 compliant Incident Response template.
-    
-    This endpoint:
-    1. Receives questionnaire data as JSON
-    2. Validates all required fields
-    3. Renders the IR template using Jinja2
-    4. Returns the rendered document
+    Parse the JSON object in the current request body.
     
-    Request Body (JSON):
-        See validators/input_validator.py for the full field specification.
-        
     Returns:
-        JSON response with:
-        - success: Boolean indicating success/failure
-        - document: Rendered IR document (on success)
-        - filename: Suggested filename for download (on success)
-        - errors: List of validation errors (on failure)
-        
-    HTTP Status Codes:
-        200: Success - document generated
-        400: Bad Request - validation errors or missing data
-        500: Server Error - template rendering failed
+        Tuple of:
+        - data: The parsed object (None on failure)
+        - error_response: JSON error response and status (None on success)
     """
     # -------------------------------------------------------------------------
     # Verify request has JSON content
     # -------------------------------------------------------------------------
     
     if not request.is_json:
-        return jsonify({
+        return None, (jsonify({
             'success': False,
             'errors': ['Request must have Content-Type: application/json']
-        }), 400
+        }), 400)
     
     # -------------------------------------------------------------------------
     # Parse request data
@@ -69,69 +86,352 @@ def generate_ir_template():
     try:
         data = request.get_json()
     except Exception:
-        return jsonify({
+        return None, (jsonify({
             'success': False,
             'errors': ['Invalid JSON in request body']
-        }), 400
+        }), 400)
     
     if not data or not isinstance(data, dict):
-        return jsonify({
+        return None, (jsonify({
             'success': False,
             'errors': ['Request body must be a JSON object']
-        }), 400
+        }), 400)
+    
+    return data, None
+
+
+def parse_questionnaire_request() -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[Response, int]]]:
+    """
+    Parse and validate the questionnaire in the current request body.
+    
+    Returns:
+        Tuple of:
+        - validated_data: Sanitized questionnaire (None on failure)
+        - error_response: JSON error response and status (None on success)
+    """
+    data, error_response = parse_json_object()
+    
+    if error_response is not None:
+        return None, error_response
     
     # -------------------------------------------------------------------------
     # Validate input
     # -------------------------------------------------------------------------
     
-    is_valid, validated_data, errors = validate_questionnaire(data)
+    with timed_stage('validate'):
+        is_valid, validated_data, errors = validate_questionnaire(data)
     
     if not is_valid:
-        return jsonify({
+        return None, (jsonify({
             'success': False,
             'errors': errors
-        }), 400
+        }), 400)
+    
+    return validated_data, None
+
+
+def submit_generation_job(validated_data: Dict[str, Any],
+                          formats: Optional[List[str]] = None,
+                          published: bool = False) -> Tuple[Dict[str, Any], str]:
+    """
+    Queue a validated questionnaire for generation.
+    
+    Documents found in the result cache produce an already finished job.
+    PDF jobs for the same document as an unfinished job share its render
+    (see JOB_COALESCE).
+    
+    Args:
+        validated_data: Output of validate_questionnaire
+        formats: Render these formats in one pass instead of the
+                 questionnaire's outputFormat (bypasses the result cache)
+        published: Make the job visible to every web worker (jobs that
+                   clients poll by id)
+        
+    Returns:
+        Tuple of the job record and the cache status (HIT, MISS or BYPASS)
+        
+    Raises:
+        QueueFullError: If the job queue is at capacity
+    """
+    result_cache = current_app.extensions.get('result_cache')
+    job_queue = current_app.extensions['job_queue']
+    
+    output_format = validated_data.get('outputFormat', 'md')
+    
+    # Generate filename
+    filename = generate_filename(
+        validated_data.get('organizationName', 'Organization'),
+        output_format
+    )
+    
+    generated_at = datetime.now()
+    cache_key = None
+    cached_result = None
+    cache_status = 'BYPASS'
+    
+    if result_cache is not None and formats is None:
+        cache_key = compute_cache_key(validated_data, generated_at)
+        cached_result = result_cache.get(cache_key)
+        cache_status = 'MISS' if cached_result is None else 'HIT'
+    
+    RESULT_CACHE_TOTAL.inc(result=cache_status.lower())
+    
+    # Identical concurrent submissions wait for one render
+    flight_key = None
+    if current_app.config['JOB_COALESCE'] and cached_result is None:
+        flight_key = cache_key or compute_cache_key(validated_data, generated_at)
+        if formats is not None:
+            flight_key = f'{flight_key}:{",".join(formats)}'
+    
+    job = job_queue.submit(
+        validated_data,
+        generated_at,
+        filename,
+        cache_key=cache_key,
+        cached_result=cached_result,
+        formats=formats,
+        flight_key=flight_key,
+        published=published
+    )
+    
+    return job, cache_status
+
+
+def wants_binary_response(output_format: str) -> bool:
+    """
+    Decide whether the client asked for the raw document instead of JSON.
+    
+    The raw document is sent when the query string contains binary=1, or
+    when the Accept header ranks the document's MIME type strictly above
+    application/json (e.g. "Accept: application/pdf"). Clients that accept
+    both equally, such as the bundled frontend, keep the JSON envelope.
+    
+    Args:
+        output_format: Requested output format
+        
+    Returns:
+        True if a binary response should be sent
+    """
+    if request.args.get('binary', '').lower() in ('1', 'true', 'yes'):
+        return True
+    
+    mime_type = OUTPUT_MIME_TYPES.get(output_format, 'application/octet-stream')
+    accept = request.accept_mimetypes
+    
+    return accept[mime_type.split(';')[0]] > accept['application/json']
+
+
+def document_response(document_bytes: bytes, output_format: str,
+                      filename: str) -> Response:
+    """
+    Build a raw document response with download and caching headers.
+    
+    Sets Content-Type, Content-Disposition, Content-Length and a strong
+    ETag derived from the document bytes. On GET requests a matching
+    If-None-Match header turns the response into 304 Not Modified.
+    
+    Args:
+        document_bytes: Rendered document
+        output_format: Output format of the document
+        filename: Suggested download filename
+        
+    Returns:
+        Flask Response
+    """
+    response = Response(
+        document_bytes,
+        content_type=OUTPUT_MIME_TYPES.get(output_format, 'application/octet-stream')
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.set_etag(hashlib.sha256(document_bytes).hexdigest())
+    
+    return response.make_conditional(request)
+
+
+def streamed_document_response(validated_data: Dict[str, Any]) -> Response:
+    """
+    Send a Markdown or text document while it is being rendered.
+    
+    The document is rendered in the request thread and written to the
+    client in chunks, so the first bytes leave before the last section is
+    rendered and the full document is never built as one string. A
+    cached document is sent as a regular response instead; a freshly
+    streamed one is added to the result cache once it is complete.
+    
+    Args:
+        validated_data: Output of validate_questionnaire (md or txt format)
+        
+    Returns:
+        Flask Response
+    """
+    result_cache = current_app.extensions.get('result_cache')
+    output_format = validated_data.get('outputFormat', 'md')
+    
+    filename = generate_filename(
+        validated_data.get('organizationName', 'Organization'),
+        output_format
+    )
+    
+    generated_at = datetime.now()
+    cache_key = None
+    cache_status = 'BYPASS'
+    
+    if result_cache is not None:
+        cache_key = compute_cache_key(validated_data, generated_at)
+        cached_result = result_cache.get(cache_key)
+        cache_status = 'MISS' if cached_result is None else 'HIT'
+        
+        if cached_result is not None:
+            RESULT_CACHE_TOTAL.inc(result='hit')
+            DOCUMENTS_TOTAL.inc(format=output_format, status=JOB_DONE)
+            response = document_response(cached_result, output_format, filename)
+            response.headers['X-Cache'] = cache_status
+            return response
+    
+    RESULT_CACHE_TOTAL.inc(result=cache_status.lower())
+    
+    def generate() -> Iterator[bytes]:
+        chunks = [] if cache_key is not None else None
+        try:
+            for chunk in stream_document(validated_data, generated_at):
+                if chunks is not None:
+                    chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            # Headers are already sent; the client sees a truncated body
+            print(f'Template rendering error: {str(e)}')
+            DOCUMENTS_TOTAL.inc(format=output_format, status=JOB_FAILED)
+            raise
+        
+        DOCUMENTS_TOTAL.inc(format=output_format, status=JOB_DONE)
+        if chunks is not None:
+            result_cache.set(cache_key, b''.join(chunks))
+    
+    response = Response(
+        stream_with_context(generate()),
+        content_type=OUTPUT_MIME_TYPES[output_format]
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Cache'] = cache_status
+    
+    return response
+
+
+def queue_full_response() -> Tuple[Response, int]:
+    """Build the 503 response sent when the job queue is at capacity."""
+    response = jsonify({
+        'success': False,
+        'errors': [SERVER_BUSY_MESSAGE]
+    })
+    response.headers['Retry-After'] = str(current_app.config['JOB_RETRY_AFTER'])
+    
+    return response, 503
+
+
+def render_timeout_response() -> Tuple[Response, int]:
+    """Build the 504 response sent when a render exceeded its time budget."""
+    return jsonify({
+        'success': False,
+        'errors': [RENDER_TIMEOUT_MESSAGE]
+    }), 504
+
+
+# =============================================================================
+# API Endpoints
+# =============================================================================
+
+@ir_blueprint.route('/generate-ir-template', methods=['POST'])
+@instrumented('generate_ir_template')
+def generate_ir_template():
+    """
+    Generate a NIST SP 800-61 compliant Incident Response template.
+    
+    This endpoint:
+    1. Receives questionnaire data as JSON
+    2. Validates all required fields
+    3. Queues the document on the job queue and waits for it
+    4. Returns the rendered document
+    
+    It is a synchronous wrapper around the job API (see job_routes.py),
+    kept for clients that cannot poll.
+    
+    The document is wrapped in JSON (PDFs base64-encoded) unless the
+    client asks for the raw bytes with ?binary=1 or an Accept header that
+    prefers the document type (see wants_binary_response). Raw Markdown
+    and text documents are streamed while they are rendered.
+    
+    Request Body (JSON):
+        See validators/input_validator.py for the full field specification.
+        
+    Returns:
+        JSON response with:
+        - success: Boolean indicating success/failure
+        - document: Rendered IR document (on success)
+        - filename: Suggested filename for download (on success)
+        - errors: List of validation errors (on failure)
+        or, in binary mode, the document itself on success
+        
+    HTTP Status Codes:
+        200: Success - document generated
+        400: Bad Request - validation errors or missing data
+        500: Server Error - template rendering failed
+        503: Service Unavailable - job queue is full
+        504: Gateway Timeout - generation did not finish in time, or the
+             document exceeded its render time budget
+    """
+    validated_data, error_response = parse_questionnaire_request()
+    
+    if error_response is not None:
+        ERRORS_TOTAL.inc(reason='bad_request')
+        return error_response
+    
+    # -------------------------------------------------------------------------
+    # Stream raw Markdown/text documents while they are rendered
+    # -------------------------------------------------------------------------
+    
+    output_format = validated_data.get('outputFormat', 'md')
+    
+    if output_format in STREAMABLE_FORMATS and wants_binary_response(output_format):
+        return streamed_document_response(validated_data)
     
     # -------------------------------------------------------------------------
-    # Render template
+    # Render template on the job queue (or serve it from the result cache)
     # -------------------------------------------------------------------------
     
+    job_queue = current_app.extensions['job_queue']
+    
     try:
-        # Get output format
-        output_format = validated_data.get('outputFormat', 'md')
+        job, cache_status = submit_generation_job(validated_data)
         
-        # Generate filename
-        filename = generate_filename(
-            validated_data.get('organizationName', 'Organization'),
-            output_format
-        )
+        try:
+            with timed_stage('job_wait'):
+                job = job_queue.wait(job['id'], current_app.config['JOB_SYNC_TIMEOUT'])
+        finally:
+            # Synchronous callers get the result directly; don't retain it
+            job_queue.discard(job['id'])
         
-        # Handle PDF generation separately
-        if output_format == 'pdf':
-            # Generate PDF using WeasyPrint
-            pdf_bytes = generate_pdf_from_data(validated_data)
-            
-            # Convert to base64 for JSON transmission
-            pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
-            
-            return jsonify({
-                'success': True,
-                'document': pdf_base64,
-                'filename': filename,
-                'isPdf': True
-            }), 200
+        if job['timed_out']:
+            ERRORS_TOTAL.inc(reason='render_timeout')
+            return render_timeout_response()
         
-        # Handle Markdown and Text formats
-        # Render the IR document
-        document = render_ir_template(validated_data)
-        
-        # Convert to text if requested
-        if output_format == 'txt':
-            document = convert_to_text(document)
+        if job['status'] != JOB_DONE:
+            raise RuntimeError(job['error'])
         
+    except QueueFullError:
+        ERRORS_TOTAL.inc(reason='queue_full')
+        return queue_full_response()
+    
+    except JobTimeoutError:
+        ERRORS_TOTAL.inc(reason='timeout')
+        return jsonify({
+            'success': False,
+            'errors': ['Document generation took too long. Please try again.']
+        }), 504
+    
     except Exception as e:
         # Log the error (in production, use proper logging)
         print(f'Template rendering error: {str(e)}')
+        ERRORS_TOTAL.inc(reason='generation_failed')
         
         return jsonify({
             'success': False,
@@ -142,11 +442,34 @@ def generate_ir_template():
     # Return success response
     # -------------------------------------------------------------------------
     
-    return jsonify({
-        'success': True,
-        'document': document,
-        'filename': filename
-    }), 200
+    document_bytes = job['result']
+    
+    # Encode the response (base64/JSON or raw bytes)
+    with timed_stage('encode'):
+        if wants_binary_response(job['output_format']):
+            response = document_response(
+                document_bytes, job['output_format'], job['filename']
+            )
+        elif job['output_format'] == 'pdf':
+            # Convert to base64 for JSON transmission
+            pdf_base64 = base64.b64encode(document_bytes).decode('utf-8')
+        
+            response = jsonify({
+                'success': True,
+                'document': pdf_base64,
+                'filename': job['filename'],
+                'isPdf': True
+            })
+        else:
+            response = jsonify({
+                'success': True,
+                'document': document_bytes.decode('utf-8'),
+                'filename': job['filename']
+            })
+    
+    response.headers['X-Cache'] = cache_status
+    
+    return response, 200
 
 
 @ir_blueprint.route('/template-options', methods=['GET'])
@@ -160,15 +483,139 @@ def get_template_options():
     - Communication channels
     - Output formats
     
+    The options come from the questionnaire schema that validates
+    submissions, so both always agree. They only change with the code,
+    so the body is built and compressed once per worker and served with
+    Cache-Control and a strong ETag.
+    
     Returns:
         JSON object with all available options
+        
+    HTTP Status Codes:
+        200: Options returned
+        304: Not Modified - If-None-Match matched the ETag
     """
-    return jsonify({
-        'infrastructureOptions': ['AWS', 'Azure', 'GCP', 'On-Premises'],
-        'severityLevels': ['Low', 'Medium', 'High', 'Critical'],
-        'communicationChannels': ['Email', 'Phone', 'Slack', 'Microsoft Teams', 'Other'],
-        'outputFormats': [
-            {'value': 'pdf', 'label': 'PDF (.pdf)'}
-        ]
-    }), 200
+    options = current_app.extensions.get('template_options')
+    if options is None:
+        options = PrecompressedResponse(
+            current_app.json.dumps(get_questionnaire_options()).encode('utf-8'),
+            'application/json',
+            f"public, max-age={current_app.config['TEMPLATE_OPTIONS_MAX_AGE']}"
+        )
+        current_app.extensions['template_options'] = options
+    
+    return options.response()
+
 
+@ir_blueprint.route('/preview', methods=['POST'])
+@instrumented('preview')
+def preview_document():
+    """
+    Render an incremental live preview of the Markdown/text document.
+    
+    The first request sends the whole questionnaire without a token and
+    receives every section. Later requests send only the changed fields
+    and the token of the preview the client currently shows; they receive
+    the sections whose text changed. Each response carries a new token.
+    
+    Request Body (JSON):
+        - fields: Questionnaire fields (all of them without a token;
+                  organizationLogo is ignored)
+        - token: Token of the previous preview (optional)
+        - format: 'md' (default) or 'txt'
+        
+    Returns:
+        JSON response with:
+        - success: Boolean indicating success/failure
+        - token: Token of this preview, for the next request
+        - sectionCount: Number of sections of the document
+        - sections: Changed sections as {index, content} objects
+        - full: True if every section was sent
+        - errors: List of validation errors (on failure)
+        
+    HTTP Status Codes:
+        200: Success - preview rendered
+        400: Bad Request - validation errors or missing data
+        409: Conflict - the token is unknown, expired or was issued to
+             another client; resend all fields
+    """
+    body, error_response = parse_json_object()
+    
+    if error_response is not None:
+        ERRORS_TOTAL.inc(reason='bad_request')
+        return error_response
+    
+    fields = body.get('fields')
+    token = body.get('token')
+    output_format = body.get('format', 'md')
+    
+    if not isinstance(fields, dict):
+        ERRORS_TOTAL.inc(reason='bad_request')
+        return jsonify({
+            'success': False,
+            'errors': ['fields: Must be a JSON object.']
+        }), 400
+    
+    if output_format not in PREVIEW_FORMATS:
+        ERRORS_TOTAL.inc(reason='bad_request')
+        return jsonify({
+            'success': False,
+            'errors': [f'format: Invalid option. Must be one of: {", ".join(PREVIEW_FORMATS)}']
+        }), 400
+    
+    # -------------------------------------------------------------------------
+    # Merge the changed fields into the previous preview's questionnaire
+    # -------------------------------------------------------------------------
+    
+    # The logo is not printed in Markdown/text; don't validate or keep it
+    fields = {
+        name: value for name, value in fields.items()
+        if name not in PREVIEW_IGNORED_FIELDS
+    }
+    
+    renderer = get_preview_renderer()
+    client = get_remote_address()
+    base = None
+    
+    if token is not None:
+        try:
+            base = renderer.get(str(token), client)
+        except PreviewTokenError:
+            return jsonify({
+                'success': False,
+                'errors': ['Preview expired. Please send the full questionnaire.']
+            }), 409
+        
+        raw_data = {**base.raw_data, **fields}
+    else:
+        raw_data = dict(fields)
+    
+    with timed_stage('validate'):
+        is_valid, validated_data, errors = validate_questionnaire(raw_data)
+    
+    if not is_valid:
+        ERRORS_TOTAL.inc(reason='bad_request')
+        return jsonify({
+            'success': False,
+            'errors': errors
+        }), 400
+    
+    # -------------------------------------------------------------------------
+    # Render the changed sections
+    # -------------------------------------------------------------------------
+    
+    render, changed = renderer.render(client, raw_data, validated_data, output_format, base)
+    
+    with timed_stage('encode'):
+        response = jsonify({
+            'success': True,
+            'token': render.token,
+            'sectionCount': len(render.sections),
+            'sections': [
+                {'index': index, 'content': render.sections[index]}
+                for index in changed
+            ],
+            'full': base is None
+        })
+    
+    return response, 200
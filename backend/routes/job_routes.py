@@ -0,0 +1,177 @@
+"""
+Generation Job Routes
+=====================
+Asynchronous API for generating IR documents.
+
+Clients submit a questionnaire, receive a job id immediately, poll the
+job's status and download the document once it is done. Unlike
+/api/generate-ir-template, no request ever waits for WeasyPrint.
+"""
+
+from flask import Blueprint, current_app, jsonify, url_for
+from routes.ir_routes import (
+    RENDER_TIMEOUT_MESSAGE,
+    SERVER_BUSY_MESSAGE,
+    document_response,
+    parse_questionnaire_request,
+    queue_full_response,
+    submit_generation_job
+)
+from utils.job_queue import JOB_DONE, JOB_FAILED, QueueFullError
+from utils.metrics import ERRORS_TOTAL, instrumented
+
+
+# =============================================================================
+# Blueprint Configuration
+# =============================================================================
+
+job_blueprint = Blueprint('jobs', __name__)
+
+
+# =============================================================================
+# Helpers
+# =============================================================================
+
+def serialize_job(job: dict) -> dict:
+    """
+    Build the public JSON representation of a job.
+
+    Args:
+        job: Job record from the job queue
+
+    Returns:
+        Dictionary safe to return to clients
+    """
+    job_queue = current_app.extensions['job_queue']
+
+    payload = {
+        'success': job['status'] != JOB_FAILED,
+        'jobId': job['id'],
+        'status': job['status'],
+        'filename': job['filename'],
+        'createdAt': job['created_at'],
+        'finishedAt': job['finished_at'],
+        'expiresAt': job_queue.expires_at(job),
+        'statusUrl': url_for('jobs.get_job_status', job_id=job['id'])
+    }
+
+    if job['status'] == JOB_DONE:
+        payload['downloadUrl'] = url_for('jobs.download_job', job_id=job['id'])
+
+    if job['status'] == JOB_FAILED and job['timed_out']:
+        payload['timedOut'] = True
+        payload['errors'] = [RENDER_TIMEOUT_MESSAGE]
+    elif job['status'] == JOB_FAILED and job['rejected']:
+        # Shared a render that found every PDF render slot busy
+        payload['busy'] = True
+        payload['errors'] = [SERVER_BUSY_MESSAGE]
+    elif job['status'] == JOB_FAILED:
+        # Internal error details stay in the server log
+        payload['errors'] = ['Failed to generate document. Please try again.']
+
+    usage = job['usage']
+    if usage is not None:
+        # Resources the PDF worker spent on this job
+        payload['usage'] = {
+            'workerPid': usage['worker_pid'],
+            'wallSeconds': round(usage['wall_seconds'], 4),
+            'cpuSeconds': round(usage['cpu_seconds'], 4),
+            'peakRssBytes': usage['peak_rss'],
+            'rssBytes': usage['rss']
+        }
+
+    return payload
+
+
+def job_not_found() -> tuple:
+    """Build the 404 response for unknown or expired jobs."""
+    return jsonify({
+        'success': False,
+        'errors': ['Job not found. It may have expired.']
+    }), 404
+
+
+# =============================================================================
+# API Endpoints
+# =============================================================================
+
+@job_blueprint.route('/jobs', methods=['POST'])
+@instrumented('submit_job')
+def submit_job():
+    """
+    Queue an IR document for background generation.
+
+    Request Body (JSON):
+        Same questionnaire as /api/generate-ir-template.
+
+    Returns:
+        JSON job description with statusUrl for polling
+
+    HTTP Status Codes:
+        202: Accepted - job queued (or already finished from cache)
+        400: Bad Request - validation errors or missing data
+        503: Service Unavailable - job queue is full
+    """
+    validated_data, error_response = parse_questionnaire_request()
+
+    if error_response is not None:
+        ERRORS_TOTAL.inc(reason='bad_request')
+        return error_response
+
+    try:
+        # Polled by id, possibly through another web worker
+        job, cache_status = submit_generation_job(validated_data, published=True)
+    except QueueFullError:
+        ERRORS_TOTAL.inc(reason='queue_full')
+        return queue_full_response()
+
+    response = jsonify(serialize_job(job))
+    response.headers['Location'] = url_for('jobs.get_job_status', job_id=job['id'])
+    response.headers['X-Cache'] = cache_status
+
+    return response, 202
+
+
+@job_blueprint.route('/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id: str):
+    """
+    Return the status of a generation job.
+
+    Returns:
+        JSON job description (status is queued, running, done or failed)
+
+    HTTP Status Codes:
+        200: Job found
+        404: Unknown or expired job
+    """
+    job = current_app.extensions['job_queue'].get(job_id)
+
+    if job is None:
+        return job_not_found()
+
+    return jsonify(serialize_job(job)), 200
+
+
+@job_blueprint.route('/jobs/<job_id>/download', methods=['GET'])
+def download_job(job_id: str):
+    """
+    Download the document produced by a finished job.
+
+    Returns:
+        The document with Content-Disposition and ETag headers
+
+    HTTP Status Codes:
+        200: Document returned
+        304: Not Modified - If-None-Match matched the ETag
+        404: Unknown or expired job
+        409: Job not finished yet (or failed)
+    """
+    job = current_app.extensions['job_queue'].get(job_id)
+
+    if job is None:
+        return job_not_found()
+
+    if job['status'] != JOB_DONE:
+        return jsonify(serialize_job(job)), 409
+
+    return document_response(job['result'], job['output_format'], job['filename'])
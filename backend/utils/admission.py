@@ -0,0 +1,328 @@
+"""
+Admission Control Module
+========================
+Decides which generation requests a node accepts, shared by all of its
+web worker processes.
+
+Two mechanisms work together:
+- Rate limits: Flask-Limiter counts requests per client in a SQLite file
+  (SQLiteStorage, registered as the ``sqlite://`` storage scheme), so
+  every worker sees the same counters. Generation requests are weighted
+  by cost: a PDF uses up more of a client's budget than a Markdown or
+  text document, and a batch costs as much as all of its documents
+- Render slots: at most PDF_MAX_INFLIGHT PDF renders run on the node at
+  once. A slot is an exclusive lock on one of N slot files; it is held
+  from job submission until the job finishes, and the OS releases it if
+  the holding process dies. A request that finds no free slot waits
+  briefly, then is answered with 503 and Retry-After
+
+Both only need a local directory, so no extra service has to run next
+to the application. Point RATELIMIT_STORAGE_URI at Redis to share rate
+limits between nodes.
+"""
+
+import fcntl
+import functools
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, List, Optional
+from flask import current_app, jsonify, request
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from limits import parse
+from limits.storage import Storage
+
+
+# =============================================================================
+# Shared Rate Limit Storage
+# =============================================================================
+
+class SQLiteStorage(Storage):
+    """
+    Rate limit counters in a SQLite database shared by local processes.
+
+    Usage: ``Limiter(storage_uri='sqlite:///var/tmp/ratelimit.sqlite')``
+
+    Supports the fixed-window strategy (Flask-Limiter's default). Every
+    update is a single atomic statement, so concurrent workers never lose
+    a hit.
+    """
+
+    STORAGE_SCHEME = ['sqlite']
+
+    # Expired counters are deleted when the storage is opened and after
+    # every this many increments
+    PURGE_INTERVAL = 1000
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        """
+        Args:
+            uri: sqlite:// followed by the absolute database path
+            wrap_exceptions: Wrap SQLite errors in limits' StorageError
+        """
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = uri[len('sqlite://'):]
+        if not self.path:
+            raise ValueError('sqlite:// storage needs a database path')
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._local = threading.local()
+        self._increments = 0
+
+        with self._connection() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS counters ('
+                'key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL NOT NULL)'
+            )
+            # Windows of earlier runs that have ended must not count again
+            connection.execute('DELETE FROM counters WHERE expires_at <= ?', (time.time(),))
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use."""
+        # A connection must not be used across fork (e.g. one opened while
+        # a preloaded app was created in gunicorn's master process)
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def incr(self, key: str, expiry: int, elastic_expiry: bool = False,
+             amount: int = 1) -> int:
+        """Add amount to a counter, starting a new window if it expired."""
+        now = time.time()
+        expires_at = now + expiry
+
+        value = self._connection().execute(
+            'INSERT INTO counters (key, value, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'value = CASE WHEN expires_at <= ? THEN excluded.value ELSE value + excluded.value END, '
+            'expires_at = CASE WHEN expires_at <= ? OR ? THEN excluded.expires_at ELSE expires_at END '
+            'RETURNING value',
+            (key, amount, expires_at, now, now, int(elastic_expiry))
+        ).fetchone()[0]
+
+        self._increments += 1
+        if self._increments % self.PURGE_INTERVAL == 0:
+            self._connection().execute('DELETE FROM counters WHERE expires_at <= ?', (now,))
+
+        return value
+
+    def get(self, key: str) -> int:
+        """Return the current value of a counter (0 if expired)."""
+        row = self._connection().execute(
+            'SELECT value FROM counters WHERE key = ? AND expires_at > ?',
+            (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        """Return the time a counter's window ends."""
+        now = time.time()
+        row = self._connection().execute(
+            'SELECT expires_at FROM counters WHERE key = ? AND expires_at > ?',
+            (key, now)
+        ).fetchone()
+        return row[0] if row else now
+
+    def check(self) -> bool:
+        """Return True if the database can be queried."""
+        try:
+            self._connection().execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        """Delete every counter and return how many there were."""
+        return self._connection().execute('DELETE FROM counters').rowcount
+
+    def clear(self, key: str) -> None:
+        """Delete one counter."""
+        self._connection().execute('DELETE FROM counters WHERE key = ?', (key,))
+
+
+# =============================================================================
+# Request Cost
+# =============================================================================
+
+def document_cost(output_format: Any) -> int:
+    """Return the rate limit cost of one document in a format."""
+    if output_format == 'pdf':
+        return max(1, current_app.config['PDF_RATE_COST'])
+    return max(1, current_app.config['TEXT_RATE_COST'])
+
+
+def generation_cost() -> int:
+    """
+    Return the rate limit cost of the current generation request.
+
+    Used as Flask-Limiter's cost callable. Requests that cannot be parsed
+    cost as much as a text document; they are rejected by validation.
+
+    A batch ({"questionnaires": [...]}) costs the sum of its documents:
+    every entry in each of the batch's formats, or in its own
+    outputFormat.
+
+    Returns:
+        Cost of the requested documents (at least 1)
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return document_cost(None)
+
+    questionnaires = data.get('questionnaires')
+    if not isinstance(questionnaires, list):
+        return document_cost(data.get('outputFormat'))
+
+    # Larger batches are rejected by the route; do not charge for them
+    entries = questionnaires[:current_app.config['BATCH_MAX_ITEMS']]
+    formats = data.get('formats')
+
+    if isinstance(formats, list) and formats:
+        batch_cost = len(entries) * sum(document_cost(output_format) for output_format in formats)
+    else:
+        batch_cost = sum(
+            document_cost(entry.get('outputFormat') if isinstance(entry, dict) else None)
+            for entry in entries
+        )
+
+    return max(1, batch_cost)
+
+
+def require_budget(limiter: Limiter, limit: str, scope: str,
+                   cost: Callable[[], int]) -> Callable:
+    """
+    Build a view decorator that rejects requests the client cannot afford.
+
+    Flask-Limiter adds a request's cost to the counter before comparing,
+    so a request costing more than the client has left would be rejected
+    and still use up the rest of the window. Views wrapped in this
+    decorator are answered with 429 and Retry-After instead, without
+    charging anything; the shared limit itself charges the requests that
+    fit.
+
+    Args:
+        limiter: The application's Limiter
+        limit: Limit string of the shared limit (e.g. "60 per minute")
+        scope: Scope of the shared limit
+        cost: Cost callable of the shared limit
+
+    Returns:
+        Decorator for view functions
+    """
+    item = parse(limit)
+
+    def decorator(view: Callable) -> Callable:
+        @functools.wraps(view)
+        def guarded(*args, **kwargs):
+            if not limiter.enabled:
+                return view(*args, **kwargs)
+
+            identifiers = (get_remote_address(), scope)
+            if limiter.limiter.test(item, *identifiers, cost=cost()):
+                return view(*args, **kwargs)
+
+            response = jsonify({
+                'success': False,
+                'error': 'Rate limit exceeded: this request costs more than the remaining budget.'
+            })
+
+            # Without a running window the request exceeds the whole
+            # budget; it can only fit after splitting it up
+            retry_after = limiter.limiter.get_window_stats(item, *identifiers).reset_time - time.time()
+            if retry_after <= 0:
+                retry_after = item.get_expiry()
+            response.headers['Retry-After'] = str(max(1, int(retry_after)))
+            return response, 429
+
+        return guarded
+
+    return decorator
+
+
+# =============================================================================
+# PDF Render Slots
+# =============================================================================
+
+class RenderSlot:
+    """A held render slot; release it exactly once."""
+
+    def __init__(self, slots: 'RenderSlots', fd: int):
+        self._slots = slots
+        self._fd: Optional[int] = fd
+
+    def release(self) -> None:
+        """Give the slot back (further calls do nothing)."""
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            self._slots._release(fd)
+
+
+class RenderSlots:
+    """Node-wide cap on concurrent PDF renders, using file locks."""
+
+    # Seconds between attempts while waiting for a free slot
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, directory: str, capacity: int):
+        """
+        Args:
+            directory: Directory holding the slot files (shared by all
+                       processes on the node)
+            capacity: Number of PDF renders allowed at once
+        """
+        self.directory = directory
+        self.capacity = capacity
+        os.makedirs(directory, exist_ok=True)
+        self._paths: List[str] = [
+            os.path.join(directory, f'pdf-slot-{index}.lock') for index in range(capacity)
+        ]
+
+    def try_acquire(self) -> Optional[RenderSlot]:
+        """Take a free slot without waiting, or return None."""
+        for path in self._paths:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            return RenderSlot(self, fd)
+        return None
+
+    def acquire(self, timeout: float) -> Optional[RenderSlot]:
+        """
+        Take a free slot, waiting up to timeout seconds for one.
+
+        Args:
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            The held slot, or None if every slot stayed busy
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            slot = self.try_acquire()
+            if slot is not None or time.monotonic() >= deadline:
+                return slot
+            time.sleep(self.POLL_INTERVAL)
+
+    def _release(self, fd: int) -> None:
+        """Unlock and close a slot file."""
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
@@ -0,0 +1,308 @@
+"""
+Asset Cache Module
+==================
+Keeps the static assets used for PDF generation in memory.
+
+WeasyPrint normally re-reads and re-parses the stylesheet and re-decodes
+every image for each document. This module keeps them between renders:
+- The PDF stylesheet is parsed once into a reusable CSS object
+- Local files (images, stylesheets) are served from memory by a custom
+  WeasyPrint url_fetcher
+- Decoded images are kept in a persistent WeasyPrint image cache
+- Uploaded logos are served from the logo store, and the most recently
+  used decoded logos are kept as well
+- Font configuration is reused by every render of the same thread
+
+Every entry is keyed on the file's modification time, so editing an asset
+on disk invalidates it on the next render.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from hashlib import md5
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+from weasyprint import CSS, default_url_fetcher
+from weasyprint.text.fonts import FontConfiguration
+from utils.logo_store import get_logo_store, is_logo_url
+
+
+# =============================================================================
+# Asset Directory Configuration
+# =============================================================================
+
+# Get the directory where this module is located
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Templates and their static assets live in the backend/templates directory
+TEMPLATE_DIR = os.path.join(os.path.dirname(CURRENT_DIR), 'templates')
+
+# Stylesheet applied to every generated PDF
+STYLESHEET_NAME = 'pdf_styles.css'
+
+# Decoded logos kept between renders
+MAX_RETAINED_LOGOS = 32
+
+
+# =============================================================================
+# Asset Cache
+# =============================================================================
+
+class AssetCache:
+    """
+    In-memory cache of the static assets of one template directory.
+
+    The cache is safe to share between threads. Font configurations are
+    kept per thread because Pango font maps must not be used concurrently.
+    """
+
+    def __init__(self, base_dir: str, stylesheet_name: str = STYLESHEET_NAME):
+        """
+        Initialize an empty cache.
+
+        Args:
+            base_dir: Directory whose files are served from memory
+            stylesheet_name: Stylesheet parsed once and applied to every PDF
+        """
+        self.base_dir = os.path.realpath(base_dir)
+        self.stylesheet_path = os.path.join(self.base_dir, stylesheet_name)
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        # path -> (mtime, raw bytes)
+        self._files: Dict[str, Tuple[int, bytes]] = {}
+
+        # (mtime, parsed stylesheet)
+        self._stylesheet: Optional[Tuple[int, CSS]] = None
+
+        # WeasyPrint image cache entries and the mtimes they were built from
+        # (None for logos, which are content-addressed and never change)
+        self._images: Dict[str, Any] = {}
+        self._image_versions: Dict[str, Optional[int]] = {}
+
+        # Retained logo URLs, least recently used first
+        self._logos: 'OrderedDict[str, None]' = OrderedDict()
+
+    # -------------------------------------------------------------------------
+    # Local files
+    # -------------------------------------------------------------------------
+
+    def local_path(self, url: str) -> Optional[str]:
+        """
+        Map a file:// URL to a path inside the cached directory.
+
+        Args:
+            url: URL requested by WeasyPrint
+
+        Returns:
+            Absolute file path, or None if the URL is not a cached asset
+        """
+        parsed = urlparse(url)
+        if parsed.scheme != 'file':
+            return None
+
+        path = os.path.realpath(url2pathname(parsed.path))
+        if os.path.dirname(path) != self.base_dir:
+            return None
+
+        return path
+
+    def read_file(self, path: str) -> bytes:
+        """
+        Return the contents of a local asset, reading it only when changed.
+
+        Args:
+            path: Absolute path inside the cached directory
+
+        Returns:
+            File contents as bytes
+        """
+        mtime = os.stat(path).st_mtime_ns
+        entry = self._files.get(path)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        with open(path, 'rb') as asset_file:
+            data = asset_file.read()
+
+        with self._lock:
+            self._files[path] = (mtime, data)
+
+        return data
+
+    def url_fetcher(self, url: str, timeout: int = 10,
+                    ssl_context: Any = None) -> Dict[str, Any]:
+        """
+        WeasyPrint url_fetcher serving local assets from memory.
+
+        The stylesheet linked from the HTML template is answered with an
+        empty document: the same rules are already applied through the
+        cached CSS object from get_stylesheet(), so parsing it a second
+        time for every render would only repeat work.
+
+        Args:
+            url: URL of the resource to fetch
+            timeout: Timeout for remote resources
+            ssl_context: SSL context for remote resources
+
+        Returns:
+            Dictionary in the format expected by WeasyPrint
+        """
+        if is_logo_url(url):
+            data, mime_type = get_logo_store().read(url)
+            return {'string': data, 'mime_type': mime_type, 'redirected_url': url}
+
+        path = self.local_path(url)
+        if path is None:
+            return default_url_fetcher(url, timeout, ssl_context)
+
+        if path == self.stylesheet_path:
+            return {'string': b'', 'mime_type': 'text/css', 'redirected_url': url}
+
+        return {'string': self.read_file(path), 'redirected_url': url}
+
+    # -------------------------------------------------------------------------
+    # Stylesheet and fonts
+    # -------------------------------------------------------------------------
+
+    @property
+    def font_config(self) -> FontConfiguration:
+        """Font configuration reused by every render of the calling thread."""
+        font_config = getattr(self._local, 'font_config', None)
+        if font_config is None:
+            font_config = FontConfiguration()
+            self._local.font_config = font_config
+        return font_config
+
+    def get_stylesheet(self) -> CSS:
+        """
+        Return the parsed PDF stylesheet, re-parsing it only when changed.
+
+        Returns:
+            WeasyPrint CSS object
+        """
+        mtime = os.stat(self.stylesheet_path).st_mtime_ns
+        entry = self._stylesheet
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        css = CSS(
+            string=self.read_file(self.stylesheet_path).decode('utf-8'),
+            base_url=self.stylesheet_path,
+            url_fetcher=self.url_fetcher,
+            font_config=self.font_config
+        )
+        self._stylesheet = (mtime, css)
+
+        return css
+
+    # -------------------------------------------------------------------------
+    # Decoded images
+    # -------------------------------------------------------------------------
+
+    def image_cache_for_render(self) -> Dict[str, Any]:
+        """
+        Build the image cache dictionary for a single render.
+
+        The dictionary is seeded with the decoded local images that are
+        still current. Entries for images whose file changed are dropped.
+
+        Returns:
+            Dictionary to pass as WeasyPrint's ``cache`` option
+        """
+        with self._lock:
+            for url, version in list(self._image_versions.items()):
+                if version is None:
+                    continue
+                path = self.local_path(url)
+                try:
+                    current = os.stat(path).st_mtime_ns
+                except OSError:
+                    current = None
+                if current != version:
+                    self._forget_image(url)
+
+            return dict(self._images)
+
+    def retain_images(self, render_cache: Dict[str, Any]) -> None:
+        """
+        Keep the decoded local images of a finished render.
+
+        Images loaded from the cached directory are kept, as are the
+        MAX_RETAINED_LOGOS most recently used logos from the logo store.
+        Any other inline data stays scoped to the render that used it.
+
+        Args:
+            render_cache: Image cache dictionary used by the render
+        """
+        with self._lock:
+            for url in list(render_cache):
+                if url in self._logos:
+                    self._logos.move_to_end(url)
+                if url in self._image_versions:
+                    continue
+
+                if is_logo_url(url):
+                    version = None
+                    self._logos[url] = None
+                else:
+                    path = self.local_path(url)
+                    if path is None or not os.path.exists(path):
+                        continue
+                    version = os.stat(path).st_mtime_ns
+
+                # Image data blobs are stored under keys derived from the URL
+                image_id = md5(url.encode()).hexdigest()
+                for key, value in render_cache.items():
+                    if key == url or key.startswith(image_id):
+                        self._images[key] = value
+                self._image_versions[url] = version
+
+            while len(self._logos) > MAX_RETAINED_LOGOS:
+                url, _ = self._logos.popitem(last=False)
+                self._forget_image(url)
+
+    def _forget_image(self, url: str) -> None:
+        """Drop a cached image and its data blobs (lock must be held)."""
+        image_id = md5(url.encode()).hexdigest()
+        for key in list(self._images):
+            if key == url or key.startswith(image_id):
+                del self._images[key]
+        del self._image_versions[url]
+
+    def clear(self) -> None:
+        """Drop every cached asset."""
+        with self._lock:
+            self._files.clear()
+            self._images.clear()
+            self._image_versions.clear()
+            self._logos.clear()
+            self._stylesheet = None
+
+
+# =============================================================================
+# Shared Instance
+# =============================================================================
+
+_asset_cache: Optional[AssetCache] = None
+_asset_cache_lock = threading.Lock()
+
+
+def get_asset_cache() -> AssetCache:
+    """
+    Return the process-wide asset cache for the templates directory.
+
+    Returns:
+        Shared AssetCache instance
+    """
+    global _asset_cache
+
+    if _asset_cache is None:
+        with _asset_cache_lock:
+            if _asset_cache is None:
+                _asset_cache = AssetCache(TEMPLATE_DIR)
+
+    return _asset_cache
@@ -0,0 +1,242 @@
+"""
+Response Compression Module
+===========================
+Compresses text responses (JSON, Markdown, text, HTML) for clients that
+accept it.
+
+- Brotli is preferred when the Brotli package is installed and the
+  client accepts it; otherwise gzip is used
+- Responses below COMPRESSION_MIN_BYTES are sent as they are; documents
+  streamed while they render are compressed chunk by chunk
+- A compressed response gets its own strong ETag (the identity ETag plus
+  the encoding), so caches never confuse the variants, and If-None-Match
+  is checked against it
+- Static responses are compressed once per encoding and kept
+  (PrecompressedResponse), so repeat calls cost a header comparison
+
+Binary formats (PDF, images, ZIP) are already compressed and are left
+alone.
+"""
+
+import gzip
+import hashlib
+import threading
+import zlib
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from flask import Response, current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# =============================================================================
+# Compression Configuration
+# =============================================================================
+
+# Content types worth compressing
+COMPRESSIBLE_MIME_TYPES = frozenset([
+    'application/json',
+    'text/markdown',
+    'text/plain',
+    'text/html',
+    'text/css'
+])
+
+# Encodings in order of preference
+SUPPORTED_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+# =============================================================================
+# Encoding
+# =============================================================================
+
+def choose_encoding() -> Optional[str]:
+    """
+    Pick the content encoding for the current request.
+
+    Returns:
+        'br', 'gzip', or None if the client accepts neither (or
+        compression is disabled)
+    """
+    if not current_app.config['COMPRESSION_ENABLED']:
+        return None
+
+    accepted = request.accept_encodings
+    for encoding in SUPPORTED_ENCODINGS:
+        if accepted[encoding] > 0:
+            return encoding
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """
+    Compress a complete body.
+
+    Args:
+        data: Body to compress
+        encoding: 'br' or 'gzip'
+
+    Returns:
+        Compressed body
+    """
+    config = current_app.config
+    if encoding == 'br':
+        return brotli.compress(data, quality=config['BROTLI_QUALITY'])
+    return gzip.compress(data, compresslevel=config['GZIP_LEVEL'], mtime=0)
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str,
+                    gzip_level: int, brotli_quality: int) -> Iterator[bytes]:
+    """
+    Compress a streamed body chunk by chunk.
+
+    Every chunk is flushed, so the client can decode what was sent so far
+    while the rest of the document is still being rendered.
+
+    Args:
+        chunks: Body pieces
+        encoding: 'br' or 'gzip'
+        gzip_level: zlib compression level
+        brotli_quality: Brotli quality
+
+    Yields:
+        Compressed pieces
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=brotli_quality)
+        for chunk in chunks:
+            compressed = compressor.process(chunk) + compressor.flush()
+            if compressed:
+                yield compressed
+        yield compressor.finish()
+        return
+
+    # wbits 31: zlib stream with a gzip header and trailer
+    compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def variant_etag(etag: str, encoding: str) -> str:
+    """Return the strong ETag of an encoded variant of a response."""
+    return f'{etag}-{encoding}'
+
+
+def add_vary(response: Response) -> None:
+    """Mark a response as depending on Accept-Encoding."""
+    response.vary.add('Accept-Encoding')
+
+
+# =============================================================================
+# Response Hook
+# =============================================================================
+
+def compress_response(response: Response) -> Response:
+    """
+    Compress a response if the client accepts it and it is worth it.
+
+    Registered as an after_request hook.
+
+    Args:
+        response: Response produced by the view
+
+    Returns:
+        The response, compressed in place when applicable
+    """
+    if (response.mimetype not in COMPRESSIBLE_MIME_TYPES
+            or response.status_code != 200
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    add_vary(response)
+
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    config = current_app.config
+
+    if response.is_streamed:
+        # Length unknown: documents streamed while they render are always
+        # compressed
+        response.response = compress_stream(
+            response.response, encoding,
+            config['GZIP_LEVEL'], config['BROTLI_QUALITY']
+        )
+        response.headers.pop('Content-Length', None)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    data = response.get_data()
+    if len(data) < config['COMPRESSION_MIN_BYTES']:
+        return response
+
+    etag, weak = response.get_etag()
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+
+    if etag is not None:
+        response.set_etag(variant_etag(etag, encoding), weak=weak)
+        return response.make_conditional(request)
+
+    return response
+
+
+# =============================================================================
+# Precompressed Static Responses
+# =============================================================================
+
+class PrecompressedResponse:
+    """A static response body kept in every encoding it is served in."""
+
+    def __init__(self, data: bytes, mimetype: str, cache_control: str):
+        """
+        Args:
+            data: Uncompressed body
+            mimetype: Content type of the body
+            cache_control: Cache-Control header value
+        """
+        self.data = data
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.etag = hashlib.sha256(data).hexdigest()
+        self._variants: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def _variant(self, encoding: Optional[str]) -> Tuple[bytes, str]:
+        """Return the body and ETag for an encoding, compressing once."""
+        if encoding is None or len(self.data) < current_app.config['COMPRESSION_MIN_BYTES']:
+            return self.data, self.etag
+
+        body = self._variants.get(encoding)
+        if body is None:
+            body = compress(self.data, encoding)
+            with self._lock:
+                self._variants[encoding] = body
+        return body, variant_etag(self.etag, encoding)
+
+    def response(self) -> Response:
+        """
+        Build the response for the current request.
+
+        Returns:
+            200 with the best accepted encoding, or 304 Not Modified
+        """
+        encoding = choose_encoding()
+        body, etag = self._variant(encoding)
+
+        response = Response(body, mimetype=self.mimetype)
+        response.headers['Cache-Control'] = self.cache_control
+        add_vary(response)
+        if body is not self.data:
+            response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+
+        return response.make_conditional(request)
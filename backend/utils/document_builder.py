@@ -0,0 +1,144 @@
+"""
+Document Builder Module
+=======================
+Renders a validated questionnaire into its requested output format.
+
+This is the single rendering entry point shared by the synchronous API,
+the background job workers and batch generation. It is a plain module
+level function so it can be sent to worker processes.
+
+All formats go through the render pipeline (render_pipeline.py), which
+prepares the questionnaire once and can emit several formats from it.
+"""
+
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Sequence, Tuple
+from utils.metrics import collect_stage_timings
+from utils.render_pipeline import DocumentModel, render_formats, stream_format
+
+
+# =============================================================================
+# Document Rendering
+# =============================================================================
+
+# Output formats that can be streamed while they are rendered
+STREAMABLE_FORMATS = ('md', 'txt')
+
+# Approximate size of the encoded pieces produced by stream_document
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+def render_documents(validated_data: Dict[str, Any], formats: Sequence[str],
+                     generated_at: datetime) -> Dict[str, bytes]:
+    """
+    Render a validated questionnaire in several formats in one pass.
+
+    The questionnaire is prepared once and each template rendered once,
+    so e.g. Markdown and text cost one template render, and every format
+    carries the same timestamp.
+
+    Args:
+        validated_data: Output of validate_questionnaire
+        formats: Output formats to produce (pdf, md, txt or html)
+        generated_at: Timestamp printed in the documents
+
+    Returns:
+        Format -> PDF bytes or UTF-8 encoded document
+    """
+    return render_formats(DocumentModel(validated_data, generated_at), formats)
+
+
+def render_document(validated_data: Dict[str, Any], generated_at: datetime) -> bytes:
+    """
+    Render a validated questionnaire in its requested output format.
+
+    Args:
+        validated_data: Output of validate_questionnaire
+        generated_at: Timestamp printed in the document
+
+    Returns:
+        PDF bytes, or the UTF-8 encoded Markdown/text document
+    """
+    output_format = validated_data.get('outputFormat', 'md')
+
+    return render_documents(validated_data, [output_format], generated_at)[output_format]
+
+
+def render_documents_timed(validated_data: Dict[str, Any], formats: Sequence[str],
+                           generated_at: datetime) -> Tuple[Dict[str, bytes], Dict[str, float]]:
+    """
+    Render several formats in one pass and measure the generation stages.
+
+    Args:
+        validated_data: Output of validate_questionnaire
+        formats: Output formats to produce
+        generated_at: Timestamp printed in the documents
+
+    Returns:
+        Tuple of format -> document bytes and stage name -> seconds
+    """
+    with collect_stage_timings() as timings:
+        documents = render_documents(validated_data, formats, generated_at)
+
+    return documents, timings
+
+
+def render_document_timed(validated_data: Dict[str, Any],
+                          generated_at: datetime) -> Tuple[bytes, Dict[str, float]]:
+    """
+    Render a document and measure its generation stages.
+
+    Used by the job queue so that stage timings measured in a worker
+    process can be reported by the web process.
+
+    Args:
+        validated_data: Output of validate_questionnaire
+        generated_at: Timestamp printed in the document
+
+    Returns:
+        Tuple of the document bytes and stage name -> seconds
+    """
+    with collect_stage_timings() as timings:
+        document = render_document(validated_data, generated_at)
+
+    return document, timings
+
+
+def stream_document(validated_data: Dict[str, Any], generated_at: datetime) -> Iterator[bytes]:
+    """
+    Render a Markdown or text document as a stream of UTF-8 chunks.
+
+    The template is rendered piece by piece and, for text output, passed
+    through the line-oriented converter, so the whole document is never
+    held in memory. Joining the chunks gives exactly what render_document
+    returns.
+
+    Args:
+        validated_data: Output of validate_questionnaire
+        generated_at: Timestamp printed in the document
+
+    Yields:
+        Encoded chunks of about STREAM_CHUNK_SIZE characters
+
+    Raises:
+        ValueError: If the requested format cannot be streamed
+    """
+    output_format = validated_data.get('outputFormat', 'md')
+    if output_format not in STREAMABLE_FORMATS:
+        raise ValueError(f'Output format {output_format} cannot be streamed')
+
+    pieces = stream_format(DocumentModel(validated_data, generated_at), output_format)
+
+    # Group the many small fragments into fewer, larger writes
+    buffered: List[str] = []
+    size = 0
+    for piece in pieces:
+        buffered.append(piece)
+        size += len(piece)
+        if size >= STREAM_CHUNK_SIZE:
+            yield ''.join(buffered).encode('utf-8')
+            buffered = []
+            size = 0
+
+    if buffered:
+        yield ''.join(buffered).encode('utf-8')
@@ -0,0 +1,351 @@
+"""
+Fragment Cache Module
+=====================
+Renders the NIST templates by splicing user input into pre-rendered
+static fragments.
+
+Almost all of both templates is fixed NIST text. Only a few blocks branch
+on the questionnaire (infrastructure environment, severity levels, the
+number of communication channels, the two booleans and whether a logo was
+uploaded); every other field is printed verbatim.
+
+For each combination of those branch inputs (a "variant"), the template
+is rendered once with every free-text field replaced by a marker. The
+result is split at the markers into a skeleton of literal fragments and
+field slots. Later documents of the same variant are assembled by joining
+the cached fragments with the escaped user values, so rendering cost
+scales with the user input instead of the template size.
+
+Constraints on the templates:
+- Free-text fields must be printed as-is (no filters such as |upper)
+- Free-text fields may only be tested for truthiness, not compared
+Skeletons that violate these rules are detected when built and those
+templates fall back to regular rendering.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Hashable, List, Optional, Tuple
+from jinja2 import Template
+from markupsafe import escape
+from utils.settings import env_flag, env_int
+
+
+# =============================================================================
+# Fragment Cache Configuration
+# =============================================================================
+
+# Set FRAGMENT_CACHE=false to always render templates in full
+FRAGMENT_CACHE_ENABLED = env_flag('FRAGMENT_CACHE', True)
+
+# Maximum number of cached skeletons per template
+FRAGMENT_CACHE_SIZE = env_int('FRAGMENT_CACHE_SIZE', 256)
+
+# Free-text fields that are spliced into the skeleton
+SPLICED_FIELDS = frozenset([
+    'organizationName',
+    'organizationLogo',
+    'industry',
+    'incidentCommander',
+    'socAnalysts',
+    'cloudRemediationOwner',
+    'legalComplianceOwner',
+    'severityDetermination',
+    'escalationMatrix',
+    'criticalIncidentNotifications',
+    'forensicEvidenceLocation',
+    'generated_date',
+    'generated_time',
+    'document_version'
+])
+
+# List fields whose items are printed verbatim; only their length matters
+SPLICED_LIST_FIELDS = frozenset(['communicationChannels'])
+
+# Markers never occur in sanitized input or in the templates
+MARKER_TEMPLATE = '\x00{}\x00'
+MARKER_PATTERN = re.compile('\x00([A-Za-z0-9_.]+)\x00')
+
+# A skeleton alternates literal text (even indexes) and slot names (odd)
+Skeleton = List[str]
+
+
+# =============================================================================
+# Variant Keys
+# =============================================================================
+
+def split_context(context: Dict[str, Any]) -> Optional[Tuple[Hashable, Dict[str, Any], Dict[str, Any]]]:
+    """
+    Separate a template context into its variant key and spliced values.
+
+    Args:
+        context: Full template context
+
+    Returns:
+        Tuple of:
+        - variant key identifying the skeleton
+        - marker context used to render the skeleton
+        - slot values (slot name -> raw value) for assembly
+        or None if the context cannot be rendered from fragments
+    """
+    key_parts = []
+    marker_context: Dict[str, Any] = {}
+    slots: Dict[str, Any] = {}
+
+    for name in sorted(context):
+        value = context[name]
+
+        if name in SPLICED_FIELDS and isinstance(value, str) and value:
+            marker_context[name] = MARKER_TEMPLATE.format(name)
+            slots[name] = value
+            key_parts.append((name, True))
+
+        elif (name in SPLICED_LIST_FIELDS and isinstance(value, list)
+              and all(isinstance(item, str) and item for item in value)):
+            markers = []
+            for index, item in enumerate(value):
+                slot = f'{name}.{index}'
+                markers.append(MARKER_TEMPLATE.format(slot))
+                slots[slot] = item
+            marker_context[name] = markers
+            key_parts.append((name, len(value)))
+
+        else:
+            # Everything else is rendered literally and selects the variant
+            if isinstance(value, list):
+                literal = tuple(value)
+            else:
+                literal = value
+            try:
+                hash(literal)
+            except TypeError:
+                return None
+            marker_context[name] = value
+            key_parts.append((name, type(literal).__name__, literal))
+
+    return tuple(key_parts), marker_context, slots
+
+
+# =============================================================================
+# Skeletons
+# =============================================================================
+
+def uses_autoescape(template: Template) -> bool:
+    """Return True if the environment autoescapes this template."""
+    autoescape = template.environment.autoescape
+    if callable(autoescape):
+        return bool(autoescape(template.name))
+    return bool(autoescape)
+
+
+def build_skeleton(template: Template, marker_context: Dict[str, Any],
+                   slot_names: List[str]) -> Optional[Skeleton]:
+    """
+    Render a template with markers and split it into a skeleton.
+
+    Args:
+        template: Compiled Jinja2 template
+        marker_context: Context with markers in place of free text
+        slot_names: Slot names present in the marker context
+
+    Returns:
+        The skeleton, or None if a marker was altered by the template
+    """
+    rendered = template.render(marker_context)
+    skeleton = MARKER_PATTERN.split(rendered)
+
+    expected = set(slot_names)
+    for index in range(1, len(skeleton), 2):
+        if skeleton[index] not in expected:
+            return None
+
+    # A stray marker byte means a filter changed a marker
+    for index in range(0, len(skeleton), 2):
+        if '\x00' in skeleton[index]:
+            return None
+
+    return skeleton
+
+
+def render_slot_values(slots: Dict[str, Any], autoescape: bool) -> Dict[str, str]:
+    """
+    Convert raw slot values into the text printed in the document.
+
+    Args:
+        slots: Raw values of the slots
+        autoescape: Whether values must be HTML-escaped
+
+    Returns:
+        Slot name -> printed text
+    """
+    if autoescape:
+        return {name: str(escape(value)) for name, value in slots.items()}
+    return {name: str(value) for name, value in slots.items()}
+
+
+def fill_skeleton(skeleton: Skeleton, values: Dict[str, str]) -> str:
+    """Join a skeleton's fragments with already rendered slot values."""
+    parts = skeleton[:]
+    for index in range(1, len(parts), 2):
+        parts[index] = values[parts[index]]
+
+    return ''.join(parts)
+
+
+def assemble(skeleton: Skeleton, slots: Dict[str, Any], autoescape: bool) -> str:
+    """
+    Join a skeleton's fragments with the rendered slot values.
+
+    Args:
+        skeleton: Literal fragments alternating with slot names
+        slots: Raw values of the slots
+        autoescape: Whether values must be HTML-escaped
+
+    Returns:
+        The rendered document
+    """
+    return fill_skeleton(skeleton, render_slot_values(slots, autoescape))
+
+
+# =============================================================================
+# Fragment Renderer
+# =============================================================================
+
+class FragmentRenderer:
+    """Cache of skeletons for the variants of each template."""
+
+    def __init__(self, max_variants: int = FRAGMENT_CACHE_SIZE):
+        """
+        Args:
+            max_variants: Maximum number of cached skeletons per template
+        """
+        self.max_variants = max_variants
+        self._lock = threading.Lock()
+
+        # template name -> (template object, variant key -> skeleton)
+        self._skeletons: Dict[str, Tuple[Template, 'OrderedDict[Hashable, Skeleton]']] = {}
+
+        # Templates whose markers were altered; always rendered in full
+        self._unsupported: Dict[str, Template] = {}
+
+    def _variants(self, template: Template) -> 'OrderedDict[Hashable, Skeleton]':
+        """Return the skeleton LRU of a template, reset if it was reloaded."""
+        with self._lock:
+            entry = self._skeletons.get(template.name)
+            if entry is None or entry[0] is not template:
+                entry = (template, OrderedDict())
+                self._skeletons[template.name] = entry
+            return entry[1]
+
+    def get_skeleton(self, template: Template, key: Hashable,
+                     marker_context: Dict[str, Any],
+                     slot_names: List[str]) -> Optional[Skeleton]:
+        """
+        Return the skeleton of a variant, building it on first use.
+
+        Args:
+            template: Compiled Jinja2 template
+            key: Variant key from split_context
+            marker_context: Context with markers in place of free text
+            slot_names: Slot names present in the marker context
+
+        Returns:
+            The skeleton, or None if the template cannot use fragments
+        """
+        if self._unsupported.get(template.name) is template:
+            return None
+
+        variants = self._variants(template)
+
+        with self._lock:
+            skeleton = variants.get(key)
+            if skeleton is not None:
+                variants.move_to_end(key)
+                return skeleton
+
+        skeleton = build_skeleton(template, marker_context, slot_names)
+        if skeleton is None:
+            self._unsupported[template.name] = template
+            return None
+
+        with self._lock:
+            variants[key] = skeleton
+            while len(variants) > self.max_variants:
+                variants.popitem(last=False)
+
+        return skeleton
+
+    def render(self, template: Template, context: Dict[str, Any]) -> str:
+        """
+        Render a template, assembling it from cached fragments if possible.
+
+        The output is identical to ``template.render(context)``.
+
+        Args:
+            template: Compiled Jinja2 template
+            context: Full template context
+
+        Returns:
+            Rendered document
+        """
+        split = split_context(context)
+        if split is None:
+            return template.render(context)
+
+        key, marker_context, slots = split
+        skeleton = self.get_skeleton(template, key, marker_context, list(slots))
+        if skeleton is None:
+            return template.render(context)
+
+        return assemble(skeleton, slots, uses_autoescape(template))
+
+    def warm(self, template: Template, contexts: List[Dict[str, Any]]) -> None:
+        """
+        Pre-build the skeletons for a list of sample contexts.
+
+        Args:
+            template: Compiled Jinja2 template
+            contexts: Contexts covering the variants to pre-build
+        """
+        for context in contexts:
+            split = split_context(context)
+            if split is not None:
+                key, marker_context, slots = split
+                self.get_skeleton(template, key, marker_context, list(slots))
+
+    def clear(self) -> None:
+        """Drop every cached skeleton."""
+        with self._lock:
+            self._skeletons.clear()
+            self._unsupported.clear()
+
+
+# =============================================================================
+# Shared Instance
+# =============================================================================
+
+_fragment_renderer = FragmentRenderer()
+
+
+def render_with_fragments(template: Template, context: Dict[str, Any]) -> str:
+    """
+    Render a template through the process-wide fragment cache.
+
+    Falls back to regular rendering when FRAGMENT_CACHE is disabled.
+
+    Args:
+        template: Compiled Jinja2 template
+        context: Full template context
+
+    Returns:
+        Rendered document
+    """
+    if not FRAGMENT_CACHE_ENABLED:
+        return template.render(context)
+    return _fragment_renderer.render(template, context)
+
+
+def get_fragment_renderer() -> FragmentRenderer:
+    """Return the process-wide fragment renderer."""
+    return _fragment_renderer
@@ -0,0 +1,833 @@
+"""
+Job Queue Module
+================
+Background generation of IR documents on a bounded worker pool.
+
+PDF jobs run in separate processes because WeasyPrint layout is CPU bound
+and holds the GIL; running it in the web worker's threads would serialize
+every request behind it. Markdown and text jobs are cheap and are
+rendered inline by the submitting thread.
+
+Worker processes are long-lived and warm up WeasyPrint before they accept
+their first job, so only startup pays for font discovery and layout setup.
+WeasyPrint is imported in the worker processes only: web workers, which
+spawn them, never load the PDF stack.
+
+PDF jobs may also need a node-wide render slot (see admission.py): with
+several web workers, each has its own pool, and the slots keep the total
+number of PDF renders on the node bounded.
+
+Worker memory is bounded in two ways. A worker process is replaced after
+max_jobs_per_worker jobs, so caches and heap fragmentation cannot grow
+forever (before Python 3.11, which cannot replace single workers, the
+whole pool is retired once it has been sent max_jobs_per_worker jobs
+per worker). After every job a worker reports its memory use; if its
+resident memory is still above max_worker_rss after returning free
+memory to the OS, the pool is retired: it finishes the jobs it already
+holds and exits, and new jobs start a fresh pool.
+
+Identical PDF jobs submitted while one of them is still unfinished share
+a single render (single flight): each job keeps its own id, filename and
+timeout, and all of them receive the one render's result or error. A
+render is only cancelled when every job waiting for it was discarded.
+If the render cannot start because no PDF render slot became free, every
+job of the flight is rejected: wait() raises QueueFullError for each of
+them, as submit() does for the first.
+
+Every PDF render has a time budget (render_timeout). When it runs out,
+an alarm interrupts the render inside the worker, which fails the job
+with RenderTimeoutError and leaves the worker ready for the next job. A
+render stuck in native code cannot be interrupted; kill_grace seconds
+later the worker process exits, the pool is replaced and the jobs it was
+running fail.
+
+Each job moves through the states queued -> running -> done | failed.
+Finished jobs keep their result until it expires, then they are purged.
+
+Jobs of the asynchronous API are published to a job store (see
+job_store.py), so that every web worker can report their status and
+serve their result, not only the one rendering them. An unfinished job
+whose web worker has exited is reported as failed; a web worker that is
+shut down or recycled first lets its unfinished jobs finish (drain).
+"""
+
+import faulthandler
+import functools
+import multiprocessing
+import os
+import signal
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Callable, Iterator, List, Optional, Set, Tuple
+from utils.admission import RenderSlots
+from utils.document_builder import render_document_timed, render_documents_timed
+from utils.job_store import JobStore, mark_render_started
+from utils.metrics import COALESCED_JOBS_TOTAL, PDF_POOL_RECYCLES_TOTAL, RENDER_TIMEOUTS_TOTAL
+from utils.process_memory import current_rss, peak_rss, release_free_memory, reset_peak_rss
+
+
+# =============================================================================
+# Job States
+# =============================================================================
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+# ProcessPoolExecutor replaces worker processes after a number of tasks
+# (max_tasks_per_child) from Python 3.11 on
+POOL_REPLACES_WORKERS = sys.version_info >= (3, 11)
+
+
+class QueueFullError(Exception):
+    """Raised when the queue already holds its maximum of pending jobs."""
+
+
+class JobTimeoutError(Exception):
+    """Raised when waiting for a job exceeds the caller's timeout."""
+
+
+class RenderTimeoutError(Exception):
+    """Raised in a worker when a render exceeds its time budget."""
+
+
+# =============================================================================
+# Worker Processes
+# =============================================================================
+
+def _init_worker() -> None:
+    """Warm up a new worker process before it takes its first job."""
+    try:
+        # Only worker processes load the PDF stack, never the web workers
+        from utils.pdf_generator import warm_pdf_renderer
+        elapsed = warm_pdf_renderer()
+        print(f'PDF worker {os.getpid()} warmed up in {elapsed:.2f}s')
+    except Exception as e:
+        # A failed warm-up must not break the pool; jobs report real errors
+        print(f'PDF worker {os.getpid()} warm-up failed: {str(e)}')
+
+
+def _process_alive(pid: int) -> bool:
+    """Return True if a process with this id exists on the node."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _worker_ready() -> int:
+    """Return the worker's process id once its warm-up has finished."""
+    return os.getpid()
+
+
+@contextmanager
+def _render_deadline(timeout: float, kill_grace: float) -> Iterator[None]:
+    """
+    Interrupt the worker's render after timeout seconds.
+
+    The alarm repeats every second in case the render swallows the
+    exception. Signal handlers only run between Python bytecodes, so a
+    render stuck in native code is ended by faulthandler instead, which
+    exits the process kill_grace seconds after the deadline.
+    """
+    if not timeout:
+        yield
+        return
+
+    def expire(signum, frame):
+        raise RenderTimeoutError(f'Render exceeded its {timeout:g}s time budget')
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, timeout, 1.0)
+    faulthandler.dump_traceback_later(timeout + kill_grace, exit=True)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        faulthandler.cancel_dump_traceback_later()
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _run_job(render: Callable, args: Tuple, max_rss: int, timeout: float,
+             kill_grace: float,
+             on_start: Optional[Callable[[], None]] = None) -> Tuple[Any, Dict[str, float], Dict[str, Any]]:
+    """
+    Run a render in a worker process and account for its resources.
+
+    Args:
+        render: render_document_timed or render_documents_timed
+        args: Arguments of the render
+        max_rss: Resident memory ceiling of the worker in bytes (0: none)
+        timeout: Time budget of the render in seconds (0: none)
+        kill_grace: Seconds after the budget before the process exits
+        on_start: Called before the render starts (picklable)
+
+    Returns:
+        Tuple of the render's result, its stage timings and the job's
+        resource usage
+
+    Raises:
+        RenderTimeoutError: If the render exceeded its time budget
+    """
+    if on_start is not None:
+        on_start()
+
+    reset_peak_rss()
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+
+    with _render_deadline(timeout, kill_grace):
+        result, timings = render(*args)
+
+    usage = {
+        'worker_pid': os.getpid(),
+        'wall_seconds': time.perf_counter() - started,
+        'cpu_seconds': time.process_time() - cpu_started,
+        'peak_rss': peak_rss(),
+        'rss': current_rss()
+    }
+
+    if max_rss and usage['rss'] is not None and usage['rss'] > max_rss:
+        # Often only fragmentation; give it back before reporting
+        release_free_memory()
+        usage['rss'] = current_rss()
+
+    return result, timings, usage
+
+
+# =============================================================================
+# Job Queue
+# =============================================================================
+
+class JobQueue:
+    """
+    Bounded queue of document generation jobs.
+
+    The process pool is created lazily on the first PDF job, so a queue
+    built before a server forks its workers never shares processes
+    between them.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, result_ttl: float,
+                 on_complete: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 render_slots: Optional[RenderSlots] = None,
+                 slot_timeout: float = 0.0,
+                 max_jobs_per_worker: int = 0,
+                 max_worker_rss: int = 0,
+                 render_timeout: float = 0.0,
+                 kill_grace: float = 5.0,
+                 store: Optional[JobStore] = None):
+        """
+        Args:
+            max_workers: Number of PDF worker processes
+            max_pending: Maximum number of unfinished jobs
+            result_ttl: Seconds a finished job's result is kept
+            on_complete: Called with the job record when a job finishes
+            render_slots: Node-wide PDF render slots; a PDF job holds one
+                          from submission until it finishes
+            slot_timeout: Seconds to wait for a free render slot
+            max_jobs_per_worker: Jobs after which a worker process is
+                                 replaced (0: never)
+            max_worker_rss: Resident memory in bytes above which the
+                            pool is retired after a job (0: no limit)
+            render_timeout: Time budget of a PDF render in seconds
+                            (0: none)
+            kill_grace: Seconds after the budget before a worker stuck
+                        in native code exits
+            store: Job store shared with the other web workers; jobs
+                   submitted with published=True are kept in it
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.on_complete = on_complete
+        self.render_slots = render_slots
+        self.slot_timeout = slot_timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.max_worker_rss = max_worker_rss
+        self.render_timeout = render_timeout
+        self.kill_grace = kill_grace
+        self.store = store
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pool_jobs = 0
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._flights: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    # Worker pool
+    # -------------------------------------------------------------------------
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Return the process pool, starting it on first use."""
+        with self._lock:
+            if self._executor is None:
+                options = {}
+                if POOL_REPLACES_WORKERS and self.max_jobs_per_worker:
+                    options['max_tasks_per_child'] = self.max_jobs_per_worker
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    **options
+                )
+                self._pool_jobs = 0
+            return self._executor
+
+    def _submit_to_pool(self, render: Callable, *args,
+                        on_start: Optional[Callable[[], None]] = None) -> Tuple[Future, ProcessPoolExecutor]:
+        """Send a render to the pool, replacing it once if it is broken."""
+        limits = (self.max_worker_rss, self.render_timeout, self.kill_grace, on_start)
+        executor = self._get_executor()
+        try:
+            future = executor.submit(_run_job, render, args, *limits)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed by the OS); start a fresh pool
+            self.shutdown()
+            executor = self._get_executor()
+            future = executor.submit(_run_job, render, args, *limits)
+
+        self._count_pool_job(executor)
+        return future, executor
+
+    def _count_pool_job(self, executor: ProcessPoolExecutor) -> None:
+        """Retire the pool once its workers are due for replacement (< 3.11)."""
+        if POOL_REPLACES_WORKERS or not self.max_jobs_per_worker:
+            return
+
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._pool_jobs += 1
+            due = self._pool_jobs >= self.max_workers * self.max_jobs_per_worker
+
+        if due and self._retire_pool(executor):
+            PDF_POOL_RECYCLES_TOTAL.inc()
+
+    def _retire_pool(self, executor: ProcessPoolExecutor) -> bool:
+        """
+        Stop sending jobs to a pool; it exits after finishing the jobs it holds.
+
+        Returns:
+            True if the pool was still in use (retired by this call)
+        """
+        with self._lock:
+            if self._executor is not executor:
+                return False
+            self._executor = None
+        executor.shutdown(wait=False)
+        return True
+
+    def warm_up(self, timeout: float) -> int:
+        """
+        Start every worker process and wait until they are warmed up.
+
+        Call this after the server has forked, so that the first PDF
+        requests find ready workers instead of starting them.
+
+        Args:
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            Number of workers that reported ready within the timeout
+        """
+        deadline = time.monotonic() + timeout
+        ready: Set[int] = set()
+
+        while len(ready) < self.max_workers and time.monotonic() < deadline:
+            try:
+                # Each submission may start another process; a process
+                # only answers after its initializer has run
+                futures = [
+                    self._get_executor().submit(_worker_ready)
+                    for _ in range(self.max_workers - len(ready))
+                ]
+                for future in futures:
+                    ready.add(future.result(timeout=max(0.0, deadline - time.monotonic())))
+            except FutureTimeoutError:
+                break
+            except BrokenProcessPool:
+                # A worker died while starting; the next job gets a fresh pool
+                self.shutdown()
+                break
+
+        return len(ready)
+
+    def drain(self, timeout: float) -> int:
+        """
+        Wait for the unfinished jobs, e.g. before the web worker exits.
+
+        Args:
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            Number of jobs still unfinished after the timeout
+        """
+        deadline = time.monotonic() + timeout
+
+        with self._lock:
+            jobs = [
+                job for job in self._jobs.values()
+                if job['finished_at'] is None and job['future'] is not None
+            ]
+
+        unfinished = 0
+        for job in jobs:
+            try:
+                job['future'].exception(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                unfinished += 1
+                continue
+            except CancelledError:
+                pass
+            # The done callback may not have run yet; record (and publish) now
+            self._finish(job, job['future'])
+
+        return unfinished
+
+    def shutdown(self) -> None:
+        """Stop the worker processes without waiting for queued jobs."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    # -------------------------------------------------------------------------
+    # Job lifecycle
+    # -------------------------------------------------------------------------
+
+    def submit(self, validated_data: Dict[str, Any], generated_at: datetime,
+               filename: str, cache_key: Optional[str] = None,
+               cached_result: Optional[bytes] = None,
+               formats: Optional[List[str]] = None,
+               flight_key: Optional[str] = None,
+               published: bool = False) -> Dict[str, Any]:
+        """
+        Queue a document for generation.
+
+        Args:
+            validated_data: Output of validate_questionnaire
+            generated_at: Timestamp printed in the document
+            filename: Download filename of the document
+            cache_key: Result cache key of the document, if caching is on
+            cached_result: Already generated document; the job completes
+                           immediately without rendering
+            formats: Render these formats in one pass instead of the
+                     questionnaire's outputFormat; the job's result is
+                     then a format -> bytes dictionary and is not cached
+            flight_key: Identity of the render (same key, same document);
+                        a PDF job joins an unfinished render with the
+                        same key instead of starting its own
+            published: Keep the job in the shared job store, so that
+                       every web worker can report it
+
+        Returns:
+            The new job record
+
+        Raises:
+            QueueFullError: If max_pending unfinished jobs already exist,
+                            or no PDF render slot became free in time
+        """
+        self.purge_expired()
+
+        output_format = validated_data.get('outputFormat', 'md')
+        if formats is not None:
+            cache_key = None
+            cached_result = None
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': JOB_QUEUED,
+            'output_format': output_format,
+            'formats': list(formats) if formats is not None else [output_format],
+            'filename': filename,
+            'cache_key': cache_key,
+            'cache_hit': cached_result is not None,
+            'created_at': time.time(),
+            'finished_at': None,
+            'result': None,
+            'timings': {},
+            'error': None,
+            'future': None,
+            'flight': None,
+            'coalesced': False,
+            'usage': None,
+            'timed_out': False,
+            'rejected': False,
+            'published': published and self.store is not None
+        }
+
+        with self._lock:
+            if self._pending_count() >= self.max_pending:
+                raise QueueFullError('Too many documents are being generated.')
+            self._jobs[job['id']] = job
+
+        if formats is not None:
+            render, args = render_documents_timed, (validated_data, job['formats'], generated_at)
+        else:
+            render, args = render_document_timed, (validated_data, generated_at)
+
+        if cached_result is not None:
+            future: Future = Future()
+            future.set_result((cached_result, {}, None))
+        elif 'pdf' in job['formats']:
+            future = self._join_flight(job, flight_key, render, args)
+        else:
+            # Markdown and text render in milliseconds; skip the pool
+            future = Future()
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result((*render(*args), None))
+            except Exception as e:
+                future.set_exception(e)
+
+        job['future'] = future
+        future.add_done_callback(lambda done: self._finish(job, done))
+
+        return job
+
+    def _finish(self, job: Dict[str, Any], future: Future) -> None:
+        """Record the outcome of a job's future."""
+        error = None if future.cancelled() else future.exception()
+
+        with self._lock:
+            # Both the done callback and wait() may get here; record once
+            if job['finished_at'] is not None:
+                return
+            job['finished_at'] = time.time()
+            if future.cancelled() or error is not None:
+                job['status'] = JOB_FAILED
+                job['error'] = 'cancelled' if error is None else str(error)
+                job['timed_out'] = self._timed_out(job, error)
+                job['rejected'] = isinstance(error, QueueFullError)
+            else:
+                job['status'] = JOB_DONE
+                job['result'], job['timings'], job['usage'] = future.result()
+            job['flight'] = None
+
+        self._publish(job)
+
+        if error is not None:
+            # Log the error (in production, use proper logging)
+            print(f'Job {job["id"]} failed: {error}')
+
+        if self.on_complete is not None:
+            self.on_complete(job)
+
+    def _timed_out(self, job: Dict[str, Any], error: Optional[BaseException]) -> bool:
+        """Decide whether a failed job was stopped at its time budget."""
+        if isinstance(error, RenderTimeoutError):
+            RENDER_TIMEOUTS_TOTAL.inc(mode='interrupted')
+            return True
+
+        # A lost worker that outlived the hard deadline exited on it
+        if (isinstance(error, BrokenProcessPool) and self.render_timeout
+                and job['finished_at'] - job['created_at']
+                >= self.render_timeout + self.kill_grace):
+            RENDER_TIMEOUTS_TOTAL.inc(mode='killed')
+            return True
+
+        return False
+
+    # -------------------------------------------------------------------------
+    # Shared renders (single flight)
+    # -------------------------------------------------------------------------
+
+    def _join_flight(self, job: Dict[str, Any], flight_key: Optional[str],
+                     render: Callable, args: Tuple) -> Future:
+        """
+        Attach a PDF job to a render, starting the render if needed.
+
+        Returns:
+            The job's own future, completed when the render lands
+
+        Raises:
+            QueueFullError: If no PDF render slot became free in time
+        """
+        with self._lock:
+            flight = self._flights.get(flight_key) if flight_key else None
+            leader = flight is None
+            if leader:
+                flight = {
+                    'id': uuid.uuid4().hex,
+                    'key': flight_key,
+                    'landed': Future(),
+                    'render': None,
+                    'slot': None,
+                    'executor': None,
+                    'waiters': 0
+                }
+                if flight_key:
+                    self._flights[flight_key] = flight
+            flight['waiters'] += 1
+
+        job['flight'] = flight
+        job['coalesced'] = not leader
+        self._publish(job)
+
+        if leader:
+            try:
+                self._take_off(flight, render, args)
+            except Exception as e:
+                self._land(flight, error=e)
+                self.discard(job['id'])
+                raise
+        else:
+            COALESCED_JOBS_TOTAL.inc()
+
+        # Each job gets its own future, so one caller can give up on
+        # the render without cancelling it for the others
+        future: Future = Future()
+        flight['landed'].add_done_callback(lambda landed: self._deliver(future, landed))
+
+        return future
+
+    def _take_off(self, flight: Dict[str, Any], render: Callable, args: Tuple) -> None:
+        """Take a render slot and send a flight's render to the pool."""
+        if self.render_slots is not None:
+            flight['slot'] = self.render_slots.acquire(self.slot_timeout)
+            if flight['slot'] is None:
+                raise QueueFullError('Every PDF render slot is busy.')
+
+        on_start = None
+        if self.store is not None:
+            # Lets every web worker see that the flight's jobs are running
+            on_start = functools.partial(mark_render_started, self.store.path, flight['id'])
+
+        future, flight['executor'] = self._submit_to_pool(render, *args, on_start=on_start)
+        flight['render'] = future
+        future.add_done_callback(lambda done: self._land(flight, done=done))
+
+    def _land(self, flight: Dict[str, Any], done: Optional[Future] = None,
+              error: Optional[BaseException] = None) -> None:
+        """Finish a flight: free its slot and hand its outcome to the jobs."""
+        slot, flight['slot'] = flight['slot'], None
+        if slot is not None:
+            slot.release()
+
+        with self._lock:
+            if flight['key'] and self._flights.get(flight['key']) is flight:
+                del self._flights[flight['key']]
+
+        landed = flight['landed']
+        if done is not None and done.cancelled():
+            landed.cancel()
+        elif done is not None and done.exception() is not None:
+            landed.set_exception(done.exception())
+        elif done is not None:
+            landed.set_result(done.result())
+            self._check_worker_memory(flight['executor'], done.result()[2])
+        else:
+            landed.set_exception(error)
+
+    @staticmethod
+    def _deliver(future: Future, landed: Future) -> None:
+        """Copy a flight's outcome to one job's future."""
+        if not future.set_running_or_notify_cancel():
+            return  # The job was discarded
+        if landed.cancelled():
+            future.set_exception(CancelledError('The render was cancelled'))
+        elif landed.exception() is not None:
+            future.set_exception(landed.exception())
+        else:
+            future.set_result(landed.result())
+
+    def _leave_flight(self, flight: Optional[Dict[str, Any]]) -> None:
+        """Stop waiting for a flight; cancel its render if nobody waits for it."""
+        if flight is None:
+            return
+
+        with self._lock:
+            flight['waiters'] -= 1
+            abandoned = flight['waiters'] == 0
+
+        if abandoned and flight['render'] is not None:
+            # Only succeeds while the render is still queued in the pool
+            flight['render'].cancel()
+
+    def _check_worker_memory(self, executor: Optional[ProcessPoolExecutor],
+                             usage: Dict[str, Any]) -> None:
+        """Retire the pool if the worker that rendered stays above its ceiling."""
+        if (executor is not None and self.max_worker_rss and usage['rss'] is not None
+                and usage['rss'] > self.max_worker_rss and self._retire_pool(executor)):
+            PDF_POOL_RECYCLES_TOTAL.inc()
+            print(f'PDF worker {usage["worker_pid"]} uses {usage["rss"] // 2 ** 20} MiB; '
+                  f'recycling the PDF worker pool')
+
+    def _pending_count(self) -> int:
+        """Count unfinished jobs (lock must be held)."""
+        return sum(
+            1 for job in self._jobs.values()
+            if job['status'] in (JOB_QUEUED, JOB_RUNNING)
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a job and refresh its status.
+
+        Args:
+            job_id: Identifier returned by submit
+
+        Returns:
+            The job record, or None if unknown or expired
+        """
+        self.purge_expired()
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+
+        if job is None:
+            # Submitted to (or already purged by) another web worker
+            return self._load_published(job_id)
+
+        flight = job['flight']
+        render = flight['render'] if flight is not None else None
+        if job['status'] == JOB_QUEUED and render is not None and render.running():
+            # A published job is reported running once its render has
+            # started, as every other web worker reports it
+            if not job['published'] or self._render_started(flight):
+                with self._lock:
+                    if job['status'] == JOB_QUEUED:
+                        job['status'] = JOB_RUNNING
+
+        return job
+
+    def _render_started(self, flight: Dict[str, Any]) -> bool:
+        """Ask the job store whether the PDF worker has started a flight's render."""
+        try:
+            return self.store.render_started(flight['id'])
+        except sqlite3.Error:
+            return True
+
+    def _publish(self, job: Dict[str, Any]) -> None:
+        """Write a published job's record to the shared job store."""
+        if not job['published']:
+            return
+
+        flight = job['flight']
+        try:
+            self.store.save(
+                job,
+                flight['id'] if flight is not None else None,
+                self.expires_at(job)
+            )
+        except sqlite3.Error as e:
+            # Log the error (in production, use proper logging)
+            print(f'Job {job["id"]} could not be published: {str(e)}')
+
+    def _load_published(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Read a job from the shared job store and derive its status."""
+        if self.store is None:
+            return None
+
+        try:
+            job = self.store.load(job_id)
+        except sqlite3.Error as e:
+            # Log the error (in production, use proper logging)
+            print(f'Job {job_id} could not be loaded: {str(e)}')
+            return None
+
+        if job is None:
+            return None
+
+        if job['finished_at'] is None and not _process_alive(job['owner_pid']):
+            # The web worker holding the job exited before finishing it
+            job['status'] = JOB_FAILED
+            job['error'] = 'The worker generating the document exited'
+            job['finished_at'] = time.time()
+        elif job['status'] == JOB_QUEUED and job['render_started']:
+            job['status'] = JOB_RUNNING
+
+        return job
+
+    def wait(self, job_id: str, timeout: float) -> Dict[str, Any]:
+        """
+        Block until a job finishes.
+
+        Args:
+            job_id: Identifier returned by submit
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            The finished job record
+
+        Raises:
+            KeyError: If the job is unknown or expired
+            JobTimeoutError: If the job is still unfinished after timeout
+            QueueFullError: If the job joined a render that could not
+                            start because no PDF render slot was free
+        """
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+
+        try:
+            job['future'].exception(timeout=timeout)
+        except FutureTimeoutError:
+            raise JobTimeoutError(f'Job {job_id} did not finish in {timeout}s')
+
+        # The done callback may not have run yet; make the outcome visible
+        self._finish(job, job['future'])
+
+        if job['rejected']:
+            raise QueueFullError(job['error'])
+
+        return job
+
+    def discard(self, job_id: str) -> None:
+        """
+        Forget a job and its result immediately.
+
+        A job that has not started yet is cancelled, so abandoned jobs
+        never occupy a worker.
+
+        Args:
+            job_id: Identifier returned by submit
+        """
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+
+        if job is not None and job['published']:
+            job['published'] = False
+            try:
+                self.store.delete(job_id)
+            except sqlite3.Error as e:
+                # Log the error (in production, use proper logging)
+                print(f'Job {job_id} could not be unpublished: {str(e)}')
+
+        if job is not None and job['future'] is not None:
+            # Cancelling runs _finish, which detaches the job's flight
+            flight = job['flight']
+            if job['future'].cancel():
+                self._leave_flight(flight)
+
+    def purge_expired(self) -> None:
+        """Drop finished jobs whose results are older than result_ttl."""
+        cutoff = time.time() - self.result_ttl
+
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job['finished_at'] is not None and job['finished_at'] < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def expires_at(self, job: Dict[str, Any]) -> Optional[float]:
+        """Return the UNIX time at which a finished job expires."""
+        if job['finished_at'] is None:
+            return None
+        return job['finished_at'] + self.result_ttl
@@ -0,0 +1,194 @@
+"""
+Job Store Module
+================
+Job records and results shared by all web worker processes.
+
+Under gunicorn a job is rendered by the web worker that accepted it, but
+its status and download requests reach whichever worker accepts the
+connection. Jobs of the asynchronous API are therefore also written to a
+SQLite database on local disk:
+- The submitting worker writes the record when the job is queued and
+  again, with the document, when it finishes
+- The PDF worker process marks the job's render as started, so every
+  web worker reports a running job as running
+- A worker that does not hold a job in memory answers from the database
+
+Records are deleted once their result has expired.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+
+
+# =============================================================================
+# Store Configuration
+# =============================================================================
+
+# Fields of a job record that are shared; the rest (futures, flights,
+# timings) only mean something to the submitting process
+SHARED_FIELDS = (
+    'id', 'status', 'output_format', 'formats', 'filename', 'created_at',
+    'finished_at', 'error', 'usage', 'timed_out', 'rejected'
+)
+
+# Seconds an unfinished record is kept if its worker never finishes it
+UNFINISHED_TTL = 24 * 3600.0
+
+
+# =============================================================================
+# Job Store
+# =============================================================================
+
+class JobStore:
+    """Job records and results in a SQLite database shared by local processes."""
+
+    # Expired records are deleted after every this many writes
+    PURGE_INTERVAL = 100
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Database file (shared by all processes on the node)
+        """
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._local = threading.local()
+        self._writes = 0
+
+        connection = self._connection()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, record TEXT NOT NULL, result BLOB, '
+            'owner_pid INTEGER NOT NULL, render_id TEXT, expires_at REAL NOT NULL)'
+        )
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS started_renders ('
+            'render_id TEXT PRIMARY KEY, started_at REAL NOT NULL)'
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use."""
+        # A connection must not be used across fork (e.g. one opened while
+        # a preloaded app was created in gunicorn's master process)
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def save(self, job: Dict[str, Any], render_id: Optional[str],
+             expires_at: Optional[float]) -> None:
+        """
+        Write a job record, with its result once it has finished.
+
+        Args:
+            job: Job record of the job queue
+            render_id: Render the job waits for (marked by the PDF worker)
+            expires_at: UNIX time the finished job expires (None while
+                        it is unfinished)
+        """
+        record = {name: job[name] for name in SHARED_FIELDS}
+        result = job['result'] if isinstance(job['result'], bytes) else None
+        if expires_at is None:
+            expires_at = job['created_at'] + UNFINISHED_TTL
+
+        self._connection().execute(
+            'INSERT OR REPLACE INTO jobs (id, record, result, owner_pid, render_id, expires_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (job['id'], json.dumps(record), result, os.getpid(), render_id, expires_at)
+        )
+
+        self._writes += 1
+        if self._writes % self.PURGE_INTERVAL == 0:
+            self.purge_expired()
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Read a job record written by any process.
+
+        Args:
+            job_id: Identifier of the job
+
+        Returns:
+            The job record with its result, the id of the process that
+            submitted it (owner_pid) and whether its render has started
+            (render_started); None if unknown or expired
+        """
+        row = self._connection().execute(
+            'SELECT record, result, owner_pid, '
+            'EXISTS (SELECT 1 FROM started_renders WHERE started_renders.render_id = jobs.render_id) '
+            'FROM jobs WHERE id = ? AND expires_at > ?',
+            (job_id, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+
+        record_json, result, owner_pid, started = row
+        job = json.loads(record_json)
+        job['result'] = result
+        job['owner_pid'] = owner_pid
+        job['render_started'] = bool(started)
+
+        return job
+
+    def delete(self, job_id: str) -> None:
+        """Forget a job and its result."""
+        self._connection().execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+    def mark_started(self, render_id: str) -> None:
+        """Record that a render has started (called by the PDF worker)."""
+        self._connection().execute(
+            'INSERT OR IGNORE INTO started_renders (render_id, started_at) VALUES (?, ?)',
+            (render_id, time.time())
+        )
+
+    def render_started(self, render_id: str) -> bool:
+        """Return True if the PDF worker has started a render."""
+        row = self._connection().execute(
+            'SELECT 1 FROM started_renders WHERE render_id = ?', (render_id,)
+        ).fetchone()
+        return row is not None
+
+    def purge_expired(self) -> None:
+        """Delete expired records and the start marks of old renders."""
+        now = time.time()
+        connection = self._connection()
+        connection.execute('DELETE FROM jobs WHERE expires_at <= ?', (now,))
+        connection.execute(
+            'DELETE FROM started_renders WHERE started_at <= ?', (now - UNFINISHED_TTL,)
+        )
+
+
+# =============================================================================
+# Worker Process Access
+# =============================================================================
+
+_worker_stores: Dict[str, JobStore] = {}
+
+
+def mark_render_started(path: str, render_id: str) -> None:
+    """
+    Mark a render as started from a PDF worker process.
+
+    Args:
+        path: Database file of the job store
+        render_id: Render being started
+    """
+    try:
+        store = _worker_stores.get(path)
+        if store is None:
+            store = _worker_stores[path] = JobStore(path)
+        store.mark_started(render_id)
+    except sqlite3.Error as e:
+        # Only the reported status suffers; never fail the render for it
+        print(f'Job store could not be updated: {str(e)}')
@@ -0,0 +1,396 @@
+"""
+Logo Store Module
+=================
+Decodes, checks and downscales uploaded organization logos once, and
+keeps the result in a content-addressed store.
+
+The frontend uploads logos as base64 data URIs of up to about 1 MB. Put
+into the PDF template as they are, WeasyPrint would decode the base64
+and the full-resolution image again for every document. Instead, the
+validator passes each upload through this module:
+- The data URI is decoded and its image format checked with Pillow
+- The image is downscaled to the largest size it is printed at
+- The result is stored on disk under the hash of the uploaded bytes
+
+The template then receives a short ``logo:<hash>.<ext>`` URL, which the
+asset cache's url_fetcher resolves from the store. Repeat uploads of the
+same logo are recognised by their hash before any image decoding, and
+the decoded image is kept between renders by the asset cache.
+
+The store is a directory so that the PDF worker processes can read
+logos ingested by the web process. Queued jobs refer to logos by their
+URL, so a logo is only deleted once it has not been uploaded for
+LOGO_STORE_MIN_AGE seconds, even when the store holds more than
+LOGO_STORE_MAX_FILES logos.
+"""
+
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Optional, Tuple
+from utils.metrics import timed_stage
+from utils.settings import env_float, env_int, env_str
+
+
+# =============================================================================
+# Logo Configuration
+# =============================================================================
+
+# Largest accepted upload (decoded bytes)
+LOGO_MAX_BYTES = 1024 * 1024
+
+# Largest accepted image before decoding (guards against decompression bombs)
+LOGO_MAX_PIXELS = 40_000_000
+
+# Image formats accepted from uploads
+LOGO_FORMATS = ('PNG', 'JPEG', 'GIF', 'WEBP')
+
+# Printed size of the logo box (.org-logo in pdf_styles.css) and the
+# resolution logos are kept at
+LOGO_PRINT_SIZE_PT = (200, 100)
+LOGO_PRINT_DPI = 300
+LOGO_MAX_SIZE_PX = tuple(round(points / 72 * LOGO_PRINT_DPI) for points in LOGO_PRINT_SIZE_PT)
+
+# Bump to re-process every stored logo after a pipeline change
+LOGO_PIPELINE_VERSION = '1'
+
+# Directory holding the processed logos, shared by all processes
+LOGO_STORE_DIR = env_str(
+    'LOGO_STORE_DIR',
+    os.path.join(tempfile.gettempdir(), 'responseforge-logos')
+)
+
+# Stored logos kept before the least recently uploaded are deleted
+LOGO_STORE_MAX_FILES = env_int('LOGO_STORE_MAX_FILES', 1000)
+
+# Seconds since its last upload before a logo may be deleted; must exceed
+# the time a job can wait for its render plus JOB_RESULT_TTL
+LOGO_STORE_MIN_AGE = env_float('LOGO_STORE_MIN_AGE', 24 * 3600.0)
+
+# Template URLs of stored logos
+LOGO_URL_PREFIX = 'logo:'
+LOGO_FILE_PATTERN = re.compile(r'^[0-9a-f]{64}\.(?:png|jpg)$')
+
+DATA_URI_PATTERN = re.compile(r'^data:image/[a-zA-Z0-9.+-]+;base64,', re.ASCII)
+
+LOGO_MIME_TYPES = {'png': 'image/png', 'jpg': 'image/jpeg'}
+
+
+class LogoError(ValueError):
+    """Raised when an uploaded logo is not an acceptable image."""
+
+
+# =============================================================================
+# Image Processing
+# =============================================================================
+
+def decode_data_uri(value: str) -> bytes:
+    """
+    Decode a base64 image data URI.
+
+    Args:
+        value: data:image/...;base64,... string
+
+    Returns:
+        The decoded bytes
+
+    Raises:
+        LogoError: If the value is not a base64 image data URI or too large
+    """
+    match = DATA_URI_PATTERN.match(value)
+    if match is None:
+        raise LogoError('Logo must be a base64 image data URI')
+
+    payload = value[match.end():]
+    if len(payload) > (LOGO_MAX_BYTES + 2) // 3 * 4:
+        raise LogoError('Logo is too large')
+
+    try:
+        data = base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        raise LogoError('Logo is not valid base64')
+
+    if not data:
+        raise LogoError('Logo is empty')
+
+    return data
+
+
+def process_logo(data: bytes) -> Tuple[bytes, str]:
+    """
+    Check an uploaded image and shrink it to its printed size.
+
+    Images that are already small enough and upright are kept byte for
+    byte when they are PNG or JPEG. Others are rotated according to
+    their EXIF orientation, downscaled and re-encoded: JPEG stays JPEG,
+    everything else becomes PNG.
+
+    Args:
+        data: Decoded upload
+
+    Returns:
+        Tuple of the image bytes and the file extension (png or jpg)
+
+    Raises:
+        LogoError: If the data is not an accepted image
+    """
+    # Imported here so processes that never see a logo do not load Pillow
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            source_format = image.format
+            if source_format not in LOGO_FORMATS:
+                raise LogoError(f'Unsupported logo format: {source_format}')
+
+            width, height = image.size
+            if width * height > LOGO_MAX_PIXELS:
+                raise LogoError('Logo dimensions are too large')
+
+            max_width, max_height = LOGO_MAX_SIZE_PX
+            upright = image.getexif().get(0x0112, 1) == 1
+
+            if (upright and width <= max_width and height <= max_height
+                    and source_format in ('PNG', 'JPEG')):
+                return data, 'png' if source_format == 'PNG' else 'jpg'
+
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(LOGO_MAX_SIZE_PX, Image.LANCZOS)
+
+            has_alpha = (
+                image.mode in ('RGBA', 'LA', 'PA')
+                or (image.mode == 'P' and 'transparency' in image.info)
+            )
+
+            output = io.BytesIO()
+            if source_format == 'JPEG' and not has_alpha:
+                if image.mode not in ('RGB', 'L'):
+                    image = image.convert('RGB')
+                image.save(output, format='JPEG', quality=90)
+                return output.getvalue(), 'jpg'
+
+            if image.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+                image = image.convert('RGBA' if has_alpha else 'RGB')
+            image.save(output, format='PNG')
+            return output.getvalue(), 'png'
+
+    except LogoError:
+        raise
+    except Exception as e:
+        # Pillow raises various errors for corrupt or hostile images
+        raise LogoError(f'Logo could not be decoded: {type(e).__name__}')
+
+
+def logo_digest(data: bytes) -> str:
+    """Return the store key of an uploaded image."""
+    return hashlib.sha256(LOGO_PIPELINE_VERSION.encode() + b'\0' + data).hexdigest()
+
+
+# =============================================================================
+# Logo Store
+# =============================================================================
+
+class LogoStore:
+    """Content-addressed directory of processed logos."""
+
+    def __init__(self, directory: str, max_files: int = LOGO_STORE_MAX_FILES,
+                 min_age: float = LOGO_STORE_MIN_AGE):
+        """
+        Args:
+            directory: Directory holding one file per processed logo
+            max_files: Number of logos kept before the oldest are deleted
+            min_age: Seconds since its last upload before a logo may be
+                     deleted
+        """
+        self.directory = directory
+        self.max_files = max_files
+        self.min_age = min_age
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _find(self, digest: str) -> Optional[str]:
+        """Return the stored file name of a digest, if any."""
+        for extension in LOGO_MIME_TYPES:
+            name = f'{digest}.{extension}'
+            if os.path.exists(os.path.join(self.directory, name)):
+                return name
+        return None
+
+    def ingest(self, value: str) -> str:
+        """
+        Store an uploaded logo and return the URL the template should use.
+
+        Args:
+            value: Logo data URI from the questionnaire
+
+        Returns:
+            logo:<hash>.<ext> URL
+
+        Raises:
+            LogoError: If the upload is not an acceptable image
+        """
+        with timed_stage('logo'):
+            data = decode_data_uri(value)
+            digest = logo_digest(data)
+
+            url = self._touch(digest)
+            if url is not None:
+                return url
+
+            image, extension = process_logo(data)
+            name = f'{digest}.{extension}'
+            self._write(name, image)
+
+            return LOGO_URL_PREFIX + name
+
+    def add_processed(self, image: bytes, extension: str) -> str:
+        """
+        Store an image that is known to need no processing.
+
+        Used for the built-in sample logo, so that warming caches at
+        startup does not load Pillow. The image is stored under the same
+        name an upload of it would get.
+
+        Args:
+            image: PNG or JPEG bytes within LOGO_MAX_SIZE_PX
+            extension: png or jpg
+
+        Returns:
+            logo:<hash>.<ext> URL
+        """
+        digest = logo_digest(image)
+
+        url = self._touch(digest)
+        if url is not None:
+            return url
+
+        name = f'{digest}.{extension}'
+        self._write(name, image)
+
+        return LOGO_URL_PREFIX + name
+
+    def _touch(self, digest: str) -> Optional[str]:
+        """Return the URL of a stored digest and mark it as recently used."""
+        name = self._find(digest)
+        if name is None:
+            return None
+
+        # Mark as recently used so pruning keeps it
+        try:
+            os.utime(os.path.join(self.directory, name))
+        except OSError:
+            pass
+        return LOGO_URL_PREFIX + name
+
+    def _write(self, name: str, image: bytes) -> None:
+        """Atomically write a processed logo and prune old ones."""
+        # Write to a temporary file first so readers never see partial data
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(image)
+            os.replace(temp_path, os.path.join(self.directory, name))
+        except OSError:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+        self._prune()
+
+    def _prune(self) -> None:
+        """
+        Delete the least recently uploaded logos beyond max_files.
+
+        Logos uploaded within min_age seconds are kept, since jobs that
+        are still queued may refer to them.
+        """
+        with self._lock:
+            try:
+                names = [
+                    name for name in os.listdir(self.directory)
+                    if LOGO_FILE_PATTERN.match(name)
+                ]
+            except OSError:
+                return
+
+            excess = len(names) - self.max_files
+            if excess <= 0:
+                return
+
+            def mtime(name: str) -> float:
+                try:
+                    return os.stat(os.path.join(self.directory, name)).st_mtime
+                except OSError:
+                    return 0.0
+
+            cutoff = time.time() - self.min_age
+
+            for name in sorted(names, key=mtime)[:excess]:
+                if mtime(name) > cutoff:
+                    # Sorted by age: every remaining logo is newer
+                    break
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def read(self, url: str) -> Tuple[bytes, str]:
+        """
+        Read a stored logo.
+
+        Args:
+            url: logo:<hash>.<ext> URL produced by ingest
+
+        Returns:
+            Tuple of the image bytes and their MIME type
+
+        Raises:
+            LogoError: If the URL is malformed
+            OSError: If the logo is not in the store
+        """
+        name = url[len(LOGO_URL_PREFIX):]
+        if not is_logo_url(url) or not LOGO_FILE_PATTERN.match(name):
+            raise LogoError(f'Invalid logo URL: {url}')
+
+        with open(os.path.join(self.directory, name), 'rb') as logo_file:
+            data = logo_file.read()
+
+        return data, LOGO_MIME_TYPES[name.rsplit('.', 1)[1]]
+
+
+# =============================================================================
+# Shared Instance
+# =============================================================================
+
+_logo_store: Optional[LogoStore] = None
+_logo_store_lock = threading.Lock()
+
+
+def get_logo_store() -> LogoStore:
+    """
+    Return the process-wide logo store in LOGO_STORE_DIR.
+
+    Returns:
+        Shared LogoStore instance
+    """
+    global _logo_store
+
+    if _logo_store is None:
+        with _logo_store_lock:
+            if _logo_store is None:
+                _logo_store = LogoStore(LOGO_STORE_DIR)
+
+    return _logo_store
+
+
+def is_logo_url(url: str) -> bool:
+    """Return True if a URL refers to the logo store."""
+    return url.startswith(LOGO_URL_PREFIX)
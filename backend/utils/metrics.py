@@ -0,0 +1,436 @@
+"""
+Metrics Module
+==============
+Per-stage timing and counters exposed in the Prometheus text format.
+
+Generation stages are timed with ``timed_stage`` blocks placed in the
+code that does the work (validation, sanitization, Jinja rendering,
+WeasyPrint parsing and layout, response encoding). Timings are only
+collected while a ``collect_stage_timings`` block is active, so the
+instrumented functions cost nothing extra when called elsewhere.
+
+PDF stages run in the job queue's worker processes; their timings travel
+back with the job result and are recorded by the web process.
+
+Metrics are kept per process. With several web workers, metrics_store.py
+merges the values of all of them (see METRICS_DIR).
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+# =============================================================================
+# Metric Types
+# =============================================================================
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def format_labels(names: Tuple[str, ...], values: LabelValues,
+                  extra: Optional[Tuple[str, str]] = None) -> str:
+    """Render a label set as {name="value",...} with escaped values."""
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+
+    escaped = (
+        (name, value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def format_value(value: float) -> str:
+    """Render a sample value without a trailing .0 for whole numbers."""
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class Metric:
+    """Base class of labelled metrics."""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        """
+        Args:
+            name: Metric name
+            help_text: Description shown in the HELP line
+            labelnames: Names of the labels every sample carries
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, Any]) -> LabelValues:
+        """Order label values by labelnames, rejecting unknown labels."""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        """Return the exposition lines of this metric."""
+        return [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+
+    def snapshot(self) -> List[Any]:
+        """Return the values as JSON-serializable data."""
+        raise NotImplementedError
+
+    def merge(self, snapshot: List[Any]) -> None:
+        """Add the values of a snapshot (e.g. another process's)."""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """Drop all values."""
+        raise NotImplementedError
+
+    def empty_copy(self) -> 'Metric':
+        """Return a metric of the same name and shape without values."""
+        raise NotImplementedError
+
+    def reset_after_fork(self) -> None:
+        """Drop all values in a freshly forked child process."""
+        # Another thread of the parent may have held the lock at the fork
+        self._lock = threading.Lock()
+        self.clear()
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """Add to the counter of a label set."""
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        """Return the current count of a label set."""
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{format_labels(self.labelnames, key)} {format_value(value)}')
+        return lines
+
+    def snapshot(self) -> List[Any]:
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def merge(self, snapshot: List[Any]) -> None:
+        with self._lock:
+            for key, value in snapshot:
+                key = tuple(key)
+                self._values[key] = self._values.get(key, 0) + value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def empty_copy(self) -> 'Counter':
+        return Counter(self.name, self.help_text, self.labelnames)
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts incl. +Inf, sum)
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        """Record one observation for a label set."""
+        key = self._label_values(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = ([0] * (len(self.buckets) + 1), [0.0])
+                self._series[key] = series
+            counts, total = series
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            total[0] += value
+
+    def count(self, **labels) -> int:
+        """Return the number of observations of a label set."""
+        with self._lock:
+            series = self._series.get(self._label_values(labels))
+            return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                bounds = [format_value(bound) for bound in self.buckets] + ['+Inf']
+                for bound, count in zip(bounds, counts):
+                    cumulative += count
+                    labels = format_labels(self.labelnames, key, ('le', bound))
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = format_labels(self.labelnames, key)
+                lines.append(f'{self.name}_sum{labels} {format_value(total[0])}')
+                lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+    def snapshot(self) -> List[Any]:
+        with self._lock:
+            return [
+                [list(key), list(counts), total[0]]
+                for key, (counts, total) in self._series.items()
+            ]
+
+    def merge(self, snapshot: List[Any]) -> None:
+        with self._lock:
+            for key, counts, total in snapshot:
+                if len(counts) != len(self.buckets) + 1:
+                    continue  # Written with other buckets
+                key = tuple(key)
+                series = self._series.get(key)
+                if series is None:
+                    series = ([0] * (len(self.buckets) + 1), [0.0])
+                    self._series[key] = series
+                for index, count in enumerate(counts):
+                    series[0][index] += count
+                series[1][0] += total
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def empty_copy(self) -> 'Histogram':
+        return Histogram(self.name, self.help_text, self.labelnames, self.buckets)
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric to the registry and return it."""
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> Dict[str, List[Any]]:
+        """Return the values of every metric as JSON-serializable data."""
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def merged(self, snapshots: Iterable[Dict[str, List[Any]]]) -> 'MetricsRegistry':
+        """
+        Build a registry holding the sum of several snapshots.
+
+        Args:
+            snapshots: Output of snapshot(), e.g. one per process
+
+        Returns:
+            New registry with the same metrics as this one
+        """
+        registry = MetricsRegistry()
+        copies = {
+            metric.name: registry.register(metric.empty_copy())
+            for metric in self._metrics
+        }
+        for snapshot in snapshots:
+            for name, values in snapshot.items():
+                if name in copies:
+                    copies[name].merge(values)
+        return registry
+
+    def reset_after_fork(self) -> None:
+        """Drop the values of every metric in a freshly forked child process."""
+        for metric in self._metrics:
+            metric.reset_after_fork()
+
+
+# =============================================================================
+# Application Metrics
+# =============================================================================
+
+# Content type of the Prometheus text exposition format
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'responseforge_stage_duration_seconds',
+    'Time spent in each document generation stage.',
+    ('stage',)
+))
+
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'responseforge_request_duration_seconds',
+    'End-to-end time of generation requests.',
+    ('endpoint',)
+))
+
+DOCUMENTS_TOTAL = REGISTRY.register(Counter(
+    'responseforge_documents_total',
+    'Finished generation jobs by output format and status.',
+    ('format', 'status')
+))
+
+ERRORS_TOTAL = REGISTRY.register(Counter(
+    'responseforge_request_errors_total',
+    'Generation requests answered with an error, by reason.',
+    ('reason',)
+))
+
+RESULT_CACHE_TOTAL = REGISTRY.register(Counter(
+    'responseforge_result_cache_lookups_total',
+    'Result cache lookups by outcome (hit, miss or bypass).',
+    ('result',)
+))
+
+# Byte buckets for worker memory, 32 MiB to 2 GiB
+MEMORY_BUCKETS = tuple(float(2 ** power) for power in range(25, 32))
+
+JOB_PEAK_RSS_BYTES = REGISTRY.register(Histogram(
+    'responseforge_job_peak_rss_bytes',
+    'Peak resident memory of the PDF worker process during a job.',
+    buckets=MEMORY_BUCKETS
+))
+
+COALESCED_JOBS_TOTAL = REGISTRY.register(Counter(
+    'responseforge_coalesced_jobs_total',
+    'PDF jobs that joined an identical unfinished render instead of starting one.'
+))
+
+RENDER_TIMEOUTS_TOTAL = REGISTRY.register(Counter(
+    'responseforge_render_timeouts_total',
+    'PDF renders stopped at their time budget, by how they were stopped '
+    '(interrupted, or killed while stuck in native code).',
+    ('mode',)
+))
+
+PDF_POOL_RECYCLES_TOTAL = REGISTRY.register(Counter(
+    'responseforge_pdf_pool_recycles_total',
+    'PDF worker pools replaced because a worker exceeded its memory ceiling.'
+))
+
+
+# =============================================================================
+# Stage Timing
+# =============================================================================
+
+# Stage durations of the current request or job, if being collected
+_active_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    'stage_timings', default=None
+)
+
+
+@contextmanager
+def collect_stage_timings() -> Iterator[Dict[str, float]]:
+    """
+    Collect the durations of all stages run inside the block.
+
+    Yields:
+        Dictionary of stage name -> seconds, filled while the block runs
+    """
+    timings: Dict[str, float] = {}
+    token = _active_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _active_timings.reset(token)
+
+
+class timed_stage:
+    """
+    Time a block as part of a generation stage.
+
+    Usage: ``with timed_stage('render_template'): ...``
+
+    Repeated blocks of the same stage (such as sanitizing each field)
+    add up. Does nothing when no timings are being collected. A plain
+    class keeps the inactive case cheap enough for per-field use.
+    """
+
+    __slots__ = ('stage', '_timings', '_started')
+
+    def __init__(self, stage: str):
+        """
+        Args:
+            stage: Stage name
+        """
+        self.stage = stage
+
+    def __enter__(self) -> None:
+        self._timings = _active_timings.get()
+        if self._timings is not None:
+            self._started = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> bool:
+        timings = self._timings
+        if timings is not None:
+            elapsed = time.perf_counter() - self._started
+            timings[self.stage] = timings.get(self.stage, 0.0) + elapsed
+        return False
+
+
+def observe_stage_timings(timings: Dict[str, float]) -> None:
+    """Record stage durations in the stage histogram."""
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+def instrumented(endpoint: str) -> Callable:
+    """
+    Decorate a view to record its total and per-stage durations.
+
+    Args:
+        endpoint: Value of the endpoint label
+
+    Returns:
+        Decorator for Flask view functions
+    """
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            with collect_stage_timings() as timings:
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    observe_stage_timings(timings)
+                    REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        return wrapper
+    return decorator
@@ -0,0 +1,200 @@
+"""
+Metrics Store Module
+====================
+Merges the metrics of all web worker processes for /metrics.
+
+Metrics are recorded in each process's own registry. Under gunicorn a
+scrape reaches whichever worker accepts the connection, so per-process
+values would make counters jump between workers and histograms describe
+a single worker. With METRICS_DIR set:
+- Every process writes a snapshot of its registry to
+  METRICS_DIR/metrics-<pid>.json every METRICS_FLUSH_INTERVAL seconds
+  (and when its worker exits)
+- /metrics flushes the answering process, then reports the sum of all
+  snapshots
+- When a worker has exited (recycled or crashed), the gunicorn master
+  folds its snapshot into metrics-archive.json, so counters never go
+  back and the number of files stays bounded
+
+The directory is emptied when the gunicorn configuration is loaded, so
+counters start from zero with the server. Values of other workers are
+at most METRICS_FLUSH_INTERVAL seconds old.
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional
+from utils.metrics import REGISTRY, MetricsRegistry
+
+
+# =============================================================================
+# Store Configuration
+# =============================================================================
+
+SNAPSHOT_PREFIX = 'metrics-'
+ARCHIVE_FILE = 'metrics-archive.json'
+LOCK_FILE = 'metrics.lock'
+
+
+# =============================================================================
+# Snapshot Files
+# =============================================================================
+
+def snapshot_path(directory: str, pid: int) -> str:
+    """Return the snapshot file of a process."""
+    return os.path.join(directory, f'{SNAPSHOT_PREFIX}{pid}.json')
+
+
+@contextmanager
+def locked(directory: str, exclusive: bool) -> Iterator[None]:
+    """Hold the directory lock, so no snapshot is read while it is archived."""
+    fd = os.open(os.path.join(directory, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        os.close(fd)
+
+
+def read_snapshot(path: str) -> Optional[Dict[str, Any]]:
+    """Load a snapshot file, or None if it is missing or unreadable."""
+    try:
+        with open(path) as snapshot_file:
+            return json.load(snapshot_file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_snapshot(path: str, snapshot: Dict[str, Any]) -> None:
+    """Atomically write a snapshot file."""
+    # Write to a temporary file first so readers never see partial data
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as temp_file:
+            json.dump(snapshot, temp_file)
+        os.replace(temp_path, path)
+    except OSError:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def mark_process_dead(directory: str, pid: int) -> None:
+    """
+    Fold the snapshot of an exited process into the archive.
+
+    Called by the gunicorn master when a worker exits.
+
+    Args:
+        directory: METRICS_DIR
+        pid: Process id of the exited worker
+    """
+    path = snapshot_path(directory, pid)
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+
+    with locked(directory, exclusive=True):
+        snapshot = read_snapshot(path)
+        if snapshot is None:
+            return
+
+        archive = read_snapshot(archive_path) or {}
+        write_snapshot(archive_path, REGISTRY.merged([archive, snapshot]).snapshot())
+        os.unlink(path)
+
+
+def reset_metrics_dir(directory: str) -> None:
+    """
+    Delete the snapshots of a previous server run.
+
+    Args:
+        directory: METRICS_DIR
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.startswith((SNAPSHOT_PREFIX, '.tmp-')):
+            try:
+                os.unlink(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+# =============================================================================
+# Metrics Store
+# =============================================================================
+
+class MetricsStore:
+    """Directory of metric snapshots shared by the worker processes."""
+
+    def __init__(self, directory: str, registry: MetricsRegistry,
+                 flush_interval: float = 5.0):
+        """
+        Args:
+            directory: Directory holding one snapshot file per process
+            registry: The process's registry
+            flush_interval: Seconds between snapshots
+        """
+        self.directory = directory
+        self.registry = registry
+        self.flush_interval = flush_interval
+        self._flusher_pid: Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+
+        # A forked worker starts without the values recorded by its
+        # parent (which writes them itself) and needs its own flusher
+        os.register_at_fork(after_in_child=self._after_fork)
+        self.start()
+
+    def _after_fork(self) -> None:
+        """Reset the registry of a forked child and start its flusher."""
+        self.registry.reset_after_fork()
+        self._flusher_pid = None
+        self.start()
+
+    def start(self) -> None:
+        """Start the background flusher of the current process (once)."""
+        if self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+
+        thread = threading.Thread(target=self._run, name='metrics-flusher', daemon=True)
+        thread.start()
+
+    def _run(self) -> None:
+        """Write snapshots until the process exits."""
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                # Log the error (in production, use proper logging)
+                print(f'Metrics could not be written: {str(e)}')
+
+    def flush(self) -> None:
+        """Write the current process's snapshot."""
+        write_snapshot(snapshot_path(self.directory, os.getpid()), self.registry.snapshot())
+
+    def collect(self) -> MetricsRegistry:
+        """
+        Merge the snapshots of all processes.
+
+        Returns:
+            Registry holding the sum over every worker, alive or exited
+        """
+        self.flush()
+
+        with locked(self.directory, exclusive=False):
+            snapshots: List[Dict[str, Any]] = []
+            for name in os.listdir(self.directory):
+                if name.startswith(SNAPSHOT_PREFIX) and name.endswith('.json'):
+                    snapshot = read_snapshot(os.path.join(self.directory, name))
+                    if snapshot is not None:
+                        snapshots.append(snapshot)
+
+        return self.registry.merged(snapshots)
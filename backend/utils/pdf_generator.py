@@ -5,14 +5,37 @@ Handles PDF generation from HTML templates using WeasyPrint.
 
 This module provides functionality to render HTML templates and convert
 them to professional PDF documents.
+
+With PDF_COMPOSITION enabled, documents are assembled from pages instead
+of being laid out in one piece. The template marks a run of pages that
+is identical for every organization (the appendix templates); those
+pages are laid out once per template/stylesheet version and reused.
+Each request lays out only the rest of the document, and the running
+headers and "Page X of Y" footers of the reused pages are taken from the
+request's own layout, so the result matches a full render.
 """
 
 import os
 import io
+import hashlib
+import threading
+import time
 from datetime import datetime
-from typing import Dict, Any
-from jinja2 import Environment, FileSystemLoader
-from weasyprint import HTML, CSS
+from typing import Dict, Any, List, Optional, Tuple
+from weasyprint import HTML
+from weasyprint.document import Document, Page
+from weasyprint.formatting_structure.boxes import MarginBox
+from utils.asset_cache import STYLESHEET_NAME, get_asset_cache
+from utils.fragment_cache import render_with_fragments
+from utils.metrics import timed_stage
+from utils.result_cache import file_version
+from utils.settings import env_flag
+from utils.template_renderer import (
+    build_template_context,
+    get_template,
+    preload_templates,
+    sample_questionnaires
+)
 
 
 # =============================================================================
@@ -26,16 +49,72 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 TEMPLATE_DIR = os.path.join(os.path.dirname(CURRENT_DIR), 'templates')
 
 
+# =============================================================================
+# Page Composition Configuration
+# =============================================================================
+
+# Set PDF_COMPOSITION=true to reuse the layout of the invariant pages
+PDF_COMPOSITION_ENABLED = env_flag('PDF_COMPOSITION')
+
+# Comments enclosing the invariant pages in the rendered HTML. The run
+# must start and end on a page break.
+STATIC_PAGES_START = '<!-- static-pages -->'
+STATIC_PAGES_END = '<!-- /static-pages -->'
+
+# Id of the empty element left in their place, to find the split page
+STATIC_PAGES_ANCHOR = 'static-pages'
+
+# Margin boxes showing page numbers, which differ in every document
+PAGE_NUMBER_BOXES = ('@bottom-center',)
+
+# Page-number layouts kept per thread, one per document length
+MAX_NUMBERING_LAYOUTS = 32
+
+# Wraps the invariant pages in a document of their own
+STATIC_PAGES_DOCUMENT = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <link rel="stylesheet" href="pdf_styles.css">
+</head>
+<body>
+    <div class="main-content">
+{content}
+    </div>
+</body>
+</html>
+"""
+
+# Blank pages whose footers number a document of known length
+NUMBERING_DOCUMENT = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <link rel="stylesheet" href="pdf_styles.css">
+</head>
+<body>
+    <div></div>{pages}
+</body>
+</html>
+"""
+NUMBERING_PAGE = '\n    <div style="page-break-before: always;"></div>'
+
+# Layouts reused by this thread's renders (they belong to its font config)
+_layouts = threading.local()
+
+
 # =============================================================================
 # HTML Template Rendering
 # =============================================================================
 
-def render_html_template(validated_data: Dict[str, Any]) -> str:
+def render_html_template(validated_data: Dict[str, Any],
+                         generated_at: Optional[datetime] = None) -> str:
     """
     Render the HTML template for PDF generation.
     
     Args:
         validated_data: Dictionary of validated and sanitized user input
+        generated_at: Timestamp printed in the document (defaults to now)
         
     Returns:
         Rendered HTML as a string
@@ -44,27 +123,15 @@ def render_html_template(validated_data: Dict[str, Any]) -> str:
         TemplateNotFound: If the template file is missing
         TemplateSyntaxError: If the template has syntax errors
     """
-    # Create Jinja2 environment
-    env = Environment(
-        loader=FileSystemLoader(TEMPLATE_DIR),
-        autoescape=True,
-        trim_blocks=True,
-        lstrip_blocks=True
-    )
-    
-    # Load the HTML template
-    template = env.get_template('nist_ir_pdf_template.html.j2')
+    # Load the compiled HTML template from the shared cache
+    template = get_template('nist_ir_pdf_template.html.j2')
     
     # Prepare context with additional metadata (same as template_renderer)
-    context = {
-        **validated_data,
-        'generated_date': datetime.now().strftime('%Y-%m-%d'),
-        'generated_time': datetime.now().strftime('%H:%M:%S'),
-        'document_version': '1.0'
-    }
+    context = build_template_context(validated_data, generated_at)
     
-    # Render and return
-    return template.render(context)
+    # Render from cached static fragments and return
+    with timed_stage('render_template'):
+        return render_with_fragments(template, context)
 
 
 # =============================================================================
@@ -75,6 +142,10 @@ def generate_pdf(html_content: str) -> bytes:
     """
     Convert HTML content to PDF using WeasyPrint.
     
+    The stylesheet, local images and font configuration come from the
+    shared asset cache, so only the document itself is parsed and laid
+    out on each call.
+    
     Args:
         html_content: Rendered HTML content as string
         
@@ -84,22 +155,69 @@ def generate_pdf(html_content: str) -> bytes:
     Raises:
         Exception: If PDF generation fails
     """
-    # Path to CSS file
-    css_path = os.path.join(TEMPLATE_DIR, 'pdf_styles.css')
+    # Reuse the layout of the invariant pages when enabled
+    if PDF_COMPOSITION_ENABLED:
+        pdf_bytes = compose_pdf(html_content)
+        if pdf_bytes is not None:
+            return pdf_bytes
     
-    # Create HTML object from string
-    html = HTML(string=html_content, base_url=TEMPLATE_DIR)
+    assets = get_asset_cache()
     
-    # Create CSS object
-    css = CSS(filename=css_path)
+    # Create HTML object from string, fetching local assets from memory
+    with timed_stage('weasyprint_parse'):
+        html = HTML(
+            string=html_content,
+            base_url=TEMPLATE_DIR,
+            url_fetcher=assets.url_fetcher
+        )
     
-    # Generate PDF and return bytes
-    pdf_bytes = html.write_pdf(stylesheets=[css])
+    # Generate PDF with the cached stylesheet, fonts and decoded images
+    image_cache = assets.image_cache_for_render()
+    with timed_stage('weasyprint_layout'):
+        pdf_bytes = html.write_pdf(
+            stylesheets=[assets.get_stylesheet()],
+            font_config=assets.font_config,
+            cache=image_cache
+        )
+    assets.retain_images(image_cache)
     
     return pdf_bytes
 
 
-def generate_pdf_from_data(validated_data: Dict[str, Any]) -> bytes:
+def render_document(html_content: str) -> Document:
+    """
+    Lay out HTML content without writing the PDF.
+    
+    Uses the same assets as generate_pdf, so pages of several documents
+    can be combined into one.
+    
+    Args:
+        html_content: Rendered HTML content as string
+        
+    Returns:
+        WeasyPrint Document holding the laid out pages
+    """
+    assets = get_asset_cache()
+    
+    html = HTML(
+        string=html_content,
+        base_url=TEMPLATE_DIR,
+        url_fetcher=assets.url_fetcher
+    )
+    
+    image_cache = assets.image_cache_for_render()
+    document = html.render(
+        stylesheets=[assets.get_stylesheet()],
+        font_config=assets.font_config,
+        cache=image_cache
+    )
+    assets.retain_images(image_cache)
+    
+    return document
+
+
+def generate_pdf_from_data(validated_data: Dict[str, Any],
+                           generated_at: Optional[datetime] = None) -> bytes:
     """
     Generate PDF directly from validated data.
     
@@ -108,14 +226,214 @@ def generate_pdf_from_data(validated_data: Dict[str, Any]) -> bytes:
     
     Args:
         validated_data: Dictionary of validated and sanitized user input
+        generated_at: Timestamp printed in the document (defaults to now)
         
     Returns:
         PDF document as bytes
     """
     # Render HTML template
-    html_content = render_html_template(validated_data)
+    html_content = render_html_template(validated_data, generated_at)
     
     # Generate PDF
     pdf_bytes = generate_pdf(html_content)
     
     return pdf_bytes
+
+
+# =============================================================================
+# Page Composition
+# =============================================================================
+
+def split_static_pages(html_content: str) -> Optional[Tuple[str, str]]:
+    """
+    Separate the invariant pages from the rest of a rendered document.
+    
+    Args:
+        html_content: Rendered HTML content as string
+        
+    Returns:
+        Tuple of (document without the invariant pages, their HTML), or
+        None if the document does not mark any
+    """
+    start = html_content.find(STATIC_PAGES_START)
+    end = html_content.find(STATIC_PAGES_END, start)
+    if start < 0 or end < 0:
+        return None
+    
+    static_content = html_content[start + len(STATIC_PAGES_START):end]
+    dynamic_content = (
+        html_content[:start]
+        + f'<div id="{STATIC_PAGES_ANCHOR}"></div>'
+        + html_content[end + len(STATIC_PAGES_END):]
+    )
+    return dynamic_content, static_content
+
+
+def get_static_pages(static_content: str) -> List[Page]:
+    """
+    Return the laid out invariant pages, laying them out on first use.
+    
+    The layout is keyed by the pages' HTML and the stylesheet version, so
+    a template or stylesheet change is picked up by the next render.
+    
+    Args:
+        static_content: HTML of the invariant pages
+        
+    Returns:
+        The pages, without valid running headers or page numbers
+    """
+    key = hashlib.sha256(
+        (file_version(STYLESHEET_NAME) + static_content).encode('utf-8')
+    ).hexdigest()
+    
+    entry = getattr(_layouts, 'static_pages', None)
+    if entry is not None and entry[0] == key:
+        return entry[1]
+    
+    with timed_stage('weasyprint_layout'):
+        pages = render_document(STATIC_PAGES_DOCUMENT.format(content=static_content)).pages
+    _layouts.static_pages = (key, pages)
+    
+    return pages
+
+
+def get_numbering_pages(page_count: int) -> List[Page]:
+    """
+    Return blank pages carrying the footers of a document of given length.
+    
+    Args:
+        page_count: Total number of pages in the document
+        
+    Returns:
+        One page per document page, numbered "Page i of page_count"
+    """
+    version = file_version(STYLESHEET_NAME)
+    layouts = getattr(_layouts, 'numbering', None)
+    if layouts is None or layouts[0] != version or len(layouts[1]) >= MAX_NUMBERING_LAYOUTS:
+        layouts = (version, {})
+        _layouts.numbering = layouts
+    
+    pages = layouts[1].get(page_count)
+    if pages is None:
+        html_content = NUMBERING_DOCUMENT.format(pages=NUMBERING_PAGE * (page_count - 1))
+        pages = render_document(html_content).pages
+        layouts[1][page_count] = pages
+    
+    return pages
+
+
+def _margin_boxes(page: Page) -> Dict[str, MarginBox]:
+    """Return a page's running headers and footers by position."""
+    return {
+        child.at_keyword: child
+        for child in page._page_box.children
+        if isinstance(child, MarginBox)
+    }
+
+
+def _with_margin_boxes(page: Page, margin_boxes: Dict[str, MarginBox]) -> Page:
+    """Return a copy of a page with other running headers and footers."""
+    content = [
+        child for child in page._page_box.children
+        if not isinstance(child, MarginBox)
+    ]
+    return Page(page._page_box.copy_with_children(content + list(margin_boxes.values())))
+
+
+def compose_pdf(html_content: str) -> Optional[bytes]:
+    """
+    Convert HTML content to PDF, reusing the layout of the invariant pages.
+    
+    Only the document without the invariant pages is laid out. The
+    invariant pages are inserted where they were marked and take the
+    running headers of the page before them; every page gets the footer
+    of a document of the combined length. Bookmarks and links are
+    gathered from the combined pages, so the outline covers all of them.
+    
+    Args:
+        html_content: Rendered HTML content as string
+        
+    Returns:
+        PDF document as bytes, or None if the document marks no
+        invariant pages
+        
+    Raises:
+        Exception: If PDF generation fails
+    """
+    parts = split_static_pages(html_content)
+    if parts is None:
+        return None
+    dynamic_content, static_content = parts
+    
+    static_pages = get_static_pages(static_content)
+    
+    with timed_stage('weasyprint_layout'):
+        document = render_document(dynamic_content)
+    
+    # The invariant pages follow the page holding their placeholder
+    split = next(
+        (index + 1 for index, page in enumerate(document.pages)
+         if STATIC_PAGES_ANCHOR in page.anchors),
+        None
+    )
+    if split is None:
+        return None
+    
+    with timed_stage('pdf_compose'):
+        page_count = len(document.pages) + len(static_pages)
+        numbering = [_margin_boxes(page) for page in get_numbering_pages(page_count)]
+        headers = _margin_boxes(document.pages[split - 1])
+        
+        pages = document.pages[:split] + static_pages + document.pages[split:]
+        composed = []
+        for index, page in enumerate(pages):
+            if index < split or index >= split + len(static_pages):
+                margin_boxes = _margin_boxes(page)
+                # Pages without a footer (the title page) are kept as they are
+                if not any(name in margin_boxes for name in PAGE_NUMBER_BOXES):
+                    composed.append(page)
+                    continue
+            else:
+                margin_boxes = dict(headers)
+            
+            for name in PAGE_NUMBER_BOXES:
+                margin_boxes.pop(name, None)
+                if name in numbering[index]:
+                    margin_boxes[name] = numbering[index][name]
+            composed.append(_with_margin_boxes(page, margin_boxes))
+        
+        return document.copy(composed).write_pdf()
+
+
+# =============================================================================
+# Renderer Warm-Up
+# =============================================================================
+
+def warm_pdf_renderer() -> float:
+    """
+    Prepare this process for fast PDF generation.
+    
+    The first WeasyPrint render of a process pays for font discovery
+    (fontconfig), Pango setup and parsing the user-agent stylesheet.
+    Rendering one sample document moves that cost, together with
+    template compilation and asset loading, out of the first request.
+    
+    Returns:
+        Seconds spent warming up
+        
+    Raises:
+        Exception: If the sample document cannot be rendered
+    """
+    started = time.perf_counter()
+    
+    preload_templates()
+    
+    # Render one sample with a logo so image decoding is warmed up too
+    samples = sample_questionnaires()
+    sample = next(
+        (data for data in samples if data.get('organizationLogo')),
+        samples[0]
+    )
+    generate_pdf_from_data(sample)
+    
+    return time.perf_counter() - started
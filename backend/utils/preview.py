@@ -0,0 +1,521 @@
+"""
+Preview Module
+==============
+Incremental live preview of the Markdown/text document.
+
+A preview is split into sections at its level 1 to 3 headings. Every
+render is stored under a random token; the next preview request sends
+only the fields that changed together with that token, and receives only
+the sections whose text changed.
+
+Sections are cut from the fragment cache's skeletons, so the server
+knows which free-text slots each section contains. While the variant of
+the document stays the same (see fragment_cache.py), a change to a free-
+text field re-assembles only the sections that print that field; all
+other sections are reused from the previous render. Changes to fields
+that select the variant (booleans, infrastructure, severity levels)
+render the whole document, which is then compared section by section.
+
+Renders are kept per process in an LRU, and their inputs and section
+digests in a SQLite database shared by all web workers
+(PREVIEW_STORE_PATH). Both are bounded by count and by size, and the
+database also keeps at most PREVIEW_MAX_RENDERS_PER_CLIENT renders per
+client, so a client typing quickly cannot evict everyone else's
+previews. The organization logo is never printed in the Markdown/text
+document, so it is dropped from the submitted fields before they are
+validated or stored. A worker that did not issue a token rebuilds
+every section from the stored inputs and sends those whose digest
+changed. A token that is unknown to the store (expired) is rejected,
+and the client starts over with the full questionnaire.
+"""
+
+import hashlib
+import json
+import os
+import re
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Hashable, List, Optional, Tuple
+from jinja2 import Template
+from utils.fragment_cache import (
+    FRAGMENT_CACHE_ENABLED,
+    Skeleton,
+    fill_skeleton,
+    get_fragment_renderer,
+    render_slot_values,
+    split_context,
+    uses_autoescape
+)
+from utils.metrics import timed_stage
+from utils.settings import env_int, env_str
+from utils.template_renderer import build_template_context, convert_to_text, get_template
+
+
+# =============================================================================
+# Preview Configuration
+# =============================================================================
+
+# Renders kept for incremental updates, across all clients, and their
+# total size in bytes
+PREVIEW_MAX_RENDERS = env_int('PREVIEW_MAX_RENDERS', 1024)
+PREVIEW_MAX_BYTES = env_int('PREVIEW_MAX_BYTES', 64 * 1024 * 1024)
+
+# Renders kept per client; each response replaces the client's token, so
+# only the latest few (requests still in flight) are ever used again
+PREVIEW_MAX_RENDERS_PER_CLIENT = env_int('PREVIEW_MAX_RENDERS_PER_CLIENT', 8)
+
+# Database of the renders, shared by all web workers of the node
+PREVIEW_STORE_PATH = env_str(
+    'PREVIEW_STORE_PATH',
+    os.path.join(tempfile.gettempdir(), 'responseforge-previews.sqlite')
+)
+
+# Formats the preview can show; both come from the Markdown template
+PREVIEW_FORMATS = ('md', 'txt')
+
+PREVIEW_TEMPLATE = 'nist_ir_template.j2'
+
+# Questionnaire fields the preview ignores (not printed in Markdown/text)
+PREVIEW_IGNORED_FIELDS = ('organizationLogo',)
+
+# A new section starts at every line beginning with '# ', '## ' or '### '
+SECTION_BREAK = re.compile(r'(?<=\n)(?=#{1,3} )')
+
+
+class PreviewTokenError(KeyError):
+    """Raised when a preview token is unknown or expired."""
+
+
+# =============================================================================
+# Sections
+# =============================================================================
+
+def split_sections(document: str) -> List[str]:
+    """Split a rendered document into its sections."""
+    return SECTION_BREAK.split(document)
+
+
+def section_digest(section: str) -> str:
+    """Return the digest by which a section is compared across workers."""
+    return hashlib.blake2b(section.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def split_skeleton(skeleton: Skeleton) -> List[Skeleton]:
+    """
+    Split a skeleton into one sub-skeleton per section.
+
+    Headings are only searched in the literal fragments, so free text
+    that happens to contain a heading never moves a section boundary.
+    Joining the assembled sections gives the assembled skeleton.
+
+    Args:
+        skeleton: Literal fragments alternating with slot names
+
+    Returns:
+        List of skeletons, each starting and ending with a literal
+    """
+    sections: List[Skeleton] = []
+    current: Skeleton = []
+
+    for index, part in enumerate(skeleton):
+        if index % 2:
+            current.append(part)
+            continue
+
+        pieces = SECTION_BREAK.split(part)
+        current.append(pieces[0])
+        for piece in pieces[1:]:
+            sections.append(current)
+            current = [piece]
+
+    sections.append(current)
+    return sections
+
+
+class SectionLayout:
+    """Sections of one skeleton and the slots each of them prints."""
+
+    def __init__(self, skeleton: Skeleton):
+        """
+        Args:
+            skeleton: Skeleton of a document variant
+        """
+        self.skeleton = skeleton
+        self.sections = split_skeleton(skeleton)
+        self.section_slots = [
+            frozenset(section[1::2]) for section in self.sections
+        ]
+
+
+# =============================================================================
+# Preview Renders
+# =============================================================================
+
+class PreviewRender:
+    """
+    One stored preview: its inputs and the text of every section.
+
+    Renders loaded from the shared store carry only the digests of their
+    sections (sections is None).
+    """
+
+    __slots__ = ('token', 'client', 'raw_data', 'generated_at', 'output_format',
+                 'layout_key', 'slots', 'sections', 'digests', 'record', 'size')
+
+    def __init__(self, client: str, raw_data: Dict[str, Any], generated_at: datetime,
+                 output_format: str, layout_key: Optional[Hashable],
+                 slots: Dict[str, Any], sections: Optional[List[str]],
+                 digests: Optional[List[str]] = None,
+                 token: Optional[str] = None):
+        self.token = token or secrets.token_urlsafe(16)
+        self.client = client
+        self.raw_data = raw_data
+        self.generated_at = generated_at
+        self.output_format = output_format
+        self.layout_key = layout_key
+        self.slots = slots
+        self.sections = sections
+        self.digests = digests
+        if digests is None:
+            self.digests = [section_digest(section) for section in sections]
+
+        # Shared form of the render, and the bytes it pins in memory
+        self.record = json.dumps({
+            'raw_data': raw_data,
+            'generated_at': generated_at.timestamp(),
+            'output_format': output_format,
+            'digests': self.digests
+        })
+        self.size = len(self.record) + sum(len(section) for section in sections or ())
+
+    def section_changed(self, index: int, section: str) -> bool:
+        """Return True if a section differs from this render's section."""
+        if index >= len(self.digests):
+            return True
+        if self.sections is None:
+            return section_digest(section) != self.digests[index]
+        return section is not self.sections[index] and section != self.sections[index]
+
+
+class PreviewStore:
+    """Preview inputs and section digests in a SQLite database shared by local processes."""
+
+    def __init__(self, path: str, max_renders: int, max_bytes: int,
+                 max_renders_per_client: int):
+        """
+        Args:
+            path: Database file (shared by all processes on the node)
+            max_renders: Number of renders kept before the least recently
+                         used is deleted
+            max_bytes: Total size of the kept renders
+            max_renders_per_client: Number of renders kept per client
+        """
+        self.path = path
+        self.max_renders = max_renders
+        self.max_bytes = max_bytes
+        self.max_renders_per_client = max_renders_per_client
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._local = threading.local()
+
+        connection = self._connection()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS previews ('
+            'token TEXT PRIMARY KEY, client TEXT NOT NULL, record TEXT NOT NULL, '
+            'size INTEGER NOT NULL, used_at REAL NOT NULL)'
+        )
+        connection.execute(
+            'CREATE INDEX IF NOT EXISTS previews_used_at ON previews (used_at)'
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use."""
+        # A connection must not be used across fork (e.g. one opened while
+        # a preloaded app was created in gunicorn's master process)
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def save(self, render: PreviewRender) -> None:
+        """Store a render's inputs, then delete the least recently used beyond the bounds."""
+        connection = self._connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO previews (token, client, record, size, used_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (render.token, render.client, render.record, len(render.record), time.time())
+        )
+        connection.execute(
+            'DELETE FROM previews WHERE token IN ('
+            'SELECT token FROM ('
+            'SELECT token, '
+            'ROW_NUMBER() OVER newest AS position, '
+            'SUM(size) OVER newest AS total_size, '
+            'ROW_NUMBER() OVER (PARTITION BY client ORDER BY used_at DESC, token) AS client_position '
+            'FROM previews WINDOW newest AS (ORDER BY used_at DESC, token)) '
+            'WHERE position > ? OR total_size > ? OR client_position > ?)',
+            (self.max_renders, self.max_bytes, self.max_renders_per_client)
+        )
+
+    def load(self, token: str, client: str) -> Optional[PreviewRender]:
+        """Return a client's stored render (without section texts), or None if unknown."""
+        connection = self._connection()
+        row = connection.execute(
+            'SELECT record FROM previews WHERE token = ? AND client = ?', (token, client)
+        ).fetchone()
+        if row is None:
+            return None
+
+        connection.execute(
+            'UPDATE previews SET used_at = ? WHERE token = ?', (time.time(), token)
+        )
+
+        record = json.loads(row[0])
+        return PreviewRender(
+            client,
+            record['raw_data'],
+            datetime.fromtimestamp(record['generated_at']),
+            record['output_format'],
+            None,
+            {},
+            None,
+            digests=record['digests'],
+            token=token
+        )
+
+
+class PreviewRenderer:
+    """Renders previews and keeps recent renders for incremental updates."""
+
+    def __init__(self, max_renders: int = PREVIEW_MAX_RENDERS,
+                 max_bytes: int = PREVIEW_MAX_BYTES,
+                 store: Optional[PreviewStore] = None):
+        """
+        Args:
+            max_renders: Number of renders kept before the oldest is dropped
+            max_bytes: Total size of the renders kept in memory
+            store: Store shared with the other web workers
+        """
+        self.max_renders = max_renders
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.store = store
+        self._lock = threading.Lock()
+        self._renders: 'OrderedDict[str, PreviewRender]' = OrderedDict()
+
+        # (template name, variant key) -> section layout of the skeleton
+        self._layouts: 'OrderedDict[Tuple[str, Hashable], SectionLayout]' = OrderedDict()
+
+    def get(self, token: str, client: str) -> PreviewRender:
+        """
+        Return a stored render of a client.
+
+        Raises:
+            PreviewTokenError: If the token is unknown, expired or was
+                               issued to another client
+        """
+        with self._lock:
+            render = self._renders.get(token)
+            if render is not None and render.client != client:
+                render = None
+            if render is not None:
+                self._renders.move_to_end(token)
+                return render
+
+        # Issued by another web worker (or dropped from this one's LRU)
+        if self.store is not None:
+            try:
+                render = self.store.load(token, client)
+            except sqlite3.Error as e:
+                # Log the error (in production, use proper logging)
+                print(f'Preview could not be loaded: {str(e)}')
+            if render is not None:
+                return render
+
+        raise PreviewTokenError(token)
+
+    def _store(self, render: PreviewRender) -> None:
+        """Keep a render for later incremental updates."""
+        with self._lock:
+            self._renders[render.token] = render
+            self.current_bytes += render.size
+            while (len(self._renders) > self.max_renders
+                   or self.current_bytes > self.max_bytes):
+                _, evicted = self._renders.popitem(last=False)
+                self.current_bytes -= evicted.size
+
+        if self.store is not None:
+            try:
+                self.store.save(render)
+            except sqlite3.Error as e:
+                # Log the error (in production, use proper logging)
+                print(f'Preview could not be stored: {str(e)}')
+
+    def _layout(self, template: Template, key: Hashable,
+                marker_context: Dict[str, Any],
+                slot_names: List[str]) -> Optional[SectionLayout]:
+        """Return the section layout of a variant, if fragments are usable."""
+        if not FRAGMENT_CACHE_ENABLED:
+            return None
+
+        skeleton = get_fragment_renderer().get_skeleton(
+            template, key, marker_context, slot_names
+        )
+        if skeleton is None:
+            return None
+
+        layout_key = (template.name, key)
+        with self._lock:
+            layout = self._layouts.get(layout_key)
+            if layout is not None and layout.skeleton is skeleton:
+                self._layouts.move_to_end(layout_key)
+                return layout
+
+        layout = SectionLayout(skeleton)
+        with self._lock:
+            self._layouts[layout_key] = layout
+            while len(self._layouts) > get_fragment_renderer().max_variants:
+                self._layouts.popitem(last=False)
+
+        return layout
+
+    def render(self, client: str, raw_data: Dict[str, Any],
+               validated_data: Dict[str, Any], output_format: str,
+               base: Optional[PreviewRender] = None) -> Tuple[PreviewRender, List[int]]:
+        """
+        Render a preview, reusing the unchanged sections of a base render.
+
+        Args:
+            client: Identity of the requesting client (remote address)
+            raw_data: Submitted questionnaire, stored for the next update
+            validated_data: Output of validate_questionnaire for raw_data
+            output_format: 'md' or 'txt'
+            base: Previous render the client holds, if any
+
+        Returns:
+            Tuple of the new render and the indexes of the sections that
+            differ from the base render (all sections without a base)
+        """
+        # Keep the timestamp of the first render so that the printed
+        # time does not change on every keystroke
+        generated_at = base.generated_at if base is not None else datetime.now()
+
+        template = get_template(PREVIEW_TEMPLATE)
+        context = build_template_context(validated_data, generated_at)
+
+        with timed_stage('render_template'):
+            layout_key = None
+            slots: Dict[str, Any] = {}
+            layout = None
+
+            split = split_context(context)
+            if split is not None:
+                key, marker_context, slots = split
+                layout = self._layout(template, key, marker_context, list(slots))
+                layout_key = (template.name, key)
+
+            if layout is None:
+                # Fragments unavailable: render in full
+                sections = split_sections(template.render(context))
+                layout_key = None
+                slots = {}
+            else:
+                sections = self._assemble(layout, layout_key, slots,
+                                          uses_autoescape(template), output_format, base)
+
+        if layout is None and output_format == 'txt':
+            with timed_stage('convert_text'):
+                sections = [convert_to_text(section) for section in sections]
+
+        render = PreviewRender(client, raw_data, generated_at, output_format,
+                               layout_key, slots, sections)
+        self._store(render)
+
+        if base is None or base.output_format != output_format:
+            return render, list(range(len(sections)))
+
+        changed = [
+            index for index, section in enumerate(sections)
+            if base.section_changed(index, section)
+        ]
+        return render, changed
+
+    def _assemble(self, layout: SectionLayout, layout_key: Hashable,
+                  slots: Dict[str, Any], autoescape: bool, output_format: str,
+                  base: Optional[PreviewRender]) -> List[str]:
+        """Assemble the sections, reusing those of the base render."""
+        reusable = (
+            base is not None
+            and base.layout_key == layout_key
+            and base.output_format == output_format
+        )
+
+        if reusable:
+            changed_slots = {
+                name for name, value in slots.items() if base.slots.get(name) != value
+            }
+            rebuild = [
+                not changed_slots.isdisjoint(section_slots)
+                for section_slots in layout.section_slots
+            ]
+        else:
+            rebuild = [True] * len(layout.sections)
+
+        # Escape only the values printed in the sections being rebuilt
+        needed = set()
+        for index, section_slots in enumerate(layout.section_slots):
+            if rebuild[index]:
+                needed.update(section_slots)
+        values = render_slot_values({name: slots[name] for name in needed}, autoescape)
+
+        sections = []
+        for index, section in enumerate(layout.sections):
+            if not rebuild[index]:
+                sections.append(base.sections[index])
+                continue
+
+            text = fill_skeleton(section, values)
+            if output_format == 'txt':
+                with timed_stage('convert_text'):
+                    text = convert_to_text(text)
+            sections.append(text)
+
+        return sections
+
+
+# =============================================================================
+# Shared Instance
+# =============================================================================
+
+_preview_renderer: Optional[PreviewRenderer] = None
+_preview_renderer_lock = threading.Lock()
+
+
+def get_preview_renderer() -> PreviewRenderer:
+    """Return the process-wide preview renderer, sharing PREVIEW_STORE_PATH."""
+    global _preview_renderer
+
+    if _preview_renderer is None:
+        with _preview_renderer_lock:
+            if _preview_renderer is None:
+                _preview_renderer = PreviewRenderer(
+                    store=PreviewStore(
+                        PREVIEW_STORE_PATH,
+                        PREVIEW_MAX_RENDERS,
+                        PREVIEW_MAX_BYTES,
+                        PREVIEW_MAX_RENDERS_PER_CLIENT
+                    )
+                )
+
+    return _preview_renderer
@@ -0,0 +1,190 @@
+"""
+Print Bundle Module
+===================
+Turns the rendered PDF template into a print-ready HTML document.
+
+The HTML output format lets the browser do the layout work WeasyPrint
+does for PDFs: the user opens the document and prints it to PDF. The
+bundle is a single file built from nist_ir_pdf_template.html.j2:
+- pdf_styles.css and print_styles.css are inlined, so the page size,
+  margins, page breaks and "Page X of Y" footers apply when printing
+- The running headers, which WeasyPrint fills from string-set (not
+  supported by browsers), are set as page rules for the organization
+- The lifecycle figure, the same in every document, is referenced from
+  the cacheable asset route (asset_routes.py) by its content version
+- The logo is inlined as a data URI (it is stored downscaled to its
+  printed size): the logo store deletes old logos, and a downloaded
+  document must keep its logo
+
+ASSET_BASE_URL must be the public address of the asset route, since the
+document is usually opened from a downloaded file.
+"""
+
+import base64
+import os
+import re
+import threading
+from typing import Dict, Optional, Tuple
+from utils.logo_store import LogoError, get_logo_store, is_logo_url
+from utils.result_cache import file_version
+from utils.settings import env_str
+
+
+# =============================================================================
+# Bundle Configuration
+# =============================================================================
+
+# Get the directory where this module is located
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Templates are stored in the backend/templates directory
+TEMPLATE_DIR = os.path.join(os.path.dirname(CURRENT_DIR), 'templates')
+
+# Public URL of the asset route, without a trailing slash
+ASSET_BASE_URL = env_str('ASSET_BASE_URL', 'http://127.0.0.1:5000/api/assets').rstrip('/')
+
+# Template files the documents reference and the asset route serves
+PRINT_ASSETS = ('incident_response_lifecycle.png',)
+
+# Stylesheets inlined into every bundle, in cascade order
+PRINT_STYLESHEETS = ('pdf_styles.css', 'print_styles.css')
+
+# Title of the running header on every page after the title page
+DOCUMENT_TITLE = 'Incident Response Plan'
+
+STYLESHEET_LINK = '<link rel="stylesheet" href="pdf_styles.css">'
+IMAGE_SOURCE_PATTERN = re.compile(r'(<img\b[^>]*?\ssrc=")([^"]*)(")')
+
+_stylesheets: Dict[str, Tuple[int, str]] = {}
+_stylesheets_lock = threading.Lock()
+
+
+# =============================================================================
+# Assets
+# =============================================================================
+
+def read_stylesheet(name: str) -> str:
+    """
+    Return a stylesheet from the templates directory.
+
+    Files are re-read only when their mtime changes.
+
+    Args:
+        name: Filename inside the templates directory
+
+    Returns:
+        Stylesheet text
+    """
+    path = os.path.join(TEMPLATE_DIR, name)
+    mtime = os.stat(path).st_mtime_ns
+
+    entry = _stylesheets.get(name)
+    if entry is not None and entry[0] == mtime:
+        return entry[1]
+
+    with open(path, encoding='utf-8') as stylesheet_file:
+        text = stylesheet_file.read()
+
+    with _stylesheets_lock:
+        _stylesheets[name] = (mtime, text)
+
+    return text
+
+
+def asset_url(source: str) -> Optional[str]:
+    """
+    Return the URL the print bundle uses for an image of the template.
+
+    Args:
+        source: src attribute as rendered for WeasyPrint
+
+    Returns:
+        A data URI for stored logos, an absolute URL on the asset route
+        for template images, or None for other sources (e.g. data URIs),
+        which are kept as they are
+    """
+    if is_logo_url(source):
+        try:
+            data, mime_type = get_logo_store().read(source)
+        except (LogoError, OSError) as e:
+            # Log the error (in production, use proper logging)
+            print(f'Logo could not be inlined: {str(e)}')
+            return ''
+        return f'data:{mime_type};base64,{base64.b64encode(data).decode("ascii")}'
+
+    if source in PRINT_ASSETS:
+        # The version makes the URL change with the file, so it can be
+        # cached indefinitely
+        return f'{ASSET_BASE_URL}/{source}?v={file_version(source)[:16]}'
+
+    return None
+
+
+# =============================================================================
+# Bundling
+# =============================================================================
+
+def css_string(value: str) -> str:
+    """
+    Quote a value as a CSS string that is safe inside a style element.
+
+    Args:
+        value: Any text
+
+    Returns:
+        Double-quoted CSS string
+    """
+    escaped = ''.join(
+        f'\\{ord(char):x} ' if char in '\\"<>&' or ord(char) < 0x20 or ord(char) == 0x7f else char
+        for char in value
+    )
+    return f'"{escaped}"'
+
+
+def running_header_rules(organization_name: str) -> str:
+    """
+    Build the page rules that stand in for the PDF's running headers.
+
+    Args:
+        organization_name: Organization printed in the top right corner
+
+    Returns:
+        CSS text
+    """
+    # The title page keeps its empty headers: the named @page title-page
+    # rule of pdf_styles.css is more specific than this one
+    return (
+        '@page {\n'
+        f'    @top-left {{ content: {css_string(DOCUMENT_TITLE)}; }}\n'
+        f'    @top-right {{ content: {css_string(organization_name)}; }}\n'
+        '}\n'
+    )
+
+
+def build_print_bundle(html_content: str, organization_name: str) -> str:
+    """
+    Turn the rendered PDF template into the print-ready HTML document.
+
+    Args:
+        html_content: nist_ir_pdf_template.html.j2 rendered for WeasyPrint
+        organization_name: Organization printed in the running headers
+
+    Returns:
+        Self-contained HTML document
+    """
+    styles = '\n'.join(read_stylesheet(name) for name in PRINT_STYLESHEETS)
+    style_element = (
+        '<style>\n'
+        + styles + '\n'
+        + running_header_rules(organization_name)
+        + '</style>'
+    )
+    html_content = html_content.replace(STYLESHEET_LINK, style_element, 1)
+
+    def replace_source(match: re.Match) -> str:
+        url = asset_url(match.group(2))
+        if url is None:
+            return match.group(0)
+        return match.group(1) + url.replace('&', '&amp;') + match.group(3)
+
+    return IMAGE_SOURCE_PATTERN.sub(replace_source, html_content)
@@ -0,0 +1,98 @@
+"""
+Process Memory Module
+=====================
+Resident memory of the current process, used to account for and bound
+the memory of PDF worker processes.
+
+On Linux the current and peak resident set size come from
+/proc/self/status, and writing "5" to /proc/self/clear_refs resets the
+peak, so the peak of a single job can be measured. Elsewhere the peak
+falls back to getrusage's lifetime maximum and the current size is
+unknown (None).
+"""
+
+import ctypes
+import ctypes.util
+import gc
+import resource
+import sys
+from typing import Optional
+
+
+# =============================================================================
+# Resident Set Size
+# =============================================================================
+
+STATUS_PATH = '/proc/self/status'
+CLEAR_REFS_PATH = '/proc/self/clear_refs'
+
+
+def _status_bytes(field: str) -> Optional[int]:
+    """Read a memory field (reported in kB) from /proc/self/status."""
+    try:
+        with open(STATUS_PATH) as status:
+            for line in status:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def current_rss() -> Optional[int]:
+    """Return the current resident set size in bytes, if known."""
+    return _status_bytes('VmRSS')
+
+
+def peak_rss() -> Optional[int]:
+    """Return the peak resident set size in bytes since the last reset."""
+    peak = _status_bytes('VmHWM')
+    if peak is not None:
+        return peak
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def reset_peak_rss() -> bool:
+    """
+    Start measuring the peak resident set size from now.
+
+    Returns:
+        True if the peak was reset, False if the platform cannot
+    """
+    try:
+        with open(CLEAR_REFS_PATH, 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+# =============================================================================
+# Releasing Memory
+# =============================================================================
+
+_libc = None
+
+
+def release_free_memory() -> None:
+    """
+    Return freed memory to the operating system where possible.
+
+    Collects garbage cycles, then asks glibc to give back the free pages
+    of its heaps, which fragmentation otherwise keeps resident.
+    """
+    global _libc
+
+    gc.collect()
+
+    if _libc is None:
+        try:
+            _libc = ctypes.CDLL(ctypes.util.find_library('c'))
+        except OSError:
+            _libc = False
+    trim = getattr(_libc, 'malloc_trim', None) if _libc else None
+    if trim is not None:
+        trim(0)
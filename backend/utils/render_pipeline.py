@@ -0,0 +1,261 @@
+"""
+Render Pipeline Module
+======================
+Renders one questionnaire into any set of output formats in one pass.
+
+A DocumentModel holds everything the templates need, prepared once:
+- The template context with a single generation timestamp
+- The document variant (which branches of the templates apply)
+- The printed text of every free-text field, escaped once
+
+Both templates draw from the same model. Each is rendered at most once
+per model, and derived formats reuse those renders:
+
+    md   <- nist_ir_template.j2
+    txt  <- md, converted line by line
+    html <- nist_ir_pdf_template.html.j2, bundled for browser printing
+    pdf  <- html as rendered, laid out by WeasyPrint
+
+So a request for "md + pdf" prepares the data once and renders each
+template once, and every format of one request carries the same
+timestamp. check_template_parity reports when the two templates stop
+printing the same questionnaire fields.
+"""
+
+from datetime import datetime
+from typing import Dict, Any, Iterable, Iterator, List, Optional
+from jinja2 import Template
+from utils.fragment_cache import (
+    FRAGMENT_CACHE_ENABLED,
+    fill_skeleton,
+    get_fragment_renderer,
+    render_slot_values,
+    split_context,
+    uses_autoescape
+)
+from utils.metrics import timed_stage
+from utils.print_bundle import build_print_bundle
+from utils.template_renderer import (
+    build_template_context,
+    convert_to_text,
+    get_template,
+    sample_questionnaires,
+    stream_convert_to_text
+)
+
+
+# =============================================================================
+# Formats
+# =============================================================================
+
+# Template each directly rendered format comes from
+FORMAT_TEMPLATES = {
+    'md': 'nist_ir_template.j2',
+    'html': 'nist_ir_pdf_template.html.j2'
+}
+
+# Formats derived from another format's output
+DERIVED_FORMATS = {
+    'txt': 'md',
+    'pdf': 'html'
+}
+
+PIPELINE_FORMATS = tuple(FORMAT_TEMPLATES) + tuple(DERIVED_FORMATS)
+
+# Questionnaire fields only some formats print
+FORMAT_SPECIFIC_FIELDS = {
+    # Images cannot be shown in Markdown
+    'organizationLogo': ('html',)
+}
+
+
+# =============================================================================
+# Document Model
+# =============================================================================
+
+class DocumentModel:
+    """A questionnaire prepared once for rendering in any format."""
+
+    def __init__(self, validated_data: Dict[str, Any],
+                 generated_at: Optional[datetime] = None):
+        """
+        Args:
+            validated_data: Output of validate_questionnaire
+            generated_at: Timestamp printed in every format (defaults to now)
+        """
+        self.validated_data = validated_data
+        self.context = build_template_context(validated_data, generated_at)
+        self._split = split_context(self.context) if FRAGMENT_CACHE_ENABLED else None
+        self._values: Dict[bool, Dict[str, str]] = {}
+
+    def _skeleton(self, template: Template) -> Optional[List[str]]:
+        """Return the template's skeleton for this variant, if usable."""
+        if self._split is None:
+            return None
+        key, marker_context, slots = self._split
+        return get_fragment_renderer().get_skeleton(template, key, marker_context, list(slots))
+
+    def _slot_values(self, autoescape: bool) -> Dict[str, str]:
+        """Return the printed slot values, converting them only once."""
+        values = self._values.get(autoescape)
+        if values is None:
+            values = render_slot_values(self._split[2], autoescape)
+            self._values[autoescape] = values
+        return values
+
+    def render(self, template_name: str) -> str:
+        """
+        Render one template from the model.
+
+        Args:
+            template_name: Template filename relative to the templates directory
+
+        Returns:
+            Rendered document, identical to ``template.render(context)``
+        """
+        template = get_template(template_name)
+
+        with timed_stage('render_template'):
+            skeleton = self._skeleton(template)
+            if skeleton is None:
+                return template.render(self.context)
+            return fill_skeleton(skeleton, self._slot_values(uses_autoescape(template)))
+
+    def stream(self, template_name: str) -> Iterator[str]:
+        """
+        Render one template from the model piece by piece.
+
+        Args:
+            template_name: Template filename relative to the templates directory
+
+        Yields:
+            Consecutive pieces of the rendered document
+        """
+        template = get_template(template_name)
+
+        skeleton = self._skeleton(template)
+        if skeleton is None:
+            yield from template.generate(self.context)
+            return
+
+        values = self._slot_values(uses_autoescape(template))
+        for index, part in enumerate(skeleton):
+            yield values[part] if index % 2 else part
+
+    def printed_fields(self, template_name: str) -> Optional[frozenset]:
+        """Return the free-text fields a template prints for this variant."""
+        skeleton = self._skeleton(get_template(template_name))
+        if skeleton is None:
+            return None
+        return frozenset(slot.split('.', 1)[0] for slot in skeleton[1::2])
+
+
+# =============================================================================
+# Rendering
+# =============================================================================
+
+def render_formats(model: DocumentModel, formats: Iterable[str]) -> Dict[str, bytes]:
+    """
+    Render a document model into several formats in one pass.
+
+    Args:
+        model: Prepared questionnaire
+        formats: Any of PIPELINE_FORMATS
+
+    Returns:
+        Format -> encoded document (UTF-8 text, or PDF bytes)
+
+    Raises:
+        ValueError: If a format is unknown
+    """
+    formats = list(dict.fromkeys(formats))
+    for output_format in formats:
+        if output_format not in PIPELINE_FORMATS:
+            raise ValueError(f'Unknown output format: {output_format}')
+
+    # Render each template at most once
+    rendered: Dict[str, str] = {}
+    for output_format in formats:
+        source = DERIVED_FORMATS.get(output_format, output_format)
+        if source not in rendered:
+            rendered[source] = model.render(FORMAT_TEMPLATES[source])
+
+    documents: Dict[str, bytes] = {}
+    for output_format in formats:
+        if output_format == 'txt':
+            with timed_stage('convert_text'):
+                documents['txt'] = convert_to_text(rendered['md']).encode('utf-8')
+        elif output_format == 'pdf':
+            # Imported here so text-only processes never load WeasyPrint
+            from utils.pdf_generator import generate_pdf
+            documents['pdf'] = generate_pdf(rendered['html'])
+        elif output_format == 'html':
+            with timed_stage('bundle_html'):
+                bundle = build_print_bundle(rendered['html'], model.context['organizationName'])
+            documents['html'] = bundle.encode('utf-8')
+        else:
+            documents[output_format] = rendered[output_format].encode('utf-8')
+
+    return documents
+
+
+def stream_format(model: DocumentModel, output_format: str) -> Iterator[str]:
+    """
+    Render a Markdown, text or HTML document from the model piece by piece.
+
+    Args:
+        model: Prepared questionnaire
+        output_format: 'md', 'txt' or 'html'
+
+    Returns:
+        Iterator over consecutive pieces of the document
+
+    Raises:
+        ValueError: If the format cannot be streamed
+    """
+    if output_format == 'txt':
+        return stream_convert_to_text(model.stream(FORMAT_TEMPLATES['md']))
+    if output_format in FORMAT_TEMPLATES:
+        return model.stream(FORMAT_TEMPLATES[output_format])
+    raise ValueError(f'Output format {output_format} cannot be streamed')
+
+
+# =============================================================================
+# Template Parity
+# =============================================================================
+
+def check_template_parity() -> List[str]:
+    """
+    Compare the free-text fields printed by the Markdown and HTML templates.
+
+    Every sample variant is checked; fields listed in
+    FORMAT_SPECIFIC_FIELDS may be missing from the other formats.
+
+    Returns:
+        Descriptions of the differences (empty when both agree)
+    """
+    problems: List[str] = []
+    seen = set()
+
+    for sample in sample_questionnaires():
+        model = DocumentModel(sample)
+        printed = {
+            output_format: model.printed_fields(template_name)
+            for output_format, template_name in FORMAT_TEMPLATES.items()
+        }
+        if any(fields is None for fields in printed.values()):
+            # Fragments unavailable: nothing to compare
+            return problems
+
+        all_fields = frozenset().union(*printed.values())
+        for output_format, fields in printed.items():
+            for field in sorted(all_fields - fields):
+                if (field in FORMAT_SPECIFIC_FIELDS
+                        and output_format not in FORMAT_SPECIFIC_FIELDS[field]):
+                    continue
+                problem = f'{FORMAT_TEMPLATES[output_format]} does not print {field}'
+                if problem not in seen:
+                    seen.add(problem)
+                    problems.append(problem)
+
+    return problems
@@ -0,0 +1,351 @@
+"""
+Result Cache Module
+===================
+Content-addressed cache for generated IR documents.
+
+Documents are stored under a key derived from:
+- The canonical JSON form of the validated questionnaire
+- The versions (content hashes) of the templates and the PDF stylesheet
+- The generation date printed in the document
+
+Handling of volatile fields:
+- generated_date is part of the key, so a cached document never carries
+  another day's date; entries roll over at midnight
+- generated_time is pinned to the first render of a key; repeat
+  submissions on the same day receive that document unchanged
+
+Two backends are available: an in-process LRU bounded by a byte budget
+and a directory on local disk that can be shared by all workers. The
+directory is bounded by the same byte budget (least recently used files
+are deleted first), and files older than RESULT_CACHE_MAX_AGE are deleted
+as they can no longer be hit once their day has passed.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+
+
+# =============================================================================
+# Cache Key Configuration
+# =============================================================================
+
+# Get the directory where this module is located
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Templates are stored in the backend/templates directory
+TEMPLATE_DIR = os.path.join(os.path.dirname(CURRENT_DIR), 'templates')
+
+# Files whose content affects the generated documents
+VERSIONED_FILES = (
+    'nist_ir_template.j2',
+    'nist_ir_pdf_template.html.j2',
+    'pdf_styles.css',
+    'print_styles.css',
+    'incident_response_lifecycle.png'
+)
+
+# Bump to invalidate every cached document after a renderer change
+CACHE_FORMAT_VERSION = '1'
+
+_file_versions: Dict[str, Tuple[int, str]] = {}
+_file_versions_lock = threading.Lock()
+
+
+# =============================================================================
+# Cache Keys
+# =============================================================================
+
+def file_version(name: str) -> str:
+    """
+    Return the content hash of a template asset.
+
+    Hashes are recomputed only when the file's mtime changes.
+
+    Args:
+        name: Filename inside the templates directory
+
+    Returns:
+        Hex digest of the file contents
+    """
+    path = os.path.join(TEMPLATE_DIR, name)
+    mtime = os.stat(path).st_mtime_ns
+
+    entry = _file_versions.get(name)
+    if entry is not None and entry[0] == mtime:
+        return entry[1]
+
+    with open(path, 'rb') as asset_file:
+        digest = hashlib.sha256(asset_file.read()).hexdigest()
+
+    with _file_versions_lock:
+        _file_versions[name] = (mtime, digest)
+
+    return digest
+
+
+def template_versions() -> Dict[str, str]:
+    """
+    Return the content hashes of all files that shape the output.
+
+    Returns:
+        Dictionary of filename to hex digest
+    """
+    return {name: file_version(name) for name in VERSIONED_FILES}
+
+
+def compute_cache_key(validated_data: Dict[str, Any],
+                      generated_at: datetime) -> str:
+    """
+    Compute the content address of a generated document.
+
+    Args:
+        validated_data: Output of validate_questionnaire (includes the
+                        requested output format)
+        generated_at: Generation timestamp of the request
+
+    Returns:
+        Hex digest identifying the document
+    """
+    material = {
+        'cache_format': CACHE_FORMAT_VERSION,
+        'data': validated_data,
+        'generated_date': generated_at.strftime('%Y-%m-%d'),
+        'templates': template_versions()
+    }
+    canonical = json.dumps(
+        material,
+        sort_keys=True,
+        separators=(',', ':'),
+        ensure_ascii=False
+    )
+
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+# =============================================================================
+# Storage Backends
+# =============================================================================
+
+class MemoryCacheBackend:
+    """In-process LRU store bounded by the total size of its values."""
+
+    def __init__(self, max_bytes: int):
+        """
+        Args:
+            max_bytes: Byte budget for all stored values
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= len(previous)
+
+            self._entries[key] = value
+            self.current_bytes += len(value)
+
+            # Evict least recently used entries until within budget
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+
+class DiskCacheBackend:
+    """Store values as files in a local directory shared by workers."""
+
+    def __init__(self, directory: str, max_bytes: int, max_age: float):
+        """
+        Args:
+            directory: Directory holding one file per cached document
+            max_bytes: Byte budget for all stored files
+            max_age: Seconds since its last use before a file is deleted
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as cached_file:
+                value = cached_file.read()
+        except OSError:
+            return None
+
+        # Mark as recently used so pruning keeps it
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+
+        # Write to a temporary file first so readers never see partial data
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(value)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            return
+
+        self._prune()
+
+    def _prune(self) -> None:
+        """Delete expired files, then the least recently used beyond max_bytes."""
+        with self._lock:
+            entries = []
+            try:
+                with os.scandir(self.directory) as scan:
+                    for entry in scan:
+                        if entry.name.startswith('.tmp-'):
+                            continue
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        entries.append((stat.st_mtime, stat.st_size, entry.name))
+            except OSError:
+                return
+
+            cutoff = time.time() - self.max_age
+            total = sum(size for _, size, _ in entries)
+
+            # Oldest first: expired files, then until within budget
+            for mtime, size, name in sorted(entries):
+                if mtime > cutoff and total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(self._path(name))
+                except OSError:
+                    pass
+                total -= size
+
+    def clear(self) -> None:
+        for name in os.listdir(self.directory):
+            try:
+                os.unlink(self._path(name))
+            except OSError:
+                pass
+
+
+# =============================================================================
+# Result Cache
+# =============================================================================
+
+# Backend names accepted by create_result_cache
+VALID_CACHE_BACKENDS = ['memory', 'disk', 'none']
+
+
+class ResultCache:
+    """Front end for a storage backend that tracks hit/miss statistics."""
+
+    def __init__(self, backend: Any):
+        """
+        Args:
+            backend: Object with get/set/clear methods storing bytes
+        """
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Look up a cached document.
+
+        Args:
+            key: Key from compute_cache_key
+
+        Returns:
+            Cached document bytes, or None on a miss
+        """
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        """
+        Store a generated document.
+
+        Args:
+            key: Key from compute_cache_key
+            value: Document bytes
+        """
+        self.backend.set(key, value)
+
+    def clear(self) -> None:
+        """Remove every cached document."""
+        self.backend.clear()
+
+
+def create_result_cache(backend: str, max_bytes: int, directory: str,
+                        max_age: float) -> Optional[ResultCache]:
+    """
+    Create a result cache from configuration values.
+
+    Args:
+        backend: One of VALID_CACHE_BACKENDS
+        max_bytes: Byte budget of the backend
+        directory: Directory of the disk backend
+        max_age: Seconds a file of the disk backend is kept after its last use
+
+    Returns:
+        Configured ResultCache, or None if caching is disabled
+
+    Raises:
+        ValueError: If the backend name is unknown
+    """
+    if backend not in VALID_CACHE_BACKENDS:
+        raise ValueError(
+            f'Unknown result cache backend "{backend}". '
+            f'Must be one of: {", ".join(VALID_CACHE_BACKENDS)}'
+        )
+
+    if backend == 'memory':
+        return ResultCache(MemoryCacheBackend(max_bytes))
+
+    if backend == 'disk':
+        return ResultCache(DiskCacheBackend(directory, max_bytes, max_age))
+
+    return None
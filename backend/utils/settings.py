@@ -0,0 +1,84 @@
+"""
+Settings Module
+===============
+Helpers for reading deployment settings from environment variables.
+
+All tunables of the backend (caches, worker pools, limits) are configured
+through the environment so the same code runs unchanged in development
+and production.
+"""
+
+import os
+
+
+# =============================================================================
+# Environment Readers
+# =============================================================================
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+def env_str(name: str, default: str = '') -> str:
+    """
+    Read a string setting from the environment.
+
+    Args:
+        name: Environment variable name
+        default: Value used when the variable is unset or empty
+
+    Returns:
+        The configured string
+    """
+    value = os.environ.get(name, '').strip()
+    return value or default
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """
+    Read a boolean setting from the environment.
+
+    Args:
+        name: Environment variable name
+        default: Value used when the variable is unset or empty
+
+    Returns:
+        True if the variable is set to one of 1/true/yes/on
+    """
+    value = os.environ.get(name, '').strip().lower()
+    if not value:
+        return default
+    return value in TRUE_VALUES
+
+
+def env_int(name: str, default: int) -> int:
+    """
+    Read an integer setting from the environment.
+
+    Args:
+        name: Environment variable name
+        default: Value used when the variable is unset or not a number
+
+    Returns:
+        The configured integer
+    """
+    try:
+        return int(os.environ.get(name, '').strip())
+    except ValueError:
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    """
+    Read a float setting from the environment.
+
+    Args:
+        name: Environment variable name
+        default: Value used when the variable is unset or not a number
+
+    Returns:
+        The configured float
+    """
+    try:
+        return float(os.environ.get(name, '').strip())
+    except ValueError:
+        return default
@@ -9,10 +9,22 @@ Security measures:
 - Template loaded from files only (not from user input)
 """
 
+import base64
 import os
+import threading
 from datetime import datetime
-from typing import Dict, Any
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from typing import Dict, Any, Iterable, Iterator, List, Optional
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    Template,
+    select_autoescape
+)
+from utils.logo_store import get_logo_store
+from utils.fragment_cache import get_fragment_renderer, render_with_fragments
+from utils.metrics import timed_stage
+from utils.settings import env_flag, env_str
 
 
 # =============================================================================
@@ -25,12 +37,22 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 # Templates are stored in the backend/templates directory
 TEMPLATE_DIR = os.path.join(os.path.dirname(CURRENT_DIR), 'templates')
 
+# Templates compiled once per worker when the application starts
+PRELOADED_TEMPLATES = ('nist_ir_template.j2', 'nist_ir_pdf_template.html.j2')
+
+# Development switch: re-check template files for changes on every lookup
+TEMPLATE_HOT_RELOAD = env_flag('TEMPLATE_HOT_RELOAD')
+
+# Optional directory for Jinja2's on-disk bytecode cache (shared by workers)
+TEMPLATE_BYTECODE_CACHE_DIR = env_str('TEMPLATE_BYTECODE_CACHE_DIR')
+
 
 # =============================================================================
 # Jinja2 Environment Setup
 # =============================================================================
 
-def create_jinja_env() -> Environment:
+def create_jinja_env(auto_reload: bool = False,
+                     bytecode_cache_dir: str = '') -> Environment:
     """
     Create a secure Jinja2 environment with autoescape enabled.
     
@@ -39,36 +61,244 @@ def create_jinja_env() -> Environment:
     - Autoescape all content to prevent XSS
     - Not inherit from any parent environment
     
+    Args:
+        auto_reload: Check template files for changes on every lookup
+        bytecode_cache_dir: Directory for compiled template bytecode
+                            (disabled when empty)
+    
     Returns:
         Configured Jinja2 Environment
     """
+    bytecode_cache = None
+    if bytecode_cache_dir:
+        os.makedirs(bytecode_cache_dir, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+    
     env = Environment(
         loader=FileSystemLoader(TEMPLATE_DIR),
         autoescape=select_autoescape(['html', 'xml', 'j2']),
         # Security: Don't allow extending from templates outside our directory
         trim_blocks=True,
-        lstrip_blocks=True
+        lstrip_blocks=True,
+        auto_reload=auto_reload,
+        bytecode_cache=bytecode_cache
     )
     
     return env
 
 
+# =============================================================================
+# Shared Template Cache
+# =============================================================================
+
+# One environment and one set of compiled templates per worker process
+_shared_env: Optional[Environment] = None
+_compiled_templates: Dict[str, Template] = {}
+_cache_lock = threading.Lock()
+
+
+def get_jinja_env() -> Environment:
+    """
+    Return the process-wide Jinja2 environment, creating it on first use.
+    
+    Returns:
+        Shared Jinja2 Environment
+    """
+    global _shared_env
+    
+    if _shared_env is None:
+        with _cache_lock:
+            if _shared_env is None:
+                _shared_env = create_jinja_env(
+                    auto_reload=TEMPLATE_HOT_RELOAD,
+                    bytecode_cache_dir=TEMPLATE_BYTECODE_CACHE_DIR
+                )
+    
+    return _shared_env
+
+
+def get_template(name: str) -> Template:
+    """
+    Return a compiled template from the process-wide cache.
+    
+    Compiled templates are kept for the lifetime of the worker, so a
+    lookup costs a dictionary access instead of a loader call and a
+    file stat. With hot reload enabled, every lookup goes through the
+    environment so that edited template files are picked up.
+    
+    Args:
+        name: Template filename relative to the templates directory
+        
+    Returns:
+        Compiled Jinja2 Template
+        
+    Raises:
+        TemplateNotFound: If the template file is missing
+        TemplateSyntaxError: If the template has syntax errors
+    """
+    if TEMPLATE_HOT_RELOAD:
+        return get_jinja_env().get_template(name)
+    
+    template = _compiled_templates.get(name)
+    if template is None:
+        env = get_jinja_env()
+        with _cache_lock:
+            template = _compiled_templates.get(name)
+            if template is None:
+                template = env.get_template(name)
+                _compiled_templates[name] = template
+    
+    return template
+
+
+def preload_templates() -> None:
+    """
+    Compile all known templates into the process-wide cache.
+    
+    Called once at application startup so that no user request pays
+    for template loading and compilation. The static fragments of the
+    common document variants are pre-rendered as well.
+    """
+    for name in PRELOADED_TEMPLATES:
+        get_template(name)
+    
+    warm_fragment_cache()
+
+
+# 1x1 transparent PNG used as the logo of sample questionnaires
+SAMPLE_LOGO_PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR4'
+    'nGNgYGBgAAAABQABpfZFQAAAAABJRU5ErkJggg=='
+)
+
+
+def sample_questionnaires() -> List[Dict[str, Any]]:
+    """
+    Build validated sample questionnaires covering the enum-driven variants.
+    
+    Covers each infrastructure environment combined with both answers of
+    the two yes/no questions and with/without a logo. Used to warm caches
+    at startup; the free-text answers are placeholders.
+    
+    The sample logo is put into the logo store as it is instead of being
+    validated like an upload, so that startup does not load Pillow.
+    
+    Returns:
+        List of validated questionnaires
+    """
+    # Imported here to keep the validator out of the renderer's import path
+    from validators.input_validator import (
+        VALID_INFRASTRUCTURE_OPTIONS,
+        VALID_SEVERITY_LEVELS,
+        VALID_COMMUNICATION_CHANNELS,
+        VALID_OUTPUT_FORMATS,
+        validate_questionnaire
+    )
+    
+    try:
+        logos = (get_logo_store().add_processed(SAMPLE_LOGO_PNG, 'png'), None)
+    except OSError as e:
+        # Log the error (in production, use proper logging)
+        print(f'Sample logo could not be stored: {str(e)}')
+        logos = (None,)
+    
+    samples = []
+    for infrastructure in VALID_INFRASTRUCTURE_OPTIONS:
+        for forensic in (True, False):
+            for reviews in (True, False):
+                for logo in logos:
+                    is_valid, validated, _ = validate_questionnaire({
+                        'organizationName': 'Organization',
+                        'industry': 'Industry',
+                        'infrastructureEnvironment': infrastructure,
+                        'incidentCommander': 'Commander',
+                        'socAnalysts': 'Analysts',
+                        'cloudRemediationOwner': 'Owner',
+                        'legalComplianceOwner': 'Owner',
+                        'severityLevels': list(VALID_SEVERITY_LEVELS),
+                        'severityDetermination': 'Criteria',
+                        'escalationMatrix': 'Matrix',
+                        'communicationChannels': VALID_COMMUNICATION_CHANNELS[:1],
+                        'criticalIncidentNotifications': 'Contacts',
+                        'maintainsForensicEvidence': forensic,
+                        'forensicEvidenceLocation': 'Location',
+                        'conductPostIncidentReviews': reviews,
+                        'outputFormat': VALID_OUTPUT_FORMATS[0]
+                    })
+                    if is_valid:
+                        validated['organizationLogo'] = logo
+                        samples.append(validated)
+    
+    return samples
+
+
+def warm_fragment_cache() -> None:
+    """
+    Pre-render the static fragments of every enum-driven variant.
+    
+    Variants that also depend on the chosen severity levels or the number
+    of communication channels are built on first use.
+    """
+    contexts = [build_template_context(sample) for sample in sample_questionnaires()]
+    
+    renderer = get_fragment_renderer()
+    for name in PRELOADED_TEMPLATES:
+        renderer.warm(get_template(name), contexts)
+
+
+def clear_template_cache() -> None:
+    """Drop the shared environment and all compiled templates."""
+    global _shared_env
+    
+    with _cache_lock:
+        _compiled_templates.clear()
+        _shared_env = None
+
+
 # =============================================================================
 # Template Rendering Functions
 # =============================================================================
 
-def render_ir_template(validated_data: Dict[str, Any]) -> str:
+# Version string printed in every generated document
+DOCUMENT_VERSION = '1.0'
+
+
+def build_template_context(validated_data: Dict[str, Any],
+                           generated_at: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Build the template context shared by all output formats.
+    
+    Args:
+        validated_data: Dictionary of validated and sanitized user input
+        generated_at: Timestamp printed in the document (defaults to now)
+        
+    Returns:
+        Context dictionary for the NIST templates
+    """
+    if generated_at is None:
+        generated_at = datetime.now()
+    
+    return {
+        **validated_data,
+        'generated_date': generated_at.strftime('%Y-%m-%d'),
+        'generated_time': generated_at.strftime('%H:%M:%S'),
+        'document_version': DOCUMENT_VERSION
+    }
+
+
+def render_ir_template(validated_data: Dict[str, Any],
+                       generated_at: Optional[datetime] = None) -> str:
     """
     Render the NIST IR template with the provided data.
     
     This function:
-    1. Creates a secure Jinja2 environment
-    2. Loads the NIST IR template from file
-    3. Renders the template with validated user data
-    4. Returns the rendered document as a string
+    1. Fetches the compiled NIST IR template from the shared cache
+    2. Renders the template with validated user data
+    3. Returns the rendered document as a string
     
     Args:
         validated_data: Dictionary of validated and sanitized user input
+        generated_at: Timestamp printed in the document (defaults to now)
         
     Returns:
         Rendered IR document as a string
@@ -77,22 +307,15 @@ def render_ir_template(validated_data: Dict[str, Any]) -> str:
         TemplateNotFound: If the template file is missing
         TemplateSyntaxError: If the template has syntax errors
     """
-    # Create secure environment
-    env = create_jinja_env()
-    
-    # Load the template
-    template = env.get_template('nist_ir_template.j2')
+    # Load the compiled template
+    template = get_template('nist_ir_template.j2')
     
     # Prepare context with additional metadata
-    context = {
-        **validated_data,
-        'generated_date': datetime.now().strftime('%Y-%m-%d'),
-        'generated_time': datetime.now().strftime('%H:%M:%S'),
-        'document_version': '1.0'
-    }
+    context = build_template_context(validated_data, generated_at)
     
-    # Render and return
-    return template.render(context)
+    # Render from cached static fragments and return
+    with timed_stage('render_template'):
+        return render_with_fragments(template, context)
 
 
 def generate_filename(organization_name: str, output_format: str) -> str:
@@ -101,7 +324,7 @@ def generate_filename(organization_name: str, output_format: str) -> str:
     
     Args:
         organization_name: Name of the organization
-        output_format: Output format ('md', 'txt', or 'pdf')
+        output_format: Output format ('md', 'txt', 'html' or 'pdf')
         
     Returns:
         Generated filename string
@@ -119,12 +342,41 @@ def generate_filename(organization_name: str, output_format: str) -> str:
         extension = 'pdf'
     elif output_format == 'md':
         extension = 'md'
+    elif output_format == 'html':
+        extension = 'html'
     else:
         extension = 'txt'
     
     return f'IR_Plan_{safe_name}_{timestamp}.{extension}'
 
 
+def convert_line_to_text(line: str) -> str:
+    """
+    Convert one Markdown line to plain text.
+    
+    Args:
+        line: A line of the Markdown document, without its newline
+        
+    Returns:
+        The converted line; headers gain an underline on a second line
+    """
+    # Remove header markers and replace with underlined text
+    if line.startswith('# '):
+        return line[2:] + '\n' + '=' * len(line[2:])
+    elif line.startswith('## '):
+        return line[3:] + '\n' + '-' * len(line[3:])
+    elif line.startswith('### '):
+        return line[4:]
+    elif line.startswith('#### '):
+        return line[5:]
+    elif line.startswith('- '):
+        return '  * ' + line[2:]
+    elif line.startswith('**') and line.endswith('**'):
+        return line[2:-2].upper()
+    else:
+        return line
+
+
 def convert_to_text(markdown_content: str) -> str:
     """
     Convert Markdown content to plain text format.
@@ -140,26 +392,34 @@ def convert_to_text(markdown_content: str) -> str:
     Returns:
         Plain text version of the document
     """
-    lines = markdown_content.split('\n')
-    text_lines = []
-    
-    for line in lines:
-        # Remove header markers and replace with underlined text
-        if line.startswith('# '):
-            text_lines.append(line[2:])
-            text_lines.append('=' * len(line[2:]))
-        elif line.startswith('## '):
-            text_lines.append(line[3:])
-            text_lines.append('-' * len(line[3:]))
-        elif line.startswith('### '):
-            text_lines.append(line[4:])
-        elif line.startswith('#### '):
-            text_lines.append(line[5:])
-        elif line.startswith('- '):
-            text_lines.append('  * ' + line[2:])
-        elif line.startswith('**') and line.endswith('**'):
-            text_lines.append(line[2:-2].upper())
-        else:
-            text_lines.append(line)
-    
-    return '\n'.join(text_lines)
+    return '\n'.join(convert_line_to_text(line) for line in markdown_content.split('\n'))
+
+
+def stream_convert_to_text(markdown_chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Convert a stream of Markdown pieces to plain text, line by line.
+    
+    Pieces may start or end anywhere in a line; only the current partial
+    line is buffered. The joined output is identical to convert_to_text
+    of the joined input.
+    
+    Args:
+        markdown_chunks: Consecutive pieces of the Markdown document
+        
+    Yields:
+        Consecutive pieces of the plain text document
+    """
+    partial: List[str] = []
+    
+    for chunk in markdown_chunks:
+        if '\n' not in chunk:
+            partial.append(chunk)
+            continue
+        
+        partial.append(chunk)
+        lines = ''.join(partial).split('\n')
+        partial = [lines.pop()]
+        
+        yield '\n'.join(convert_line_to_text(line) for line in lines) + '\n'
+    
+    yield convert_line_to_text(''.join(partial))
@@ -0,0 +1,145 @@
+"""
+Sanitizer Module
+================
+Fast, bleach-equivalent removal of HTML from questionnaire text.
+
+``bleach.clean(value, tags=[], strip=True)`` builds a new cleaner and
+runs a full html5lib parse and serialization for every field, although
+almost all answers are plain text. This module produces exactly the same
+output with less work:
+- Markup-free strings are returned unchanged without parsing. A string
+  is markup-free when it contains none of the characters that bleach
+  rewrites on their own: '<', '>', '&' and the C0 control characters
+  other than tab and line feed
+- Other strings go through a bleach Cleaner that is built once per
+  thread and reused
+- sanitize_fields cleans every text field of a questionnaire in one call
+
+Equivalence with bleach.clean is checked by the differential corpus in
+benchmarks/sanitizer_differential.py; rerun it after upgrading bleach.
+"""
+
+import re
+import threading
+from typing import Dict, Iterable, List
+from bleach.sanitizer import Cleaner
+
+
+# =============================================================================
+# Fast Path
+# =============================================================================
+
+# Characters bleach escapes, drops or normalizes (found by running every
+# code point through bleach.clean; see the differential corpus)
+MARKUP_PATTERN = re.compile('[\x00-\x08\x0b-\x1f&<>]')
+
+
+def is_markup_free(value: str) -> bool:
+    """Return True if bleach would return the string unchanged."""
+    return MARKUP_PATTERN.search(value) is None
+
+
+# =============================================================================
+# Text Sanitizer
+# =============================================================================
+
+class TextSanitizer:
+    """
+    Strips all HTML tags like bleach.clean(value, tags=[], strip=True).
+
+    Cleaners hold html5lib parser state and are not thread-safe, so each
+    thread builds its own on first use.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def cleaner(self) -> Cleaner:
+        """The calling thread's reusable bleach Cleaner."""
+        cleaner = getattr(self._local, 'cleaner', None)
+        if cleaner is None:
+            cleaner = Cleaner(tags=[], strip=True)
+            self._local.cleaner = cleaner
+        return cleaner
+
+    def clean(self, value: str) -> str:
+        """
+        Remove HTML tags and escape markup characters.
+
+        Args:
+            value: Raw text
+
+        Returns:
+            The same string bleach.clean(value, tags=[], strip=True) returns
+        """
+        if is_markup_free(value):
+            return value
+        return self.cleaner.clean(value)
+
+    def clean_many(self, values: Iterable[str]) -> List[str]:
+        """
+        Clean several strings, parsing only those that contain markup.
+
+        Each string is parsed on its own: joining them into one document
+        would let an unterminated tag or comment in one value swallow
+        the next.
+
+        Args:
+            values: Raw texts
+
+        Returns:
+            Cleaned texts in the same order
+        """
+        cleaner = None
+        cleaned = []
+        for value in values:
+            if is_markup_free(value):
+                cleaned.append(value)
+                continue
+            if cleaner is None:
+                cleaner = self.cleaner
+            cleaned.append(cleaner.clean(value))
+        return cleaned
+
+
+# =============================================================================
+# Shared Instance
+# =============================================================================
+
+_text_sanitizer = TextSanitizer()
+
+
+def clean_text(value: str) -> str:
+    """Clean one string with the process-wide sanitizer."""
+    return _text_sanitizer.clean(value)
+
+
+def sanitize_fields(data: Dict, max_lengths: Dict[str, int]) -> Dict[str, str]:
+    """
+    Sanitize every text field of a questionnaire at once.
+
+    Applies the same steps as sanitize_text in input_validator.py (clean,
+    trim whitespace, limit length) to each field that holds a string.
+
+    Args:
+        data: Raw input dictionary
+        max_lengths: Field name -> maximum sanitized length
+
+    Returns:
+        Field name -> sanitized value, for fields present as strings
+    """
+    sanitized: Dict[str, str] = {}
+    cleaner = None
+
+    for field, max_length in max_lengths.items():
+        value = data.get(field)
+        if not isinstance(value, str):
+            continue
+        if not is_markup_free(value):
+            if cleaner is None:
+                cleaner = _text_sanitizer.cleaner
+            value = cleaner.clean(value)
+        sanitized[field] = value.strip()[:max_length]
+
+    return sanitized
@@ -0,0 +1,356 @@
+"""
+Questionnaire Schema Module
+===========================
+Declarative field definitions compiled into a flat validator.
+
+A questionnaire is described as an ordered list of FieldSpec entries
+(field kind, length limit, options, conditions). compile_schema turns the
+list into one checker function per field, with option lists frozen into
+sets and every error message prepared up front. Validating a submission
+is then a single loop over those checkers.
+
+The same schema provides the option lists served by
+/api/template-options, so the frontend and the validator never disagree.
+"""
+
+from typing import Dict, Any, Callable, List, Optional, Sequence, Tuple
+from utils.logo_store import LogoError, get_logo_store
+from utils.metrics import timed_stage
+from validators.sanitizer import sanitize_fields
+
+
+# =============================================================================
+# Field Kinds
+# =============================================================================
+
+# Free text, sanitized and limited to max_length
+FIELD_TEXT = 'text'
+
+# One value out of options
+FIELD_CHOICE = 'choice'
+
+# A non-empty list of values out of options
+FIELD_MULTI_CHOICE = 'multi_choice'
+
+# true or false
+FIELD_BOOLEAN = 'boolean'
+
+# Optional image data URI, ingested into the logo store
+FIELD_IMAGE = 'image'
+
+FIELD_KINDS = frozenset([FIELD_TEXT, FIELD_CHOICE, FIELD_MULTI_CHOICE, FIELD_BOOLEAN, FIELD_IMAGE])
+
+
+class FieldSpec:
+    """Declarative definition of one questionnaire field."""
+
+    def __init__(self, name: str, kind: str, required: bool = True,
+                 max_length: Optional[int] = None,
+                 options: Optional[Sequence[str]] = None,
+                 option_labels: Optional[Dict[str, str]] = None,
+                 min_selections: int = 1,
+                 required_if: Optional[Tuple[str, Any]] = None,
+                 default: Any = None,
+                 export_as: Optional[str] = None):
+        """
+        Args:
+            name: Key of the field in the submitted JSON
+            kind: One of FIELD_KINDS
+            required: Whether the field must be present
+            max_length: Maximum sanitized length of text fields
+            options: Allowed values of choice fields
+            option_labels: Display label of each option, for the frontend
+            min_selections: Minimum number of values of multi-choice fields
+            required_if: (field, value) - the field is only validated when
+                         the earlier field validated to this value
+            default: Value used when required_if does not hold
+            export_as: Key under which /api/template-options lists the options
+        """
+        if kind not in FIELD_KINDS:
+            raise ValueError(f'{name}: unknown field kind {kind}')
+        if kind == FIELD_TEXT and max_length is None:
+            raise ValueError(f'{name}: text fields need max_length')
+        if kind in (FIELD_CHOICE, FIELD_MULTI_CHOICE) and not options:
+            raise ValueError(f'{name}: choice fields need options')
+
+        self.name = name
+        self.kind = kind
+        self.required = required
+        self.max_length = max_length
+        self.options = list(options or [])
+        self.option_labels = option_labels
+        self.min_selections = min_selections
+        self.required_if = required_if
+        self.default = default
+        self.export_as = export_as
+
+
+# A checker validates one field: (raw data, validated so far, sanitized
+# text, errors) -> validated value
+Checker = Callable[[Dict, Dict[str, Any], Dict[str, str], List[str]], Any]
+
+
+# =============================================================================
+# Checkers
+# =============================================================================
+
+def text_checker(spec: FieldSpec) -> Checker:
+    """Build the checker of a required text field."""
+    name = spec.name
+    required_message = f'{name}: This field is required.'
+    type_message = f'{name}: Must be a text value.'
+    empty_message = f'{name}: This field cannot be empty.'
+
+    def check(data, validated, sanitized, errors):
+        value = data.get(name)
+
+        if value is None or value == '':
+            errors.append(required_message)
+            return None
+
+        if not isinstance(value, str):
+            errors.append(type_message)
+            return None
+
+        cleaned = sanitized[name]
+        if not cleaned:
+            errors.append(empty_message)
+            return None
+
+        return cleaned
+
+    return check
+
+
+def choice_checker(spec: FieldSpec) -> Checker:
+    """Build the checker of a required single-choice field."""
+    name = spec.name
+    options = frozenset(spec.options)
+    required_message = f'{name}: This field is required.'
+    type_message = f'{name}: Invalid selection.'
+    option_message = f'{name}: Invalid option. Must be one of: {", ".join(spec.options)}'
+
+    def check(data, validated, sanitized, errors):
+        value = data.get(name)
+
+        if value is None or value == '':
+            errors.append(required_message)
+            return None
+
+        if not isinstance(value, str):
+            errors.append(type_message)
+            return None
+
+        if value not in options:
+            errors.append(option_message)
+            return None
+
+        return value
+
+    return check
+
+
+def multi_choice_checker(spec: FieldSpec) -> Checker:
+    """Build the checker of a required multi-choice field."""
+    name = spec.name
+    options = frozenset(spec.options)
+    min_selections = spec.min_selections
+    required_message = f'{name}: This field is required.'
+    type_message = f'{name}: Must be a list of selections.'
+    count_message = f'{name}: At least {min_selections} selection(s) required.'
+    item_type_message = f'{name}: Invalid selection type.'
+
+    def check(data, validated, sanitized, errors):
+        value = data.get(name)
+
+        if value is None:
+            errors.append(required_message)
+            return None
+
+        if not isinstance(value, list):
+            errors.append(type_message)
+            return None
+
+        if len(value) < min_selections:
+            errors.append(count_message)
+            return None
+
+        for item in value:
+            if not isinstance(item, str):
+                errors.append(item_type_message)
+                return None
+            if item not in options:
+                errors.append(f'{name}: Invalid option "{item}".')
+                return None
+
+        return list(value)
+
+    return check
+
+
+def boolean_checker(spec: FieldSpec) -> Checker:
+    """Build the checker of a boolean field."""
+    name = spec.name
+    required = spec.required
+    required_message = f'{name}: This field is required.'
+    type_message = f'{name}: Must be true or false.'
+
+    def check(data, validated, sanitized, errors):
+        value = data.get(name)
+
+        if value is None:
+            if required:
+                errors.append(required_message)
+            return None
+
+        if not isinstance(value, bool):
+            errors.append(type_message)
+            return None
+
+        return value
+
+    return check
+
+
+def image_checker(spec: FieldSpec) -> Checker:
+    """Build the checker of an optional image field."""
+    name = spec.name
+
+    def check(data, validated, sanitized, errors):
+        value = data.get(name)
+
+        if not value or not isinstance(value, str):
+            return None
+
+        # The image is decoded, checked and downscaled once; the template
+        # then references the stored copy by its content hash
+        try:
+            return get_logo_store().ingest(value)
+        except LogoError:
+            # If invalid, just ignore it rather than erroring out the whole form
+            return None
+        except OSError as e:
+            # Log the error (in production, use proper logging)
+            print(f'Logo could not be stored: {str(e)}')
+            return None
+
+    return check
+
+
+CHECKER_FACTORIES = {
+    FIELD_TEXT: text_checker,
+    FIELD_CHOICE: choice_checker,
+    FIELD_MULTI_CHOICE: multi_choice_checker,
+    FIELD_BOOLEAN: boolean_checker,
+    FIELD_IMAGE: image_checker
+}
+
+
+def conditional(checker: Checker, spec: FieldSpec) -> Checker:
+    """Wrap a checker so it only runs when spec.required_if holds."""
+    dependency, expected = spec.required_if
+    default = spec.default
+
+    def check(data, validated, sanitized, errors):
+        if validated.get(dependency) is expected:
+            return checker(data, validated, sanitized, errors)
+        return default
+
+    return check
+
+
+# =============================================================================
+# Compiled Schema
+# =============================================================================
+
+class CompiledSchema:
+    """Flat validator built from a list of FieldSpec entries."""
+
+    def __init__(self, fields: Sequence[FieldSpec]):
+        """
+        Args:
+            fields: Field definitions in validation and output order
+        """
+        names = [spec.name for spec in fields]
+        if len(set(names)) != len(names):
+            raise ValueError('Duplicate field names in schema')
+
+        for spec in fields:
+            if spec.required_if is not None and spec.required_if[0] not in names[:names.index(spec.name)]:
+                raise ValueError(f'{spec.name}: required_if must refer to an earlier field')
+
+        self.fields = list(fields)
+
+        # Free-text fields and their limits, sanitized in one pass
+        self.text_field_lengths: Dict[str, int] = {
+            spec.name: spec.max_length for spec in fields if spec.kind == FIELD_TEXT
+        }
+
+        self._checkers: List[Tuple[str, Checker]] = []
+        for spec in fields:
+            checker = CHECKER_FACTORIES[spec.kind](spec)
+            if spec.required_if is not None:
+                checker = conditional(checker, spec)
+            self._checkers.append((spec.name, checker))
+
+    def validate(self, data: Dict) -> Tuple[bool, Dict[str, Any], List[str]]:
+        """
+        Validate and sanitize a submission.
+
+        Args:
+            data: Raw input dictionary
+
+        Returns:
+            Tuple of:
+            - is_valid: Boolean indicating if all validation passed
+            - validated_data: Dictionary of sanitized, validated data
+            - errors: List of validation error messages
+        """
+        errors: List[str] = []
+        validated: Dict[str, Any] = {}
+
+        # Sanitize all free-text answers in one pass
+        with timed_stage('sanitize'):
+            sanitized = sanitize_fields(data, self.text_field_lengths)
+
+        for name, checker in self._checkers:
+            validated[name] = checker(data, validated, sanitized, errors)
+
+        return not errors, validated, errors
+
+    def options(self) -> Dict[str, Any]:
+        """
+        Export the options of every field that has an export_as key.
+
+        Returns:
+            export_as -> list of option values, or of {value, label}
+            objects for fields with option labels
+        """
+        exported: Dict[str, Any] = {}
+        for spec in self.fields:
+            if spec.export_as is None:
+                continue
+            if spec.option_labels:
+                exported[spec.export_as] = [
+                    {'value': option, 'label': spec.option_labels.get(option, option)}
+                    for option in spec.options
+                ]
+            else:
+                exported[spec.export_as] = list(spec.options)
+        return exported
+
+
+def compile_schema(fields: Sequence[FieldSpec]) -> CompiledSchema:
+    """
+    Compile field definitions into a flat validator.
+
+    Args:
+        fields: Field definitions in validation and output order
+
+    Returns:
+        CompiledSchema instance
+
+    Raises:
+        ValueError: If the definitions are inconsistent
+    """
+    return CompiledSchema(fields)
@@ -0,0 +1,18 @@
+"""
+ResponseForge - WSGI Entry Point
+================================
+Production entry point for WSGI servers.
+
+    cd backend
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is created at import time. With gunicorn's preload_app (the
+default in gunicorn.conf.py) that happens once in the master process, so
+templates are compiled before the workers fork and shared between them
+copy-on-write. PDF worker processes are started per server worker after
+the fork (see post_worker_init in gunicorn.conf.py).
+"""
+
+from app import create_app
+
+app = create_app(defer_warm_up=True)
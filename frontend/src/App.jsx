@@ -86,6 +86,7 @@ function App() {
     outputFormats: [
       { value: 'md', label: 'Markdown (.md)' },
       { value: 'txt', label: 'Text (.txt)' },
+      { value: 'html', label: 'Print-ready HTML (.html)' },
     ],
   });
 
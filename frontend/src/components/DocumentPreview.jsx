@@ -30,6 +30,9 @@ function DocumentPreview({ document, filename, onDownload, onReset, isPdf = fals
     // Generate PDF preview URL if it's a PDF
     const pdfPreviewUrl = isPdf ? `data:application/pdf;base64,${document}` : null;
 
+    // Print-ready HTML is shown as the page it renders to
+    const isHtml = !isPdf && filename.endsWith('.html');
+
     return (
         <div className="document-preview">
             {/* Confirmation Modal */}
@@ -81,6 +84,15 @@ function DocumentPreview({ document, filename, onDownload, onReset, isPdf = fals
                                 className="pdf-iframe"
                             />
                         </div>
+                    ) : isHtml ? (
+                        <div className="pdf-preview">
+                            <iframe
+                                srcDoc={document}
+                                sandbox=""
+                                title="HTML Preview"
+                                className="pdf-iframe"
+                            />
+                        </div>
                     ) : (
                         <pre>{document}</pre>
                     )}
@@ -9,20 +9,36 @@ import PropTypes from 'prop-types';
 function OutputPreferences({ formData, onChange }) {
     return (
         <div className="form-fields">
-            {/* Hidden input to maintain PDF format */}
-            <input type="hidden" value="pdf" />
-
-            {/* PDF Format Display */}
+            {/* Output Format Selection */}
             <div className="form-group">
                 <label>Output Format</label>
                 <div className="format-options">
-                    <label className="format-card selected">
+                    <label className={`format-card ${formData.outputFormat === 'pdf' ? 'selected' : ''}`}>
+                        <input
+                            type="radio"
+                            name="outputFormat"
+                            checked={formData.outputFormat === 'pdf'}
+                            onChange={() => onChange('outputFormat', 'pdf')}
+                        />
                         <span className="format-icon">📄</span>
                         <span className="format-label">PDF Document</span>
                         <span className="format-description">
                             Professional PDF with headers, footers, and formatted tables
                         </span>
                     </label>
+                    <label className={`format-card ${formData.outputFormat === 'html' ? 'selected' : ''}`}>
+                        <input
+                            type="radio"
+                            name="outputFormat"
+                            checked={formData.outputFormat === 'html'}
+                            onChange={() => onChange('outputFormat', 'html')}
+                        />
+                        <span className="format-icon">🖨️</span>
+                        <span className="format-label">Print-Ready HTML</span>
+                        <span className="format-description">
+                            The same layout as a web page; use your browser's Print to PDF
+                        </span>
+                    </label>
                 </div>
             </div>
 
@@ -31,8 +47,8 @@ function OutputPreferences({ formData, onChange }) {
                 <h3>📋 Ready to Generate</h3>
                 <p>
                     Click "Generate Document" below to create your customized NIST SP 800-61
-                    compliant Incident Response Plan. Your professional PDF document will
-                    include a title page, table of contents, and all your organization-specific details.
+                    compliant Incident Response Plan. Your document will include a title page,
+                    table of contents, and all your organization-specific details.
                 </p>
             </div>
         </div>
@@ -66,6 +66,7 @@ export const getTemplateOptions = async () => {
             outputFormats: [
                 { value: 'md', label: 'Markdown (.md)' },
                 { value: 'txt', label: 'Text (.txt)' },
+                { value: 'html', label: 'Print-ready HTML (.html)' },
             ],
         };
     }
@@ -89,6 +90,9 @@ export const downloadDocument = (content, filename, isPdf = false) => {
             bytes[i] = binaryString.charCodeAt(i);
         }
         blob = new Blob([bytes], { type: 'application/pdf' });
+    } else if (filename.endsWith('.html')) {
+        // Print-ready HTML document
+        blob = new Blob([content], { type: 'text/html;charset=utf-8' });
     } else {
         // Plain text content
         blob = new Blob([content], { type: 'text/plain;charset=utf-8' });